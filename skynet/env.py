@@ -111,6 +111,30 @@ ws_max_ping_timeout = int(os.environ.get('WS_MAX_PING_TIMEOUT', 30))
 whisper_max_finals_in_initial_prompt = int(os.environ.get('WHISPER_MAX_FINALS_IN_INITIAL_PROMPT', 2))
 # The period in milliseconds to flush the buffer after no new spoken audio is detected
 whisper_flush_interval = int(os.environ.get('WHISPER_FLUSH_BUFFER_INTERVAL', 2000))
+# The maximum number of participant buffers transcribed together in one batched inference pass
+whisper_batch_size = int(os.environ.get('WHISPER_BATCH_SIZE', 8))
+# How long to wait in milliseconds for other participants to join a batch when the model is idle
+whisper_batch_window_ms = int(os.environ.get('WHISPER_BATCH_WINDOW_MS', 20))
+# The number of threads running the VAD for incoming chunks, off the event loop
+whisper_vad_threads = int(os.environ.get('WHISPER_VAD_THREADS', 2))
+# The maximum number of participant transcription passes submitted to the model at the same time, the others wait
+whisper_max_inflight_transcriptions = int(os.environ.get('WHISPER_MAX_INFLIGHT_TRANSCRIPTIONS', 16))
+# The number of worker processes owning a copy of the model, 0 runs the model in the main process
+whisper_worker_processes = int(os.environ.get('WHISPER_WORKER_PROCESSES', 0))
+# Keep the Mel spectrogram of the working audio between passes and only compute it for the new audio
+whisper_cache_features = tobool(os.environ.get('WHISPER_CACHE_FEATURES'))
+# Above this smoothed transcription latency in milliseconds, the interim transcriptions are spaced out
+whisper_interim_target_latency_ms = int(os.environ.get('WHISPER_INTERIM_TARGET_LATENCY_MS', 1000))
+# The maximum amount of new speech in milliseconds a participant may need before the next interim transcription
+whisper_interim_max_interval_ms = int(os.environ.get('WHISPER_INTERIM_MAX_INTERVAL_MS', 3000))
+# Finalise the working audio of a participant after this much trailing silence in milliseconds, 0 waits for the flush
+whisper_early_final_silence_ms = int(os.environ.get('WHISPER_EARLY_FINAL_SILENCE_MS', 0))
+# How the vox gateway aggregates the telephony audio before forwarding it: fixed, low_latency, high_throughput or adaptive
+vox_aggregation_mode = os.environ.get('VOX_AGGREGATION_MODE', 'fixed')
+# The aggregation window in milliseconds of the fixed mode
+vox_window_ms = int(os.environ.get('VOX_WINDOW_MS', 1000))
+# The aggregation window in milliseconds of the high throughput mode, and the largest one of the adaptive mode
+vox_max_window_ms = int(os.environ.get('VOX_MAX_WINDOW_MS', 3000))
 
 # jobs
 job_timeout = int(os.environ.get('JOB_TIMEOUT', 60 * 5))  # 5 minutes default
@@ -34,11 +34,15 @@ async def lifespan(main_app: FastAPI):
     log.info(f'Skynet {importlib.metadata.version("skynet")} became self aware')
 
     if 'streaming_whisper' in modules:
-        from skynet.modules.stt.streaming_whisper.app import app as streaming_whisper_app
+        from skynet.modules.stt.streaming_whisper.app import (
+            app as streaming_whisper_app,
+            app_startup as streaming_whisper_startup,
+        )
         from skynet.modules.stt.vox.app import app as vox_app
 
         main_app.mount('/streaming-whisper', streaming_whisper_app)
         main_app.mount('/vox', vox_app)
+        await streaming_whisper_startup()
 
     if 'assistant' in modules:
         from skynet.modules.ttt.assistant.app import app as rag_app, app_startup as assistant_startup
@@ -78,6 +82,11 @@ async def lifespan(main_app: FastAPI):
 
         await executor_shutdown()
 
+    if 'streaming_whisper' in modules:
+        from skynet.modules.stt.streaming_whisper.app import app_shutdown as streaming_whisper_shutdown
+
+        await streaming_whisper_shutdown()
+
     if 'assistant' in modules:
         from skynet.modules.ttt.assistant.app import app_shutdown as assistant_shutdown
 
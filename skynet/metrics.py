@@ -34,18 +34,17 @@ if enable_metrics:
         Metrics required for the autoscaler.
         '''
 
-        # Sum up queue sizes from all processor-specific queues
-        total_queue_size = 0
-        for queue_key in [
-            PENDING_JOBS_OPENAI_KEY,
-            PENDING_JOBS_AZURE_KEY,
-            PENDING_JOBS_OCI_KEY,
-            PENDING_JOBS_LOCAL_KEY,
-        ]:
-            queue_size = await db.llen(queue_key)
-            total_queue_size += queue_size
-
-        return {'queueSize': total_queue_size}
+        # Sum up queue sizes from all processor-specific queues, read in a single round trip
+        queue_sizes = await db.zcard_many(
+            [
+                PENDING_JOBS_OPENAI_KEY,
+                PENDING_JOBS_AZURE_KEY,
+                PENDING_JOBS_OCI_KEY,
+                PENDING_JOBS_LOCAL_KEY,
+            ]
+        )
+
+        return {'queueSize': sum(queue_sizes)}
 
     if 'summaries:dispatcher' in modules:
         from skynet.modules.ttt.summaries.app import app as summaries_app
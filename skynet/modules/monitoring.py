@@ -114,6 +114,89 @@ TRANSCRIBE_DURATION_METRIC = Histogram(
     buckets=[x / 10.0 for x in range(1, 31)],
 )
 
+TRANSCRIBE_QUEUED_PASSES_METRIC = Gauge(
+    'WhisperQueuedTranscriptionPasses',
+    documentation='Number of participants waiting for a transcription pass',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_SKIPPED_PASSES_COUNTER = Counter(
+    'WhisperSkippedTranscriptionPasses',
+    documentation='Number of interim transcription passes skipped because newer audio was already queued',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_THROTTLED_PASSES_COUNTER = Counter(
+    'WhisperThrottledInterimPasses',
+    documentation='Number of interim transcription passes skipped by the load adaptive cadence',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_PASS_LATENCY_METRIC = Gauge(
+    'WhisperSmoothedPassLatency',
+    documentation='Smoothed latency in seconds of the transcription passes, including the time spent queued',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_INTERIM_INTERVAL_METRIC = Gauge(
+    'WhisperInterimInterval',
+    documentation='Minimum amount of new speech in seconds a participant needs before the next interim pass',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_STAGE_DURATION_METRIC = Histogram(
+    'WhisperStageDuration',
+    documentation='Measures the duration of each stage of the streaming transcription in seconds',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+    labelnames=['stage', 'type'],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+)
+
+TRANSCRIBE_PARTICIPANTS_METRIC = Gauge(
+    'LiveWsParticipants',
+    documentation='Number of participants in the active WS connections',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_AUDIO_RECEIVED_COUNTER = Counter(
+    'WhisperAudioReceivedSeconds',
+    documentation='Seconds of audio received over the WS connections',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+TRANSCRIBE_EARLY_FINALS_COUNTER = Counter(
+    'WhisperEarlyFinals',
+    documentation='Number of finals produced as soon as the participant stopped talking',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+)
+
+VOX_WINDOW_DURATION_METRIC = Histogram(
+    'VoxWindowDuration',
+    documentation='Measures the duration of the audio windows forwarded by the vox gateway in seconds',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+    labelnames=['mode'],
+    buckets=[0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0],
+)
+
+VOX_WINDOW_LATENCY_METRIC = Histogram(
+    'VoxWindowLatency',
+    documentation='Time in seconds from when a vox window is handed to the transcription until a result covers it',
+    namespace=PROMETHEUS_NAMESPACE,
+    subsystem=PROMETHEUS_STREAMING_WHISPER_SUBSYSTEM,
+    labelnames=['mode'],
+    buckets=[0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0],
+)
+
 OPENAI_API_RESTART_COUNTER = Counter(
     'forced_exit',
     documentation='Number of restarts of the OpenAI API server',
@@ -0,0 +1,12 @@
+import sys
+from types import ModuleType
+
+# cfg loads the Whisper and Silero models when it's imported, the tests get a stand-in without any models instead
+cfg = ModuleType('skynet.modules.stt.streaming_whisper.cfg')
+cfg.model = None
+cfg.vad_model = None
+cfg.feature_extractor = None
+cfg.hf_tokenizer = None
+cfg.num_workers = 1
+cfg.one_byte_s = 0.00003125
+sys.modules.setdefault(cfg.__name__, cfg)
@@ -3,6 +3,7 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, WebSocketException
 from skynet.logs import get_logger
 from skynet.modules.stt.streaming_whisper.connection_manager import ConnectionManager
 from skynet.modules.stt.streaming_whisper.utils import utils
+from skynet.modules.stt.streaming_whisper.worker_pool import worker_pool
 
 log = get_logger(__name__)
 
@@ -10,6 +11,14 @@ ws_connection_manager = ConnectionManager()
 app = FastAPI()  # No need for CORS middleware
 
 
+async def app_startup():
+    worker_pool.start()
+
+
+async def app_shutdown():
+    worker_pool.stop()
+
+
 @app.websocket('/ws/{meeting_id}')
 async def websocket_endpoint(websocket: WebSocket, meeting_id: str, auth_token: str | None = None):
     connection = await ws_connection_manager.connect(websocket, meeting_id, auth_token)
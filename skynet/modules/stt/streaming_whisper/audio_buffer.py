@@ -0,0 +1,105 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+DEFAULT_CAPACITY_S = 60
+
+
+class AudioBuffer:
+    """
+    Preallocated buffer for a participant's working audio.
+
+    The audio is stored both as 16-bit PCM, for the WAV export, and as normalised float32, which is what the VAD and
+    Whisper consume, so it's only converted once when it comes in. Appending writes into the free space at the end and
+    trimming only moves the start offset, so the live audio is always contiguous and `pcm` and `samples` are views,
+    not copies.
+
+    When the end of the storage is reached, the live audio is moved to new storage instead of being shifted in place,
+    which keeps any view handed out earlier, e.g. to a transcription that is still running, intact.
+    """
+
+    def __init__(self, capacity_s: float = DEFAULT_CAPACITY_S):
+        self.capacity = int(capacity_s * SAMPLE_RATE)
+        self._pcm = np.empty(self.capacity, dtype=np.int16)
+        self._samples = np.empty(self.capacity, dtype=np.float32)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        """
+        The length of the live audio in bytes, same as for the `bytes` object it replaces.
+        """
+
+        return self.num_samples * BYTES_PER_SAMPLE
+
+    @property
+    def num_samples(self) -> int:
+        return self.end - self.start
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / SAMPLE_RATE
+
+    @property
+    def pcm(self) -> np.ndarray:
+        return self._pcm[self.start : self.end]
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self._samples[self.start : self.end]
+
+    def tobytes(self) -> bytes:
+        return self.pcm.tobytes()
+
+    def append(self, audio: bytes) -> np.ndarray:
+        """
+        Appends 16-bit PCM audio and returns the float32 view of the appended samples.
+        """
+
+        pcm = np.frombuffer(audio, dtype=np.int16)
+        if self.end + len(pcm) > self.capacity:
+            self._reallocate(self.num_samples + len(pcm))
+
+        end = self.end + len(pcm)
+        self._pcm[self.end : end] = pcm
+        np.multiply(pcm, 1 / 32768.0, out=self._samples[self.end : end], casting='unsafe')
+        self.end = end
+
+        return self._samples[end - len(pcm) : end]
+
+    def trim(self, num_bytes: int) -> np.ndarray:
+        """
+        Drops the first `num_bytes` bytes and returns them as a 16-bit PCM view.
+
+        The view is only valid until the next `append`.
+        """
+
+        num_samples = min(num_bytes // BYTES_PER_SAMPLE, self.num_samples)
+        dropped = self._pcm[self.start : self.start + num_samples]
+        self.start += num_samples
+        if self.start == self.end:
+            self.start = self.end = 0
+
+        return dropped
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
+
+    def _reallocate(self, min_capacity: int):
+        # grow when the live audio would take up more than half of the storage, to keep moving it around rare
+        capacity = self.capacity
+        if min_capacity > self.capacity // 2:
+            capacity = max(min_capacity, 2 * self.capacity)
+
+        pcm = np.empty(capacity, dtype=np.int16)
+        samples = np.empty(capacity, dtype=np.float32)
+        num_samples = self.num_samples
+        pcm[:num_samples] = self.pcm
+        samples[:num_samples] = self.samples
+
+        self._pcm = pcm
+        self._samples = samples
+        self.capacity = capacity
+        self.start = 0
+        self.end = num_samples
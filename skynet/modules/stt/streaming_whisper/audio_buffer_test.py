@@ -0,0 +1,67 @@
+import numpy as np
+
+from skynet.modules.stt.streaming_whisper.audio_buffer import AudioBuffer, SAMPLE_RATE
+
+
+def pcm(num_samples: int, start: int = 0) -> bytes:
+    return np.arange(start, start + num_samples, dtype=np.int16).tobytes()
+
+
+class TestAudioBuffer:
+    def test_append(self):
+        '''Test that appended audio is available both as PCM and as normalised samples.'''
+
+        buffer = AudioBuffer(capacity_s=1)
+        samples = buffer.append(pcm(100))
+        buffer.append(pcm(100, 100))
+
+        assert len(buffer) == 400
+        assert buffer.tobytes() == pcm(200)
+        assert np.allclose(samples, np.arange(100) / 32768.0)
+        assert np.allclose(buffer.samples, np.arange(200) / 32768.0)
+
+    def test_views_are_not_copies(self):
+        '''Test that the exposed audio shares the preallocated storage.'''
+
+        buffer = AudioBuffer(capacity_s=1)
+        buffer.append(pcm(100))
+
+        assert np.shares_memory(buffer.samples, buffer._samples)
+        assert np.shares_memory(buffer.pcm, buffer._pcm)
+
+    def test_trim(self):
+        '''Test that trimming drops audio from the start and returns it.'''
+
+        buffer = AudioBuffer(capacity_s=1)
+        buffer.append(pcm(200))
+        dropped = buffer.trim(100)
+
+        assert dropped.tobytes() == pcm(50)
+        assert buffer.tobytes() == pcm(150, 50)
+
+    def test_wrap_around_keeps_old_views(self):
+        '''Test that running out of storage moves the live audio without touching views handed out before.'''
+
+        eighth = SAMPLE_RATE // 8
+        buffer = AudioBuffer(capacity_s=1)
+        buffer.append(pcm(7 * eighth))
+        buffer.trim(6 * eighth * 2)
+        buffer.append(pcm(eighth, 7 * eighth))
+        samples = buffer.samples
+        expected = samples.copy()
+        buffer.append(pcm(eighth, 8 * eighth))
+
+        assert buffer.capacity == SAMPLE_RATE
+        assert buffer.start == 0
+        assert buffer.tobytes() == pcm(3 * eighth, 6 * eighth)
+        assert np.array_equal(samples, expected)
+
+    def test_grows(self):
+        '''Test that the storage grows when the live audio doesn't fit.'''
+
+        buffer = AudioBuffer(capacity_s=1)
+        buffer.append(pcm(SAMPLE_RATE))
+        buffer.append(pcm(SAMPLE_RATE // 2, SAMPLE_RATE))
+
+        assert buffer.capacity == 2 * SAMPLE_RATE
+        assert buffer.tobytes() == pcm(3 * SAMPLE_RATE // 2)
@@ -0,0 +1,47 @@
+from skynet.env import whisper_interim_max_interval_ms, whisper_interim_target_latency_ms
+from skynet.modules.monitoring import TRANSCRIBE_INTERIM_INTERVAL_METRIC, TRANSCRIBE_PASS_LATENCY_METRIC
+
+
+class InterimCadence:
+    """
+    Node wide policy deciding how often the participants get an interim transcription.
+
+    It follows the smoothed latency of the transcription passes since they were admitted by the ConnectionManager, their
+    queueing there and in the scheduler included. As long as it stays under the target, every new chunk gets a pass.
+    Above it, a participant needs at least as much new speech as a pass currently takes before the next interim pass, up
+    to `max_interval_ms`, so the node loses interim freshness instead of falling behind real time. Finals are not
+    affected.
+    """
+
+    def __init__(
+        self,
+        target_latency_ms: int = whisper_interim_target_latency_ms,
+        max_interval_ms: int = whisper_interim_max_interval_ms,
+        smoothing: float = 0.2,
+    ):
+        self.target_latency_s = target_latency_ms / 1000
+        self.max_interval_s = max_interval_ms / 1000
+        self.smoothing = smoothing
+        self.latency_s = 0.0
+
+    @property
+    def interval_s(self) -> float:
+        """
+        The minimum amount of new speech in seconds between two interim passes of a participant.
+        """
+
+        if self.latency_s <= self.target_latency_s:
+            return 0.0
+
+        return min(self.latency_s, self.max_interval_s)
+
+    def observe(self, latency_s: float):
+        self.latency_s += self.smoothing * (latency_s - self.latency_s)
+        TRANSCRIBE_PASS_LATENCY_METRIC.set(self.latency_s)
+        TRANSCRIBE_INTERIM_INTERVAL_METRIC.set(self.interval_s)
+
+    def should_transcribe(self, new_audio_s: float) -> bool:
+        return new_audio_s >= self.interval_s
+
+
+interim_cadence = InterimCadence()
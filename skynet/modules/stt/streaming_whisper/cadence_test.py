@@ -0,0 +1,40 @@
+from skynet.modules.stt.streaming_whisper.cadence import InterimCadence
+
+
+class TestInterimCadence:
+    def test_every_chunk_under_target(self):
+        '''Test that every chunk gets a pass while the latency is under the target.'''
+
+        cadence = InterimCadence(target_latency_ms=1000, max_interval_ms=3000)
+        cadence.observe(0.5)
+
+        assert cadence.interval_s == 0.0
+        assert cadence.should_transcribe(0.0)
+
+    def test_spaced_out_over_target(self):
+        '''Test that the passes are spaced out by the latency once it's over the target.'''
+
+        cadence = InterimCadence(target_latency_ms=1000, max_interval_ms=3000, smoothing=1.0)
+        cadence.observe(2.0)
+
+        assert cadence.interval_s == 2.0
+        assert not cadence.should_transcribe(1.5)
+        assert cadence.should_transcribe(2.0)
+
+    def test_max_interval(self):
+        '''Test that the interval is capped.'''
+
+        cadence = InterimCadence(target_latency_ms=1000, max_interval_ms=3000, smoothing=1.0)
+        cadence.observe(10.0)
+
+        assert cadence.interval_s == 3.0
+
+    def test_smoothing(self):
+        '''Test that a single slow pass doesn't throttle the interims.'''
+
+        cadence = InterimCadence(target_latency_ms=1000, max_interval_ms=3000, smoothing=0.2)
+        for _ in range(10):
+            cadence.observe(0.3)
+        cadence.observe(3.0)
+
+        assert cadence.interval_s == 0.0
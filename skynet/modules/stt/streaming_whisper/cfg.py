@@ -1,4 +1,11 @@
+import json
+import os
+from inspect import signature
+
+import tokenizers
 from faster_whisper import WhisperModel
+from faster_whisper.feature_extractor import FeatureExtractor
+from faster_whisper.utils import download_model
 from silero_vad import load_silero_vad
 
 from skynet.env import (
@@ -8,6 +15,7 @@ from skynet.env import (
     whisper_gpu_indices,
     whisper_model_name,
     whisper_model_path,
+    whisper_worker_processes,
 )
 from skynet.logs import get_logger
 
@@ -28,17 +36,56 @@ if whisper_gpu_indices is not None:
 
 path_or_model_name = whisper_model_name if whisper_model_name is not None else whisper_model_path
 
-model = WhisperModel(
-    path_or_model_name,
-    device=device,
-    device_index=gpu_indices,
-    compute_type=whisper_compute_type,
-    num_workers=num_workers,
-    download_root=whisper_model_path,
-)
+
+def load_model(cpu_threads: int = 0, device_index: list | None = None) -> WhisperModel:
+    device_index = device_index or gpu_indices
+    return WhisperModel(
+        path_or_model_name,
+        device=device,
+        device_index=device_index,
+        compute_type=whisper_compute_type,
+        cpu_threads=cpu_threads,
+        num_workers=len(device_index),
+        download_root=whisper_model_path,
+    )
+
+
+def get_model_path() -> str:
+    if whisper_model_name is not None:
+        return download_model(whisper_model_name, cache_dir=whisper_model_path)
+    return path_or_model_name
+
+
+def load_tokenizer() -> tokenizers.Tokenizer:
+    tokenizer_file = os.path.join(get_model_path(), 'tokenizer.json')
+    if os.path.isfile(tokenizer_file):
+        return tokenizers.Tokenizer.from_file(tokenizer_file)
+
+    return tokenizers.Tokenizer.from_pretrained('openai/whisper-tiny')
+
+
+def load_feature_extractor() -> FeatureExtractor:
+    # same as faster-whisper does, some models need a different number of Mel bins
+    config_file = os.path.join(get_model_path(), 'preprocessor_config.json')
+    config = {}
+    if os.path.isfile(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    valid_keys = signature(FeatureExtractor.__init__).parameters.keys()
+
+    return FeatureExtractor(**{k: v for k, v in config.items() if k in valid_keys})
+
+
+# with worker processes, the model is only loaded by the workers, see worker_pool.py
+model = load_model() if not whisper_worker_processes else None
+hf_tokenizer = model.hf_tokenizer if model else load_tokenizer()
+feature_extractor = model.feature_extractor if model else load_feature_extractor()
 
 one_byte_s = 0.00003125  # the equivalent of one byte in seconds for 16kHz audio, 2 bytes per sample, mono
 
 log.info('====== WHISPER MODEL INFO ======')
 log.info(f'Model: {path_or_model_name}')
-log.info(f'Multilingual: {model.model.is_multilingual}')
+if model:
+    log.info(f'Multilingual: {model.model.is_multilingual}')
+else:
+    log.info(f'Worker processes: {whisper_worker_processes}')
@@ -3,25 +3,46 @@ from skynet.modules.stt.streaming_whisper.utils import utils
 
 log = get_logger(__name__)
 
+HEADER_SIZE = 60
+# a connection carries only a few participants, bounds the cache if a client keeps changing the headers
+MAX_CACHED_HEADERS = 256
+
+
+def parse_header(header: bytes) -> tuple[str, str]:
+    decoded = header.decode('utf-8').strip('\x00')
+    log.debug(f'Chunk header {decoded}')
+    header_arr = decoded.split('|')
+    return header_arr[0], utils.get_lang(header_arr[1])
+
 
 class Chunk:
-    raw: bytes
+    __slots__ = ('raw', 'timestamp', 'duration', 'size', 'participant_id', 'language')
+
+    raw: memoryview
     timestamp: int
     duration: float
     size: int
     participant_id: str
     language: str
 
-    def __init__(self, chunk: bytes, chunk_timestamp: int):
-        self._extract(chunk)
+    def __init__(self, chunk: bytes, chunk_timestamp: int, headers: dict[bytes, tuple[str, str]] | None = None):
+        self._extract(chunk, headers)
         self.timestamp = chunk_timestamp
         self.duration = utils.convert_bytes_to_seconds(self.raw)
         self.size = len(self.raw)
 
-    def _extract(self, chunk: bytes):
-        header = chunk[0:60].decode('utf-8').strip('\x00')
-        log.debug(f'Chunk header {header}')
-        self.raw = chunk[60:]
-        header_arr = header.split('|')
-        self.participant_id = header_arr[0]
-        self.language = utils.get_lang(header_arr[1])
+    def _extract(self, chunk: bytes, headers: dict[bytes, tuple[str, str]] | None):
+        # a view of the audio, it's only copied once, into the participant's working audio
+        view = memoryview(chunk)
+        self.raw = view[HEADER_SIZE:]
+        header = bytes(view[:HEADER_SIZE])
+        if headers is None:
+            self.participant_id, self.language = parse_header(header)
+            return
+
+        parsed = headers.get(header)
+        if parsed is None:
+            if len(headers) >= MAX_CACHED_HEADERS:
+                headers.clear()
+            parsed = headers[header] = parse_header(header)
+        self.participant_id, self.language = parsed
@@ -1,25 +1,43 @@
 import asyncio
+import time
 from asyncio import Task
 
 from fastapi import WebSocket, WebSocketDisconnect
 
 from skynet.auth.jwt import authorize
-from skynet.env import bypass_auth, whisper_flush_interval
+from skynet.env import bypass_auth, whisper_flush_interval, whisper_max_inflight_transcriptions
 from skynet.logs import get_logger
-from skynet.modules.monitoring import update_ws_conn_count
+from skynet.modules.monitoring import (
+    TRANSCRIBE_QUEUED_PASSES_METRIC,
+    TRANSCRIBE_SKIPPED_PASSES_COUNTER,
+    TRANSCRIBE_STAGE_DURATION_METRIC,
+    update_ws_conn_count,
+)
+from skynet.modules.stt.streaming_whisper.flush_schedule import FlushSchedule
 from skynet.modules.stt.streaming_whisper.meeting_connection import MeetingConnection
+from skynet.modules.stt.streaming_whisper.protocol import BINARY_SUBPROTOCOL, encode_results, TranscriptionResponse
+from skynet.modules.stt.streaming_whisper.registry import ConnectionRegistry
 from skynet.modules.stt.streaming_whisper.utils import utils
 
 log = get_logger(__name__)
 
 
 class ConnectionManager:
-    connections: list[MeetingConnection]
+    connections: ConnectionRegistry
     flush_audio_task: Task | None
+    flush_schedule: FlushSchedule
+    queued_passes: dict[tuple[MeetingConnection, str], float]
+    running_passes: set[tuple[MeetingConnection, str]]
 
     def __init__(self):
-        self.connections: list[MeetingConnection] = []
+        self.connections = ConnectionRegistry()
         self.flush_audio_task = None
+        self.flush_schedule = FlushSchedule()
+        self.flush_wakeup = asyncio.Event()
+        # participants with new audio waiting for a transcription pass, in the order they were admitted, and when
+        self.queued_passes = {}
+        self.running_passes = set()
+        self.pass_tasks = set()
 
     async def connect(self, websocket: WebSocket, meeting_id: str, auth_token: str | None):
         if not bypass_auth:
@@ -28,9 +46,11 @@ class ConnectionManager:
             if not authorized:
                 await websocket.close(401, 'Bad JWT token')
                 return
-        await websocket.accept()
-        connection = MeetingConnection(websocket, meeting_id)
-        self.connections.append(connection)
+        # clients offering the binary subprotocol get the results of every step in a single binary frame
+        binary = BINARY_SUBPROTOCOL in websocket.scope.get('subprotocols', [])
+        await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+        connection = MeetingConnection(websocket, meeting_id, binary)
+        self.connections.add(connection)
         if self.flush_audio_task is None:
             loop = asyncio.get_running_loop()
             self.flush_audio_task = loop.create_task(self.flush_working_audio_worker())
@@ -43,25 +63,72 @@ class ConnectionManager:
         log.debug(f'Processing chunk for meeting {connection.meeting_id}')
 
         try:
-            results = await connection.process(chunk, chunk_timestamp)
-            await self.send(connection, results)
+            participant_id = await connection.add_chunk(chunk, chunk_timestamp)
+        except Exception as e:
+            log.error(f'Error processing chunk for meeting {connection.meeting_id}: {e}')
+            await self.disconnect(connection)
+            return
+
+        self.connections.update(connection)
+        self.schedule_flush(connection, participant_id)
+        self.admit(connection, participant_id)
+
+    def admit(self, connection: MeetingConnection, participant_id: str):
+        """
+        Queues a transcription pass for the participant, unless one is already queued. A queued pass transcribes the
+        working audio as it is when it starts, so it covers the new chunk too and a second one would be stale.
+        """
+        key = (connection, participant_id)
+        if key in self.queued_passes:
+            log.debug(f'Meeting {connection.meeting_id}: skipping a stale pass for {participant_id}')
+            TRANSCRIBE_SKIPPED_PASSES_COUNTER.inc()
+            return
+        self.queued_passes[key] = time.perf_counter()
+        self.dispatch()
+
+    def dispatch(self):
+        # at most one pass per participant at a time, so that the results and cuts are applied in order
+        for key in list(self.queued_passes):
+            if len(self.running_passes) >= whisper_max_inflight_transcriptions:
+                break
+            if key in self.running_passes:
+                continue
+            queued_at = self.queued_passes.pop(key)
+            self.running_passes.add(key)
+            task = asyncio.create_task(self.run_pass(*key, queued_at))
+            self.pass_tasks.add(task)
+            task.add_done_callback(self.pass_tasks.discard)
+        TRANSCRIBE_QUEUED_PASSES_METRIC.set(len(self.queued_passes))
+
+    async def run_pass(self, connection: MeetingConnection, participant_id: str, queued_at: float):
+        try:
+            if connection.connected:
+                results = await connection.process(participant_id, queued_at)
+                await self.send(connection, results)
         except Exception as e:
             log.error(f'Error processing chunk for meeting {connection.meeting_id}: {e}')
             await self.disconnect(connection)
+        finally:
+            self.running_passes.discard((connection, participant_id))
+            self.dispatch()
 
-    async def send(self, connection: MeetingConnection, results: list[utils.TranscriptionResponse] | None):
-        if results is not None:
-            for result in results:
-                try:
-                    await connection.ws.send_json(result.model_dump())
-                except WebSocketDisconnect as e:
-                    log.warning(
-                        f'Meeting {connection.meeting_id}: the connection was closed before sending all results: {e}'
-                    )
-                    await self.disconnect(connection, True)
-                    break  # stop trying to send results if websocket is disconnected
-                except Exception as ex:
-                    log.error(f'Meeting {connection.meeting_id}: exception while sending transcription results {ex}')
+    async def send(self, connection: MeetingConnection, results: list[TranscriptionResponse] | None):
+        if not results:
+            return
+        try:
+            if connection.binary:
+                result_type = 'final' if any(result.type == 'final' for result in results) else 'interim'
+                with TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='send', type=result_type).time():
+                    await connection.ws.send_bytes(encode_results(results))
+            else:
+                for result in results:
+                    with TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='send', type=result.type).time():
+                        await connection.ws.send_json(result.model_dump())
+        except WebSocketDisconnect as e:
+            log.warning(f'Meeting {connection.meeting_id}: the connection was closed before sending all results: {e}')
+            await self.disconnect(connection, True)
+        except Exception as ex:
+            log.error(f'Meeting {connection.meeting_id}: exception while sending transcription results {ex}')
 
     async def disconnect(self, connection: MeetingConnection, already_closed=False):
         # Build participant audio distribution string
@@ -77,10 +144,13 @@ class ConnectionManager:
         )
         log.info(f"Participant audio distribution: {participants_str}")
 
-        try:
-            self.connections.remove(connection)
-        except ValueError:
-            log.warning(f'The connection for meeting {connection.meeting_id} doesn\'t exist in the list anymore.')
+        for key in [key for key in self.queued_passes if key[0] is connection]:
+            del self.queued_passes[key]
+        for key in [key for key in self.flush_schedule.deadlines if key[0] is connection]:
+            self.flush_schedule.remove(key)
+
+        if not self.connections.remove(connection):
+            log.warning(f'The connection for meeting {connection.meeting_id} isn\'t registered anymore.')
         if not already_closed:
             await connection.close()
         else:
@@ -90,22 +160,60 @@ class ConnectionManager:
         log.info(f'Disconnected meeting {connection.meeting_id}, remaining connections {remaining_connections}')
         await update_ws_conn_count(remaining_connections)
 
+    def schedule_flush(self, connection: MeetingConnection, participant_id: str, deadline: int | None = None):
+        """
+        Sets when the participant's working audio is due for a flush, by default `whisper_flush_interval` ms after
+        the last chunk with speech.
+        """
+        if deadline is None:
+            state = connection.participants[participant_id]
+            # nothing to flush until there's speech in the working audio
+            if len(state.working_audio) == 0:
+                return
+            deadline = state.last_received_chunk + whisper_flush_interval
+        wake_up = self.flush_schedule.next_deadline is None or deadline < self.flush_schedule.next_deadline
+        self.flush_schedule.schedule((connection, participant_id), deadline)
+        if wake_up:
+            self.flush_wakeup.set()
+
     async def flush_working_audio_worker(self):
         """
         Will force a transcription for all participants that haven't received any chunks for more than `flush_after_ms`
         but have accumulated some spoken audio without a transcription. This avoids merging un-transcribed "left-overs"
         to the next utterance when the participant resumes speaking.
+
+        It sleeps until the earliest deadline and only visits the participants that are due, their flushes are sent
+        to the scheduler together instead of one after the other.
         """
         while True:
-            for connection in self.connections:
-                for participant in connection.participants:
-                    state = connection.participants[participant]
-                    diff = utils.now() - state.last_received_chunk
-                    log.debug(
-                        f'Participant {participant} in meeting {connection.meeting_id} has been silent for {diff} ms and has {len(state.working_audio)} bytes of audio'
-                    )
-                    if diff > whisper_flush_interval and len(state.working_audio) > 0 and not state.is_transcribing:
-                        log.info(f'Forcing a transcription in meeting {connection.meeting_id} for {participant}')
-                        results = await connection.force_transcription(participant)
-                        await self.send(connection, results)
-            await asyncio.sleep(1)
+            next_deadline = self.flush_schedule.next_deadline
+            timeout = None if next_deadline is None else max(0, next_deadline - utils.now()) / 1000
+            try:
+                await asyncio.wait_for(self.flush_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_wakeup.clear()
+
+            now = utils.now()
+            for connection, participant in self.flush_schedule.pop_due(now):
+                state = connection.participants.get(participant)
+                if not connection.connected or state is None or len(state.working_audio) == 0:
+                    continue
+                if state.is_transcribing:
+                    # try again once the pass is over, as often as the audio used to be checked
+                    self.schedule_flush(connection, participant, now + 1000)
+                    continue
+                log.info(f'Forcing a transcription in meeting {connection.meeting_id} for {participant}')
+                task = asyncio.create_task(self.flush(connection, participant))
+                self.pass_tasks.add(task)
+                task.add_done_callback(self.pass_tasks.discard)
+
+    async def flush(self, connection: MeetingConnection, participant_id: str):
+        try:
+            results = await connection.force_transcription(participant_id)
+            if results is None and connection.connected and participant_id in connection.participants:
+                # skipped because a pass was running, or nothing was said, what is left is flushed once it's due
+                self.schedule_flush(connection, participant_id)
+            await self.send(connection, results)
+        except Exception as e:
+            log.error(f'Error flushing the audio of {participant_id} in meeting {connection.meeting_id}: {e}')
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from skynet.env import whisper_flush_interval
+from skynet.modules.stt.streaming_whisper.connection_manager import ConnectionManager
+
+
+class FakeConnection:
+    '''A connection with a participant who has audio to flush.'''
+
+    def __init__(self, results):
+        self.connected = True
+        self.meeting_id = 'meeting'
+        self.participants = {'participant': SimpleNamespace(working_audio=b'\x00\x00', last_received_chunk=1000)}
+        self.force_transcription = AsyncMock(return_value=results)
+
+
+class TestFlush:
+    @pytest.mark.asyncio
+    async def test_skipped_flush_is_scheduled_again(self):
+        '''Test that a flush skipped because a pass was running is scheduled again.'''
+
+        manager = ConnectionManager()
+        connection = FakeConnection(None)
+
+        await manager.flush(connection, 'participant')
+
+        assert manager.flush_schedule.deadlines == {(connection, 'participant'): 1000 + whisper_flush_interval}
+
+    @pytest.mark.asyncio
+    async def test_flushed(self, mocker):
+        '''Test that the results of a flush are sent and nothing more is scheduled.'''
+
+        manager = ConnectionManager()
+        send = mocker.patch.object(manager, 'send')
+        connection = FakeConnection(['final'])
+
+        await manager.flush(connection, 'participant')
+
+        send.assert_called_once_with(connection, ['final'])
+        assert not manager.flush_schedule.deadlines
+
+
+class TestAdmit:
+    @pytest.mark.asyncio
+    async def test_pass_gets_admission_time(self, mocker):
+        '''Test that a pass is run with the time it was admitted, which is kept when a later pass is coalesced.'''
+
+        manager = ConnectionManager()
+        run_pass = mocker.patch.object(manager, 'run_pass')
+        mocker.patch('skynet.modules.stt.streaming_whisper.connection_manager.whisper_max_inflight_transcriptions', 0)
+        mocker.patch(
+            'skynet.modules.stt.streaming_whisper.connection_manager.time.perf_counter', side_effect=[1.0, 2.0]
+        )
+        connection = FakeConnection(None)
+
+        manager.admit(connection, 'participant')
+        manager.admit(connection, 'participant')
+        assert manager.queued_passes == {(connection, 'participant'): 1.0}
+
+        mocker.patch('skynet.modules.stt.streaming_whisper.connection_manager.whisper_max_inflight_transcriptions', 1)
+        manager.dispatch()
+        await asyncio.gather(*manager.pass_tasks)
+
+        run_pass.assert_called_once_with(connection, 'participant', 1.0)
@@ -0,0 +1,84 @@
+from itertools import accumulate
+from typing import NamedTuple
+
+from pydantic import BaseModel
+
+from skynet.env import whisper_min_probability
+from skynet.logs import get_logger
+
+log = get_logger(__name__)
+
+
+# plain tuples rather than pydantic models, they are built for every word of every transcription pass
+class WhisperWord(NamedTuple):
+    probability: float
+    word: str
+    start: float
+    end: float
+
+
+class CutMark(BaseModel):
+    start: float = 0.0
+    end: float = 0.0
+    probability: float = 0.0
+
+
+def get_phrase_prob(last_word_idx: int, words: list[WhisperWord]) -> float:
+    word_number = last_word_idx + 1
+    return sum([word.probability for word in words[:word_number]]) / word_number
+
+
+def get_probability_sums(words: list[WhisperWord]) -> list[float]:
+    """
+    The running sums of the word probabilities, the average probability of the phrase ending at word `i` is
+    `sums[i + 1] / (i + 1)`. Same additions in the same order as `get_phrase_prob`, so the same averages.
+    """
+
+    return list(accumulate((word.probability for word in words), initial=0))
+
+
+def find_biggest_gap_between_words(words: list[WhisperWord], sums: list[float] | None = None) -> CutMark:
+    if sums is None:
+        sums = get_probability_sums(words)
+
+    biggest_gap_so_far = 0.0
+    result = CutMark()
+    for i in range(1, len(words)):
+        diff = words[i].start - words[i - 1].end
+        if diff > biggest_gap_so_far:
+            biggest_gap_so_far = diff
+            result = CutMark(start=words[i - 1].end, end=words[i].start, probability=sums[i] / i)
+    log.debug(f'Biggest gap between words:\n{result}')
+    return result
+
+
+def find_cut_mark(words: list[WhisperWord], min_probability: float = whisper_min_probability) -> CutMark:
+    """
+    Finds where the words can be split into a final and an interim, in a single pass over the words.
+
+    The split is after the first word ending a sentence once the phrase is at least 48 characters long, if the
+    average probability up to it is high enough and there is a pause after it. From 10 seconds of audio on, it's
+    forced at the biggest gap between words instead. An empty cut mark means there's no final yet.
+    """
+
+    if len(words) < 2:
+        return CutMark()
+
+    sums = get_probability_sums(words)
+    # force a final at the biggest gap between words found if the audio is longer than 10 seconds
+    if words[-1].end >= 10:
+        return find_biggest_gap_between_words(words, sums)
+
+    phrase_length = 0
+    for i in range(len(words) - 1):
+        word = words[i]
+        phrase_length += len(word.word)
+        if phrase_length < 48:
+            continue
+        avg_probability = sums[i + 1] / (i + 1)
+        if avg_probability >= min_probability and word.word[-1] in '.!?' and word.end < words[i + 1].start:
+            log.debug(f'Found split at {word.word} ({word.end} - {words[i + 1].start})')
+            log.debug(f'Avg probability: {avg_probability}')
+            return CutMark(start=word.end, end=words[i + 1].start, probability=avg_probability)
+
+    return CutMark()
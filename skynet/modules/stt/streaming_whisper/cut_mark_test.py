@@ -0,0 +1,67 @@
+import random
+
+from skynet.modules.stt.streaming_whisper.cut_mark import (
+    find_biggest_gap_between_words,
+    find_cut_mark,
+    get_phrase_prob,
+    get_probability_sums,
+    WhisperWord,
+)
+
+
+def make_words(texts: list[str], gap_after: dict[int, float] | None = None, probability: float = 0.9):
+    words = []
+    start = 0.0
+    for i, text in enumerate(texts):
+        words.append(WhisperWord(probability, text, start, start + 0.2))
+        start += 0.2 + (gap_after or {}).get(i, 0.05)
+    return words
+
+
+sentence = [' This', ' is', ' a', ' rather', ' long', ' sentence', ' that', ' needs', ' a', ' split.']
+
+
+class TestFindCutMark:
+    def test_probability_sums(self):
+        '''Test that the running sums give the same averages as summing every phrase.'''
+
+        rng = random.Random(0)
+        words = [WhisperWord(rng.random(), ' w', i, i + 0.5) for i in range(50)]
+        sums = get_probability_sums(words)
+
+        for i in range(len(words)):
+            assert sums[i + 1] / (i + 1) == get_phrase_prob(i, words)
+
+    def test_split_after_sentence(self):
+        '''Test that the words are split after a sentence long enough followed by a pause.'''
+
+        words = make_words(sentence + [' And', ' more'], gap_after={9: 0.5})
+        cut_mark = find_cut_mark(words, min_probability=0.7)
+
+        assert cut_mark.start == words[9].end
+        assert cut_mark.end == words[10].start
+        assert abs(cut_mark.probability - 0.9) < 1e-9
+
+    def test_no_split(self):
+        '''Test that there is no cut mark for a short phrase, a low probability or without a pause.'''
+
+        assert find_cut_mark(make_words([' Short.', ' phrase']), min_probability=0.7).end == 0.0
+        assert (
+            find_cut_mark(make_words(sentence + [' And'], gap_after={9: 0.5}, probability=0.5), min_probability=0.7).end
+            == 0.0
+        )
+        words = make_words(sentence + [' And'])
+        words[-1] = words[-1]._replace(start=words[9].end)
+        assert find_cut_mark(words, min_probability=0.7).end == 0.0
+
+    def test_biggest_gap_on_long_audio(self):
+        '''Test that a split is forced at the biggest gap from 10 seconds of audio on.'''
+
+        words = make_words([' word'] * 60, gap_after={20: 1.0, 40: 0.5})
+        assert words[-1].end >= 10
+
+        cut_mark = find_cut_mark(words, min_probability=0.7)
+
+        assert cut_mark == find_biggest_gap_between_words(words)
+        assert cut_mark.start == words[20].end
+        assert cut_mark.end == words[21].start
@@ -0,0 +1,60 @@
+import numpy as np
+from faster_whisper.feature_extractor import FeatureExtractor
+
+
+class MelCache:
+    """
+    Incremental log-Mel spectrogram of a participant's working audio.
+
+    An STFT frame only depends on the 400 samples around it, so once the audio extends far enough past a frame it
+    won't change anymore as long as the start of the audio stays put. The Mel power of those frames is kept and only
+    the frames over the new tail are computed on the next call. The log scaling depends on the maximum over the
+    whole spectrogram, so that part is still done over all the frames, but it's cheap compared to the FFTs.
+
+    The result is the same as calling the feature extractor on the whole audio. The audio passed in must keep
+    extending the audio of the previous call, anything else, e.g. trimming it, needs a `reset`.
+    """
+
+    def __init__(self, feature_extractor: FeatureExtractor):
+        self.feature_extractor = feature_extractor
+        self.window = np.hanning(feature_extractor.n_fft + 1)[:-1].astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self.mel_power = np.empty((self.feature_extractor.mel_filters.shape[0], 0), dtype=np.float32)
+
+    @property
+    def num_frames(self) -> int:
+        return self.mel_power.shape[-1]
+
+    def __call__(self, audio: np.ndarray) -> np.ndarray:
+        n_fft = self.feature_extractor.n_fft
+        hop_length = self.feature_extractor.hop_length
+        pad = n_fft // 2
+
+        # the first frames read into the reflection of the start of the audio, keep at least those
+        if self.num_frames > 2 and (self.num_frames - 1) * hop_length + pad > len(audio):
+            self.reset()
+
+        stable_frames = self.num_frames if self.num_frames > 2 else 0
+        # same padding as the feature extractor: zeros at the end, then reflected on both sides
+        if stable_frames:
+            tail = np.pad(audio[stable_frames * hop_length - pad :], (0, hop_length))
+            tail = np.pad(tail, (0, pad), mode='reflect')
+        else:
+            tail = np.pad(np.pad(audio, (0, hop_length)), pad, mode='reflect')
+
+        stft = self.feature_extractor.stft(
+            tail, n_fft, hop_length, window=self.window, center=False, return_complex=True
+        ).astype(np.complex64)
+        magnitudes = np.abs(stft[..., :-1]) ** 2
+        mel_power = np.concatenate(
+            (self.mel_power[:, :stable_frames], self.feature_extractor.mel_filters @ magnitudes), axis=1
+        )
+
+        # keep the frames that don't reach past the end of the audio
+        self.mel_power = mel_power[:, : max(0, (len(audio) - pad) // hop_length + 1)]
+
+        log_spec = np.log10(np.clip(mel_power, a_min=1e-10, a_max=None))
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        return (log_spec + 4.0) / 4.0
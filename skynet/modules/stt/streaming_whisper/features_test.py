@@ -0,0 +1,35 @@
+import numpy as np
+from faster_whisper.feature_extractor import FeatureExtractor
+
+from skynet.modules.stt.streaming_whisper.features import MelCache
+
+feature_extractor = FeatureExtractor()
+audio = (np.random.default_rng(0).standard_normal(16000 * 5) * 0.1).astype(np.float32)
+
+
+class TestMelCache:
+    def test_same_as_feature_extractor(self):
+        '''Test that the incremental spectrogram matches the one computed over the whole audio.'''
+
+        cache = MelCache(feature_extractor)
+
+        for end in range(4096, len(audio), 4096):
+            assert np.allclose(cache(audio[:end]), feature_extractor(audio[:end]), atol=1e-5)
+
+    def test_only_computes_the_tail(self):
+        '''Test that the frames over the audio seen before are kept.'''
+
+        cache = MelCache(feature_extractor)
+        cache(audio[:16000])
+        kept = cache.mel_power.copy()
+        cache(audio[:32000])
+
+        assert np.array_equal(cache.mel_power[:, : kept.shape[-1]], kept)
+
+    def test_shorter_audio_resets(self):
+        '''Test that audio not extending the previous audio doesn't reuse the frames.'''
+
+        cache = MelCache(feature_extractor)
+        cache(audio[:32000])
+
+        assert np.allclose(cache(audio[:16000]), feature_extractor(audio[:16000]), atol=1e-5)
@@ -0,0 +1,53 @@
+import heapq
+import itertools
+from typing import Hashable
+
+
+class FlushSchedule:
+    """
+    The participants to flush, ordered by the time their working audio is due for a forced transcription.
+
+    Every participant has at most one live deadline, rescheduling it leaves the previous entry in the heap to be
+    skipped when it comes up, and the heap is rebuilt once the stale entries outnumber the live ones.
+    """
+
+    deadlines: dict[Hashable, int]
+
+    def __init__(self):
+        self.deadlines = {}
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def schedule(self, key: Hashable, deadline: int):
+        if self.deadlines.get(key) == deadline:
+            return
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, next(self.counter), key))
+        if len(self.heap) > 2 * len(self.deadlines) + 16:
+            self.heap = [(d, next(self.counter), k) for k, d in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    def remove(self, key: Hashable):
+        self.deadlines.pop(key, None)
+
+    @property
+    def next_deadline(self) -> int | None:
+        while self.heap and self.deadlines.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: int) -> list[Hashable]:
+        """
+        Removes and returns the keys whose deadline has passed, the earliest first.
+        """
+
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == deadline:
+                del self.deadlines[key]
+                due.append(key)
+        return due
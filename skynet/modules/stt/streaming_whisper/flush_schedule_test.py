@@ -0,0 +1,49 @@
+from skynet.modules.stt.streaming_whisper.flush_schedule import FlushSchedule
+
+
+class TestFlushSchedule:
+    def test_pop_due(self):
+        '''Test that only the due keys are returned, the earliest first.'''
+
+        schedule = FlushSchedule()
+        schedule.schedule('b', 2000)
+        schedule.schedule('a', 1000)
+        schedule.schedule('c', 3000)
+
+        assert schedule.pop_due(2500) == ['a', 'b']
+        assert schedule.next_deadline == 3000
+        assert len(schedule) == 1
+
+    def test_reschedule(self):
+        '''Test that only the latest deadline of a key counts.'''
+
+        schedule = FlushSchedule()
+        schedule.schedule('a', 1000)
+        schedule.schedule('a', 4000)
+
+        assert schedule.pop_due(2000) == []
+        assert schedule.next_deadline == 4000
+        assert schedule.pop_due(4000) == ['a']
+        assert schedule.next_deadline is None
+
+    def test_remove(self):
+        '''Test that a removed key is not returned.'''
+
+        schedule = FlushSchedule()
+        schedule.schedule('a', 1000)
+        schedule.schedule('b', 1000)
+        schedule.remove('a')
+
+        assert schedule.pop_due(1000) == ['b']
+
+    def test_stale_entries_are_dropped(self):
+        '''Test that rescheduling the same keys doesn't grow the heap indefinitely.'''
+
+        schedule = FlushSchedule()
+        for deadline in range(1000):
+            schedule.schedule('a', deadline)
+            schedule.schedule('b', deadline)
+
+        assert len(schedule.heap) <= 2 * len(schedule) + 17
+        assert schedule.pop_due(998) == []
+        assert schedule.pop_due(999) == ['a', 'b']
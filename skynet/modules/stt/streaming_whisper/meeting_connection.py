@@ -1,46 +1,52 @@
-from itertools import chain
 from typing import List
 
 from faster_whisper.tokenizer import Tokenizer
 
 from starlette.websockets import WebSocket
 
-from skynet.env import whisper_max_finals_in_initial_prompt as max_finals
-
 from skynet.logs import get_logger
-from skynet.modules.stt.streaming_whisper.cfg import model
+from skynet.modules.monitoring import TRANSCRIBE_STAGE_DURATION_METRIC
+from skynet.modules.stt.streaming_whisper.cfg import hf_tokenizer
 from skynet.modules.stt.streaming_whisper.chunk import Chunk
+from skynet.modules.stt.streaming_whisper.prompt import PromptCache
+from skynet.modules.stt.streaming_whisper.protocol import TranscriptionResponse
 from skynet.modules.stt.streaming_whisper.state import State
 from skynet.modules.stt.streaming_whisper.utils import utils
+from skynet.modules.stt.streaming_whisper.worker_pool import worker_pool
 
 log = get_logger(__name__)
 
 
 class MeetingConnection:
     participants: dict[str, State] = {}
-    previous_transcription_tokens: List[int]
-    previous_transcription_store: List[List[int]]
+    prompt: PromptCache
     total_finals: int
     total_interims: int
     total_audio_received_s: float
     tokenizer: Tokenizer | None
     meeting_language: str | None
     meeting_id: str
+    worker_id: int | None
     ws: WebSocket
+    binary: bool
+    chunk_headers: dict[bytes, tuple[str, str]]
     connected: True
 
-    def __init__(self, ws: WebSocket, meeting_id: str):
+    def __init__(self, ws: WebSocket, meeting_id: str, binary: bool = False):
         self.participants = {}
         self.ws = ws
+        self.binary = binary
+        # the parsed chunk headers, they rarely change within a participant's stream
+        self.chunk_headers = {}
         self.meeting_id = meeting_id
-        self.previous_transcription_tokens = []
-        self.previous_transcription_store = []
+        self.prompt = PromptCache()
         self.total_finals = 0
         self.total_interims = 0
         self.total_audio_received_s = 0
         self.meeting_language = None
         self.tokenizer = None
         self.connected = True
+        self.worker_id = worker_pool.assign(meeting_id) if worker_pool.enabled else None
 
     async def update_connection_summary_stats(self, payloads):
         for payload in payloads:
@@ -49,32 +55,38 @@ class MeetingConnection:
             else:
                 self.total_interims += 1
 
-    async def update_initial_prompt(self, previous_payloads: list[utils.TranscriptionResponse]):
+    async def update_initial_prompt(self, previous_payloads: list[TranscriptionResponse]):
         for payload in previous_payloads:
             if payload.type == 'final' and not any(prompt in payload.text for prompt in utils.black_listed_prompts):
-                self.previous_transcription_store.append(self.tokenizer.encode(f' {payload.text.strip()}'))
-                if len(self.previous_transcription_tokens) > max_finals:
-                    self.previous_transcription_store.pop(0)
-                # flatten the list of lists
-                self.previous_transcription_tokens = list(chain.from_iterable(self.previous_transcription_store))
-
-    async def process(self, chunk: bytes, chunk_timestamp: int) -> List[utils.TranscriptionResponse] | None:
-        a_chunk = Chunk(chunk, chunk_timestamp)
+                self.prompt.add(self.tokenizer.encode(f' {payload.text.strip()}'))
+
+    async def add_chunk(self, chunk: bytes, chunk_timestamp: int) -> str:
+        """
+        Adds the chunk to its participant's working audio and returns the participant id.
+        """
+        with TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='parse', type='chunk').time():
+            a_chunk = Chunk(chunk, chunk_timestamp, self.chunk_headers)
         self.total_audio_received_s += a_chunk.duration
         # The first chunk sets the meeting language and initializes the Tokenizer
         if not self.meeting_language:
             self.meeting_language = a_chunk.language
             self.tokenizer = Tokenizer(
-                model.hf_tokenizer, multilingual=False, task='transcribe', language=self.meeting_language
+                hf_tokenizer, multilingual=False, task='transcribe', language=self.meeting_language
             )
 
         if a_chunk.participant_id not in self.participants:
             log.debug(
                 f'The participant {a_chunk.participant_id} is not in the participants list, creating a new state.'
             )
-            self.participants[a_chunk.participant_id] = State(a_chunk.participant_id, a_chunk.language)
+            self.participants[a_chunk.participant_id] = State(a_chunk.participant_id, a_chunk.language, self.worker_id)
+
+        await self.participants[a_chunk.participant_id].add_to_store(a_chunk)
+        return a_chunk.participant_id
 
-        payloads = await self.participants[a_chunk.participant_id].process(a_chunk, self.previous_transcription_tokens)
+    async def process(self, participant_id: str, queued_at: float | None = None) -> List[TranscriptionResponse] | None:
+        if participant_id not in self.participants:
+            return None
+        payloads = await self.participants[participant_id].process(self.prompt.tokens, queued_at)
         if payloads:
             await self.update_connection_summary_stats(payloads)
             await self.update_initial_prompt(payloads)
@@ -82,7 +94,7 @@ class MeetingConnection:
 
     async def force_transcription(self, participant_id: str):
         if participant_id in self.participants:
-            payloads = await self.participants[participant_id].force_transcription(self.previous_transcription_tokens)
+            payloads = await self.participants[participant_id].force_transcription(self.prompt.tokens)
             if payloads:
                 await self.update_connection_summary_stats(payloads)
                 await self.update_initial_prompt(payloads)
@@ -90,6 +102,9 @@ class MeetingConnection:
         return None
 
     def disconnect(self):
+        # a connection can be disconnected more than once, its worker is only released the first time
+        if self.connected and self.worker_id is not None:
+            worker_pool.release(self.meeting_id)
         self.connected = False
 
     async def close(self):
@@ -0,0 +1,29 @@
+from collections import deque
+from itertools import chain
+
+from skynet.env import whisper_max_finals_in_initial_prompt
+
+# the model only keeps the last 223 tokens of the previous text, see WhisperModel.get_prompt
+MAX_PROMPT_TOKENS = 223
+
+
+class PromptCache:
+    """
+    The tokens of the last finals of a meeting, used as the initial prompt of its transcription passes.
+
+    The prompt is rebuilt only when a final is added and is an immutable tuple, so the passes in flight and the
+    worker processes can hold on to it as is.
+    """
+
+    finals: deque[list[int]]
+    tokens: tuple[int, ...]
+
+    def __init__(self, max_finals: int = whisper_max_finals_in_initial_prompt):
+        self.finals = deque(maxlen=max_finals)
+        self.tokens = ()
+
+    def add(self, tokens: list[int]):
+        if self.finals.maxlen == 0:
+            return
+        self.finals.append(tokens)
+        self.tokens = tuple(chain.from_iterable(self.finals))[-MAX_PROMPT_TOKENS:]
@@ -0,0 +1,39 @@
+from skynet.modules.stt.streaming_whisper.prompt import MAX_PROMPT_TOKENS, PromptCache
+
+
+class TestPromptCache:
+    def test_keeps_the_last_finals(self):
+        '''Test that the prompt is made of the tokens of the last finals, in order.'''
+
+        cache = PromptCache(max_finals=2)
+        cache.add([1, 2, 3])
+        cache.add([4, 5])
+        cache.add([6])
+
+        assert cache.tokens == (4, 5, 6)
+
+    def test_counts_finals_not_tokens(self):
+        '''Test that long finals don't push the others out of the prompt.'''
+
+        cache = PromptCache(max_finals=2)
+        cache.add(list(range(10)))
+        cache.add(list(range(10, 20)))
+
+        assert cache.tokens == tuple(range(20))
+
+    def test_truncated(self):
+        '''Test that the prompt is never longer than what the model uses.'''
+
+        cache = PromptCache(max_finals=3)
+        for i in range(3):
+            cache.add(list(range(i * 100, (i + 1) * 100)))
+
+        assert cache.tokens == tuple(range(300 - MAX_PROMPT_TOKENS, 300))
+
+    def test_disabled(self):
+        '''Test that no prompt is kept without finals.'''
+
+        cache = PromptCache(max_finals=0)
+        cache.add([1, 2])
+
+        assert cache.tokens == ()
@@ -0,0 +1,52 @@
+import base64
+import json
+import struct
+
+from pydantic import BaseModel, field_serializer
+
+# offered by the clients in the Sec-WebSocket-Protocol header to get the results as binary frames
+BINARY_SUBPROTOCOL = 'skynet-binary-v1'
+
+header_length = struct.Struct('>I')
+
+
+class TranscriptionResponse(BaseModel):
+    id: str
+    participant_id: str
+    ts: int
+    text: str
+    audio: bytes = b''
+    type: str
+    variance: float
+
+    @field_serializer('audio')
+    def serialize_audio(self, audio: bytes) -> str:
+        # the JSON protocol carries the audio base64 encoded
+        return base64.b64encode(audio).decode('ASCII') if audio else ''
+
+
+def encode_results(results: list[TranscriptionResponse]) -> bytes:
+    """
+    Packs the results of a processing step into a single binary frame: the length of the header as a big-endian
+    uint32, the header, a UTF-8 JSON array of the results where `audio` is the size of their audio in bytes, then the
+    raw audio of every result one after the other.
+    """
+
+    header = json.dumps(
+        [{**result.model_dump(exclude={'audio'}), 'audio': len(result.audio)} for result in results],
+        separators=(',', ':'),
+    ).encode('utf-8')
+
+    return b''.join([header_length.pack(len(header)), header, *(result.audio for result in results)])
+
+
+def decode_results(frame: bytes) -> list[TranscriptionResponse]:
+    (length,) = header_length.unpack_from(frame)
+    offset = header_length.size + length
+    results = []
+    for result in json.loads(frame[header_length.size : offset]):
+        audio = frame[offset : offset + result['audio']]
+        offset += len(audio)
+        results.append(TranscriptionResponse(**{**result, 'audio': audio}))
+
+    return results
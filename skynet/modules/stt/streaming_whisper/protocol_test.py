@@ -0,0 +1,34 @@
+import base64
+
+from skynet.modules.stt.streaming_whisper.protocol import decode_results, encode_results, TranscriptionResponse
+
+
+def make_result(text: str, audio: bytes = b'', type: str = 'interim') -> TranscriptionResponse:
+    return TranscriptionResponse(
+        id='id', participant_id='participant', ts=1000, text=text, audio=audio, type=type, variance=0.9
+    )
+
+
+class TestProtocol:
+    def test_json_audio_is_base64(self):
+        '''Test that the JSON results still carry the audio base64 encoded.'''
+
+        assert make_result('text', b'\x00\x01\x02').model_dump()['audio'] == base64.b64encode(b'\x00\x01\x02').decode()
+        assert make_result('text').model_dump()['audio'] == ''
+
+    def test_round_trip(self):
+        '''Test that the results of a step are decoded from a single frame as they were sent.'''
+
+        results = [make_result('hello', b'\x01' * 10, 'final'), make_result('world'), make_result('again', b'\x02' * 3)]
+        decoded = decode_results(encode_results(results))
+
+        assert decoded == results
+
+    def test_raw_audio(self):
+        '''Test that the audio isn't encoded in the frame.'''
+
+        audio = bytes(range(256)) * 4
+        frame = encode_results([make_result('text', audio, 'final')])
+
+        assert frame.endswith(audio)
+        assert len(frame) < len(make_result('text', audio, 'final').model_dump_json())
@@ -0,0 +1,78 @@
+from itertools import chain
+from typing import Any, Iterator
+
+from skynet.modules.monitoring import TRANSCRIBE_AUDIO_RECEIVED_COUNTER, TRANSCRIBE_PARTICIPANTS_METRIC
+
+
+class MeetingLoad:
+    participants: int
+    audio_s: float
+
+    def __init__(self):
+        self.participants = 0
+        self.audio_s = 0.0
+
+
+class ConnectionRegistry:
+    """
+    The live connections by meeting id, along with node wide totals of their participants and of the audio they
+    sent, kept up to date as the connections change so that reading them doesn't need to go over every meeting.
+    """
+
+    meetings: dict[str, dict[Any, MeetingLoad]]
+
+    def __init__(self):
+        self.meetings = {}
+        self.num_connections = 0
+        self.num_participants = 0
+        self.audio_s = 0.0
+
+    def __len__(self) -> int:
+        return self.num_connections
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(list(connections) for connections in list(self.meetings.values()))
+
+    def __contains__(self, connection) -> bool:
+        return connection in self.meetings.get(connection.meeting_id, {})
+
+    def get(self, meeting_id: str) -> list:
+        return list(self.meetings.get(meeting_id, {}))
+
+    def add(self, connection):
+        connections = self.meetings.setdefault(connection.meeting_id, {})
+        if connection not in connections:
+            connections[connection] = MeetingLoad()
+            self.num_connections += 1
+
+    def update(self, connection):
+        """
+        Accounts for the participants and the audio the connection got since the last update.
+        """
+
+        load = self.meetings.get(connection.meeting_id, {}).get(connection)
+        if load is None:
+            return
+
+        participants = len(connection.participants)
+        audio_s = connection.total_audio_received_s
+        self.num_participants += participants - load.participants
+        self.audio_s += audio_s - load.audio_s
+        TRANSCRIBE_PARTICIPANTS_METRIC.set(self.num_participants)
+        TRANSCRIBE_AUDIO_RECEIVED_COUNTER.inc(max(0.0, audio_s - load.audio_s))
+        load.participants = participants
+        load.audio_s = audio_s
+
+    def remove(self, connection) -> bool:
+        connections = self.meetings.get(connection.meeting_id)
+        if connections is None or connection not in connections:
+            return False
+
+        load = connections.pop(connection)
+        if not connections:
+            del self.meetings[connection.meeting_id]
+        self.num_connections -= 1
+        self.num_participants -= load.participants
+        self.audio_s -= load.audio_s
+        TRANSCRIBE_PARTICIPANTS_METRIC.set(self.num_participants)
+        return True
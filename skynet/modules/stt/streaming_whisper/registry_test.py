@@ -0,0 +1,63 @@
+from skynet.modules.stt.streaming_whisper.registry import ConnectionRegistry
+
+
+class FakeConnection:
+    def __init__(self, meeting_id: str):
+        self.meeting_id = meeting_id
+        self.participants = {}
+        self.total_audio_received_s = 0.0
+
+
+class TestConnectionRegistry:
+    def test_by_meeting_id(self):
+        '''Test that the connections are found by meeting id and counted.'''
+
+        registry = ConnectionRegistry()
+        first, second, other = FakeConnection('meeting'), FakeConnection('meeting'), FakeConnection('other')
+        for connection in (first, second, other):
+            registry.add(connection)
+
+        assert len(registry) == 3
+        assert registry.get('meeting') == [first, second]
+        assert set(registry) == {first, second, other}
+
+        assert registry.remove(first)
+        assert not registry.remove(first)
+        assert first not in registry
+        assert len(registry) == 2
+        assert registry.get('meeting') == [second]
+
+    def test_totals(self):
+        '''Test that the participants and the audio are summed up as they change.'''
+
+        registry = ConnectionRegistry()
+        first, second = FakeConnection('first'), FakeConnection('second')
+        registry.add(first)
+        registry.add(second)
+
+        first.participants = {'a': None, 'b': None}
+        first.total_audio_received_s = 2.5
+        registry.update(first)
+        second.participants = {'c': None}
+        second.total_audio_received_s = 1.0
+        registry.update(second)
+        first.total_audio_received_s = 3.0
+        registry.update(first)
+
+        assert registry.num_participants == 3
+        assert registry.audio_s == 4.0
+
+        registry.remove(first)
+
+        assert registry.num_participants == 1
+        assert registry.audio_s == 1.0
+
+    def test_update_unknown_connection(self):
+        '''Test that updating a connection that was removed doesn't change the totals.'''
+
+        registry = ConnectionRegistry()
+        connection = FakeConnection('meeting')
+        connection.participants = {'a': None}
+        registry.update(connection)
+
+        assert registry.num_participants == 0
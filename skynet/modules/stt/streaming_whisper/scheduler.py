@@ -0,0 +1,182 @@
+import asyncio
+import time
+from asyncio import Future, Task
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from skynet.env import whisper_batch_size, whisper_batch_window_ms
+from skynet.logs import get_logger
+from skynet.modules.monitoring import TRANSCRIBE_STAGE_DURATION_METRIC
+from skynet.modules.stt.streaming_whisper.cfg import num_workers
+from skynet.modules.stt.streaming_whisper.utils import utils
+from skynet.modules.stt.streaming_whisper.worker_pool import worker_pool
+
+log = get_logger(__name__)
+
+
+class TranscriptionRequest:
+    audio: np.ndarray
+    lang: str
+    previous_tokens: tuple[int, ...]
+    worker_id: int | None
+    final: bool
+    future: Future
+    queued_at: float
+
+    def __init__(
+        self,
+        audio: np.ndarray,
+        lang: str,
+        previous_tokens: tuple[int, ...],
+        worker_id: int | None,
+        final: bool,
+        future: Future,
+    ):
+        self.audio = audio
+        self.lang = lang
+        self.previous_tokens = previous_tokens
+        self.worker_id = worker_id
+        self.final = final
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+    @property
+    def type(self) -> str:
+        return 'final' if self.final else 'interim'
+
+
+class InferenceScheduler:
+    """
+    Collects the transcription requests of all the participants in all the meetings and runs them through the model
+    in batches. While the model is busy, new requests pile up and are picked up together as soon as it frees up.
+    When it's idle, the scheduler waits `batch_window_ms` for other participants to join the batch.
+
+    Requests for meetings placed on a worker process are only batched together with the other requests of that
+    worker, which runs one batch at a time. Without worker processes, one batch runs per GPU.
+    """
+
+    pending: list[TranscriptionRequest]
+    worker_task: Task | None
+
+    def __init__(self, batch_size: int = whisper_batch_size, batch_window_ms: int = whisper_batch_window_ms):
+        self.batch_size = max(batch_size, 1)
+        self.batch_window_s = batch_window_ms / 1000
+        self.pending = []
+        self.wakeup = None
+        self.worker_task = None
+        self.running = defaultdict(int)
+        self.running_batches = set()
+        # the model gets its own threads, one per concurrent batch, instead of sharing the loop's default executor
+        self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='whisper')
+
+    async def transcribe(
+        self,
+        audio: np.ndarray,
+        lang: str,
+        previous_tokens: tuple[int, ...],
+        worker_id: int | None = None,
+        final: bool = False,
+    ) -> utils.WhisperResult:
+        loop = asyncio.get_running_loop()
+        if self.worker_task is None:
+            self.wakeup = asyncio.Event()
+            self.worker_task = loop.create_task(self.run())
+
+        request = TranscriptionRequest(audio, lang, previous_tokens, worker_id, final, loop.create_future())
+        self.pending.append(request)
+        self.wakeup.set()
+
+        return await request.future
+
+    @staticmethod
+    def capacity(worker_id: int | None) -> int:
+        return num_workers if worker_id is None else 1
+
+    def next_batch(self, worker_id: int | None) -> list[TranscriptionRequest]:
+        # requests are batched per language, the oldest request decides which language goes first
+        candidates = [request for request in self.pending if request.worker_id == worker_id]
+        lang = candidates[0].lang
+        batch = [request for request in candidates if request.lang == lang][: self.batch_size]
+        self.pending = [request for request in self.pending if request not in batch]
+
+        return batch
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            try:
+                await self.schedule()
+            except Exception as e:
+                # the scheduler has to keep running, the requests it couldn't place are failed instead
+                log.error(f'Failed to schedule the transcriptions: {e}')
+                pending, self.pending = self.pending, []
+                for request in pending:
+                    if not request.future.done():
+                        request.future.set_exception(RuntimeError(f'Failed to schedule the transcription: {e}'))
+
+    async def schedule(self):
+        if 0 < len(self.pending) < self.batch_size:
+            # give the other participants a chance to join the batch
+            await asyncio.sleep(self.batch_window_s)
+
+        # the workers are visited in the order of their oldest request
+        for worker_id in dict.fromkeys(request.worker_id for request in self.pending):
+            while self.running[worker_id] < self.capacity(worker_id) and any(
+                request.worker_id == worker_id for request in self.pending
+            ):
+                batch = self.next_batch(worker_id)
+                self.running[worker_id] += 1
+                task = asyncio.create_task(self.run_batch(worker_id, batch))
+                self.running_batches.add(task)
+                task.add_done_callback(self.running_batches.discard)
+
+    async def run_batch(self, worker_id: int | None, batch: list[TranscriptionRequest]):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for request in batch:
+            TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='queue', type=request.type).observe(start - request.queued_at)
+
+        try:
+            if worker_id is not None:
+                results = await worker_pool.transcribe(
+                    worker_id, [(request.audio, request.lang, request.previous_tokens) for request in batch]
+                )
+            elif len(batch) == 1:
+                request = batch[0]
+                results = [
+                    await loop.run_in_executor(
+                        self.executor, utils.transcribe, request.audio, request.lang, request.previous_tokens
+                    )
+                ]
+            else:
+                log.debug(f'Running a batch of {len(batch)} transcriptions')
+                results = await loop.run_in_executor(
+                    self.executor,
+                    utils.transcribe_batch,
+                    [(request.audio, request.lang, request.previous_tokens) for request in batch],
+                )
+
+            decode_time = time.perf_counter() - start
+            for request, result in zip(batch, results):
+                TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='decode', type=request.type).observe(
+                    decode_time - result.conversion_time
+                )
+                TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='result', type=request.type).observe(
+                    result.conversion_time
+                )
+                if not request.future.done():
+                    request.future.set_result(result)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self.running[worker_id] -= 1
+            self.wakeup.set()
+
+
+scheduler = InferenceScheduler()
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from skynet.modules.stt.streaming_whisper import scheduler as scheduler_module
+from skynet.modules.stt.streaming_whisper.scheduler import InferenceScheduler
+
+
+def result(text: str) -> SimpleNamespace:
+    return SimpleNamespace(text=text, conversion_time=0.0)
+
+
+def audio() -> np.ndarray:
+    return np.zeros(16000, dtype=np.float32)
+
+
+@pytest_asyncio.fixture
+async def create_scheduler():
+    schedulers = []
+
+    def create(batch_size: int, batch_window_ms: int) -> InferenceScheduler:
+        schedulers.append(InferenceScheduler(batch_size=batch_size, batch_window_ms=batch_window_ms))
+        return schedulers[-1]
+
+    yield create
+
+    for scheduler in schedulers:
+        if scheduler.worker_task:
+            scheduler.worker_task.cancel()
+
+
+class TestInferenceScheduler:
+    @pytest.mark.asyncio
+    async def test_batches_by_language(self, create_scheduler, mocker):
+        '''Test that the requests are batched per language, starting with the language of the oldest request.'''
+
+        batches = []
+
+        def transcribe_batch(batch):
+            batches.append([lang for _, lang, _ in batch])
+            return [result(lang) for _, lang, _ in batch]
+
+        mocker.patch.object(scheduler_module.utils, 'transcribe_batch', side_effect=transcribe_batch)
+        mocker.patch.object(scheduler_module.utils, 'transcribe', side_effect=lambda _, lang, __: result(lang))
+        scheduler = create_scheduler(batch_size=4, batch_window_ms=10)
+
+        results = await asyncio.gather(
+            *(scheduler.transcribe(audio(), lang, ()) for lang in ('en', 'fr', 'en', 'fr', 'de'))
+        )
+
+        assert [result.text for result in results] == ['en', 'fr', 'en', 'fr', 'de']
+        assert batches == [['en', 'en'], ['fr', 'fr']]
+
+    @pytest.mark.asyncio
+    async def test_batch_size(self, create_scheduler, mocker):
+        '''Test that a batch holds at most batch size requests.'''
+
+        batches = []
+
+        def transcribe_batch(batch):
+            batches.append(len(batch))
+            return [result(lang) for _, lang, _ in batch]
+
+        mocker.patch.object(scheduler_module.utils, 'transcribe_batch', side_effect=transcribe_batch)
+        scheduler = create_scheduler(batch_size=2, batch_window_ms=10)
+
+        await asyncio.gather(*(scheduler.transcribe(audio(), 'en', ()) for _ in range(4)))
+
+        assert batches == [2, 2]
+
+    @pytest.mark.asyncio
+    async def test_one_batch_per_worker(self, create_scheduler, mocker):
+        '''Test that a worker process runs one batch at a time, while the other workers run theirs.'''
+
+        running = {0: 0, 1: 0}
+        max_running = {0: 0, 1: 0}
+
+        async def transcribe(worker_id, items):
+            running[worker_id] += 1
+            max_running[worker_id] = max(max_running[worker_id], running[worker_id])
+            await asyncio.sleep(0.01)
+            running[worker_id] -= 1
+            return [result(lang) for _, lang, _ in items]
+
+        mocker.patch.object(scheduler_module.worker_pool, 'transcribe', side_effect=transcribe)
+        scheduler = create_scheduler(batch_size=1, batch_window_ms=0)
+
+        await asyncio.gather(*(scheduler.transcribe(audio(), 'en', (), worker_id=i % 2) for i in range(6)))
+
+        assert max_running == {0: 1, 1: 1}
+        assert scheduler.running == {0: 0, 1: 0}
+
+    @pytest.mark.asyncio
+    async def test_failed_batch(self, create_scheduler, mocker):
+        '''Test that a failed batch fails its requests and frees up its slot for the next ones.'''
+
+        mocker.patch.object(
+            scheduler_module.utils, 'transcribe', side_effect=[RuntimeError('out of memory'), result('en')]
+        )
+        scheduler = create_scheduler(batch_size=1, batch_window_ms=0)
+
+        with pytest.raises(RuntimeError, match='out of memory'):
+            await scheduler.transcribe(audio(), 'en', ())
+
+        assert (await scheduler.transcribe(audio(), 'en', ())).text == 'en'
+
+    @pytest.mark.asyncio
+    async def test_scheduling_error(self, create_scheduler, mocker):
+        '''Test that the scheduler fails the pending requests when it can't place them, and keeps running.'''
+
+        mocker.patch.object(scheduler_module.utils, 'transcribe', return_value=result('en'))
+        scheduler = create_scheduler(batch_size=1, batch_window_ms=0)
+        mocker.patch.object(scheduler, 'next_batch', side_effect=IndexError('no requests'))
+
+        with pytest.raises(RuntimeError, match='no requests'):
+            await asyncio.wait_for(scheduler.transcribe(audio(), 'en', ()), 1)
+
+        assert not scheduler.worker_task.done()
+        assert scheduler.running[None] == 0
@@ -1,20 +1,44 @@
 import asyncio
-import base64
+import copy
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
-from skynet.env import whisper_return_transcribed_audio as return_audio
+import numpy as np
+
+from skynet.env import (
+    whisper_cache_features,
+    whisper_early_final_silence_ms,
+    whisper_return_transcribed_audio as return_audio,
+    whisper_vad_threads,
+)
 
 from skynet.logs import get_logger
-from skynet.modules.monitoring import TRANSCRIBE_DURATION_METRIC
+from skynet.modules.monitoring import (
+    TRANSCRIBE_DURATION_METRIC,
+    TRANSCRIBE_EARLY_FINALS_COUNTER,
+    TRANSCRIBE_STAGE_DURATION_METRIC,
+    TRANSCRIBE_THROTTLED_PASSES_COUNTER,
+)
+from skynet.modules.stt.streaming_whisper.audio_buffer import AudioBuffer, BYTES_PER_SAMPLE, SAMPLE_RATE
+from skynet.modules.stt.streaming_whisper.cadence import interim_cadence
+from skynet.modules.stt.streaming_whisper.cfg import feature_extractor, vad_model
 from skynet.modules.stt.streaming_whisper.chunk import Chunk
+from skynet.modules.stt.streaming_whisper.cut_mark import CutMark, get_phrase_prob
+from skynet.modules.stt.streaming_whisper.features import MelCache
+from skynet.modules.stt.streaming_whisper.protocol import TranscriptionResponse
+from skynet.modules.stt.streaming_whisper.scheduler import scheduler
 from skynet.modules.stt.streaming_whisper.utils import utils
+from skynet.modules.stt.streaming_whisper.vad import StreamingVad
 
 log = get_logger(__name__)
 
+# the VAD and the features run off the event loop so that a busy node doesn't stall every other meeting's websocket
+vad_executor = ThreadPoolExecutor(max_workers=whisper_vad_threads, thread_name_prefix='vad')
+
 
 class State:
-    working_audio: bytes
+    working_audio: AudioBuffer
     silent_chunks: int
     transcription_id: str
     long_silence: bool
@@ -23,18 +47,24 @@ class State:
     last_received_chunk: int
     last_speech_timestamp: float
     total_audio_received_s: float
+    new_audio_s: float
+    vad: StreamingVad
+    lock: asyncio.Lock
+    mel_cache: MelCache | None
 
     def __init__(
         self,
         participant_id: str,
         lang: str = 'en',
+        worker_id: int | None = None,
     ):
         self.working_audio_starts_at = 0
         self.participant_id = participant_id
         self.silent_chunks = 0
         self.chunk_count = 0
-        self.working_audio = b''
+        self.working_audio = AudioBuffer()
         self.lang = lang
+        self.worker_id = worker_id
         self.long_silence = False
         self.uuid = utils.Uuid7()
         self.transcription_id = str(self.uuid.get())
@@ -42,10 +72,18 @@ class State:
         self.is_transcribing = False
         self.last_speech_timestamp = 0.0
         self.total_audio_received_s = 0.0
+        # the speech added since the last transcription pass started
+        self.new_audio_s = 0.0
+        # the silence since the end of the last speech, including the silent chunks left out of the working audio
+        self.trailing_silence_s = 0.0
+        self.vad = StreamingVad(copy.deepcopy(vad_model))
+        # guards the working audio and the VAD against the transcription passes and the flushes
+        self.lock = asyncio.Lock()
+        self.mel_cache = MelCache(feature_extractor) if whisper_cache_features else None
 
     def _extract_transcriptions(
-        self, last_pause: utils.CutMark, ts_result: utils.WhisperResult
-    ) -> List[utils.TranscriptionResponse]:
+        self, last_pause: CutMark, ts_result: utils.WhisperResult
+    ) -> List[TranscriptionResponse]:
         if ts_result is None:
             return []
         results = []
@@ -78,6 +116,7 @@ class State:
                 final_raw_audio = self.trim_working_audio(cut_mark_bytes)
 
                 if return_audio:
+                    final_raw_audio = final_raw_audio.tobytes()
                     final_audio_length = utils.convert_bytes_to_seconds(final_raw_audio)
                     final_audio = utils.get_wav_header([final_raw_audio], final_audio_length) + final_raw_audio
                 results.append(
@@ -104,72 +143,134 @@ class State:
             )
         return results
 
-    async def force_transcription(self, previous_tokens) -> List[utils.TranscriptionResponse] | None:
+    async def force_transcription(
+        self, previous_tokens, queued_at: float | None = None
+    ) -> List[TranscriptionResponse] | None:
         results = None
-        if self.is_transcribing:
-            return results
-        ts_result = await self.do_transcription(self.working_audio, previous_tokens)
-        if ts_result.text.strip():
-            results = []
-            start_timestamp = int(ts_result.words[0].start * 1000) + self.working_audio_starts_at
-            final_audio = None
-            if return_audio:
-                final_audio_length = utils.convert_bytes_to_seconds(self.working_audio)
-                final_audio = utils.get_wav_header([self.working_audio], final_audio_length) + self.working_audio
-            results.append(
-                self.get_response_payload(
-                    ts_result.text.strip(),
-                    start_timestamp,
-                    final_audio,
-                    True,
-                    probability=utils.get_phrase_prob(len(ts_result.words) - 1, ts_result.words),
+        async with self.lock:
+            if self.is_transcribing:
+                return results
+            # taken under the lock, so it only holds the chunks the VAD has kept
+            audio = self.working_audio.samples
+        ts_result = await self.do_transcription(audio, previous_tokens, final=True, queued_at=queued_at)
+        async with self.lock:
+            if ts_result is not None and ts_result.text.strip():
+                results = []
+                start_timestamp = int(ts_result.words[0].start * 1000) + self.working_audio_starts_at
+                final_audio = None
+                if return_audio:
+                    working_audio = self.working_audio.pcm[: len(audio)].tobytes()
+                    final_audio_length = utils.convert_bytes_to_seconds(working_audio)
+                    final_audio = utils.get_wav_header([working_audio], final_audio_length) + working_audio
+                results.append(
+                    self.get_response_payload(
+                        ts_result.text.strip(),
+                        start_timestamp,
+                        final_audio,
+                        True,
+                        probability=get_phrase_prob(len(ts_result.words) - 1, ts_result.words),
+                    )
                 )
-            )
-        self.reset()
+            if len(self.working_audio) > len(audio) * BYTES_PER_SAMPLE:
+                # only the transcribed audio is dropped, the speech added during the pass is left for the next one
+                timeline_before_trim = self.working_audio_starts_at
+                self.trim_working_audio(len(audio) * BYTES_PER_SAMPLE)
+                self.working_audio_starts_at = timeline_before_trim + int(len(audio) / SAMPLE_RATE * 1000)
+            else:
+                self.reset()
         return results
 
-    async def process(self, chunk: Chunk, previous_tokens: list[int]) -> List[utils.TranscriptionResponse] | None:
-        await self.add_to_store(chunk, self.working_audio + chunk.raw)
-        if not self.long_silence and not self.is_transcribing:
-            ts_result = await self.do_transcription(self.working_audio, previous_tokens)
-            last_pause = utils.get_cut_mark_from_segment_probability(ts_result)
-            results = self._extract_transcriptions(last_pause, ts_result)
+    async def process(
+        self, previous_tokens: tuple[int, ...], queued_at: float | None = None
+    ) -> List[TranscriptionResponse] | None:
+        """
+        Runs a transcription pass over the working audio as it is now, including any chunks added since the pass
+        was requested at `queued_at`.
+        """
+        async with self.lock:
+            ends_utterance = self.ends_utterance()
+        if ends_utterance:
+            # no need to wait for the flush, the participant stopped talking
+            log.debug(f'Participant {self.participant_id}: end of speech, finalising the working audio')
+            TRANSCRIBE_EARLY_FINALS_COUNTER.inc()
+            return await self.force_transcription(previous_tokens, queued_at)
+        if not self.long_silence and not self.is_transcribing and self.working_audio:
+            # the first silent chunk after speech is where a final is likely, that pass is never held back
+            if self.silent_chunks != 1 and not interim_cadence.should_transcribe(self.new_audio_s):
+                log.debug(f'Participant {self.participant_id}: interim pass held back by the cadence')
+                TRANSCRIBE_THROTTLED_PASSES_COUNTER.inc()
+                return None
+            async with self.lock:
+                if self.is_transcribing or not self.working_audio:
+                    return None
+                self.new_audio_s = 0.0
+                # taken under the lock, so it only holds the chunks the VAD has kept
+                audio = self.working_audio.samples
+            ts_result = await self.do_transcription(audio, previous_tokens, queued_at=queued_at)
+            async with self.lock:
+                with TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='cut_mark', type='interim').time():
+                    last_pause = utils.get_cut_mark_from_segment_probability(ts_result)
+                results = self._extract_transcriptions(last_pause, ts_result)
             if len(results) > 0:
                 return results
         log.debug(f'Participant {self.participant_id}: no ts results')
         return None
 
-    async def add_to_store(self, chunk: Chunk, tmp_working_audio: bytes = b''):
+    def ends_utterance(self) -> bool:
+        """
+        Whether the participant has been silent long enough to finalise the working audio. Call with the lock held.
+        """
+
+        return (
+            whisper_early_final_silence_ms > 0
+            and self.trailing_silence_s * 1000 >= whisper_early_final_silence_ms
+            and not self.is_transcribing
+            and bool(self.working_audio)
+        )
+
+    async def add_to_store(self, chunk: Chunk):
+        async with self.lock:
+            await self._add_to_store(chunk)
+
+    async def _add_to_store(self, chunk: Chunk):
         now_millis = utils.now()
         self.chunk_count += 1
         self.total_audio_received_s += chunk.duration
-        # if the working audio is empty, set the start timestamp
-        if not self.working_audio:
-            self.working_audio_starts_at = chunk.timestamp - int(chunk.duration * 1000)
-        # retrieve the word timestamps from the new working audio
-        _, speech_timestamps = utils.is_silent(tmp_working_audio)
-        log.debug(f'## Participant {self.participant_id}: speech timestamps {speech_timestamps}')
+        # score only the new chunk, the VAD keeps track of the speech timestamps of the working audio. The chunk is only
+        # appended once the VAD keeps it, so a pass started meanwhile never transcribes or caches a dropped chunk.
+        # there's no result type yet at this point, the per chunk stages are labelled as such
+        with TRANSCRIBE_STAGE_DURATION_METRIC.labels(stage='vad', type='chunk').time():
+            speech_end = await asyncio.get_running_loop().run_in_executor(vad_executor, self.vad.feed, chunk.raw)
+        log.debug(f'## Participant {self.participant_id}: speech end {speech_end}')
         log.debug(f'## Participant {self.participant_id}: last speech timestamp {self.last_speech_timestamp}')
         # if, after adding the chunk, Silero VAD detects that
         # the last speech timestamp has changed
         # update the buffer and the last received chunk timestamp
-        if speech_timestamps and speech_timestamps[-1]['end'] != self.last_speech_timestamp:
-            self.last_speech_timestamp = speech_timestamps[-1]['end']
+        if speech_end is not None and speech_end != self.last_speech_timestamp:
+            # if the working audio is empty, set the start timestamp
+            if not self.working_audio:
+                self.working_audio_starts_at = chunk.timestamp - int(chunk.duration * 1000)
+            self.working_audio.append(chunk.raw)
+            self.last_speech_timestamp = speech_end
             self.last_received_chunk = now_millis
-            self.working_audio = tmp_working_audio
             self.long_silence = False
             self.silent_chunks = 0
+            self.new_audio_s += chunk.duration
+            self.trailing_silence_s = max(0.0, self.vad.duration - speech_end)
         else:
             log.debug(f'## Participant {self.participant_id}: chunk is silent')
             # if the last word timestamp is the same as the previous one
             # the chunk is silent
             self.silent_chunks += 1
+            self.trailing_silence_s += chunk.duration
             # if the chunk is silent and the last word timestamp is older than 1s
             # set the long silence flag
-            audio_length_seconds = utils.convert_bytes_to_seconds(tmp_working_audio)
-            if speech_timestamps and audio_length_seconds - speech_timestamps[-1]['end'] >= 1:
+            audio_length_seconds = self.vad.duration
+            if speech_end is not None and audio_length_seconds - speech_end >= 1:
                 log.debug(f'## Participant {self.participant_id}: long silence detected')
                 self.long_silence = True
+            # the chunk is not kept in the working audio
+            self.vad.rollback()
 
         log.debug(
             f'Participant {self.participant_id}: chunk length {chunk.size} bytes, '
@@ -177,13 +278,17 @@ class State:
             f'total chunks {self.chunk_count}.'
         )
 
-    def trim_working_audio(self, bytes_to_cut: int) -> bytes:
+    def trim_working_audio(self, bytes_to_cut: int) -> np.ndarray:
         log.debug(
             f'Participant {self.participant_id}: '
             + f'trimming the audio buffer, current length is {len(self.working_audio)} bytes.'
         )
-        dropped_chunk = self.working_audio[:bytes_to_cut]
-        self.working_audio = self.working_audio[bytes_to_cut:]
+        dropped_chunk = self.working_audio.trim(bytes_to_cut)
+        self.vad.trim(bytes_to_cut // 2)
+        # keeps the speech end comparable with the one the VAD reports for the next chunk
+        self.last_speech_timestamp = self.vad.get_speech_end() or 0.0
+        if self.mel_cache:
+            self.mel_cache.reset()
         if len(self.working_audio) == 0:
             self.working_audio_starts_at = 0
         log.debug(
@@ -194,19 +299,19 @@ class State:
 
     def get_response_payload(
         self, transcription: str, start_timestamp: int, final_audio: bytes | None = None, final: bool = False, **kwargs
-    ) -> utils.TranscriptionResponse:
+    ) -> TranscriptionResponse:
         prob = kwargs.get('probability', 0.5)
         if not self.transcription_id:
             self.transcription_id = str(self.uuid.get(start_timestamp))
         ts_id = self.transcription_id
         if final:
             self.transcription_id = ''
-        return utils.TranscriptionResponse(
+        return TranscriptionResponse(
             id=ts_id,
             participant_id=self.participant_id,
             ts=start_timestamp,
             text=transcription,
-            audio=base64.b64encode(final_audio).decode('ASCII') if final_audio else '',
+            audio=final_audio or b'',
             type='final' if final else 'interim',
             variance=prob,
         )
@@ -217,8 +322,13 @@ class State:
         """
         log.debug(f'Participant {self.participant_id}: flushing working audio')
         self.working_audio_starts_at = 0
-        self.working_audio = b''
+        self.working_audio.clear()
+        self.trailing_silence_s = 0.0
         self.last_speech_timestamp = 0.0
+        self.new_audio_s = 0.0
+        self.vad.reset()
+        if self.mel_cache:
+            self.mel_cache.reset()
 
     @staticmethod
     def get_num_bytes_for_slicing(cut_mark: float) -> int:
@@ -229,13 +339,21 @@ class State:
         log.debug(f'Sliceable bytes: {sliceable_bytes}')
         return sliceable_bytes
 
-    async def do_transcription(self, audio: bytes, previous_tokens: list[int]) -> utils.WhisperResult | None:
+    async def do_transcription(
+        self,
+        audio: np.ndarray,
+        previous_tokens: tuple[int, ...],
+        final: bool = False,
+        queued_at: float | None = None,
+    ) -> utils.WhisperResult | None:
         self.is_transcribing = True
         start = time.perf_counter_ns()
-        loop = asyncio.get_running_loop()
-        log.debug(f'Participant {self.participant_id}: starting transcription of {len(audio)} bytes.')
+        log.debug(f'Participant {self.participant_id}: starting transcription of {len(audio)} samples.')
         try:
-            ts_result = await loop.run_in_executor(None, utils.transcribe, [audio], self.lang, previous_tokens)
+            if self.mel_cache:
+                # only the spectrogram of the audio added since the previous pass needs computing
+                audio = await asyncio.get_running_loop().run_in_executor(vad_executor, self.mel_cache, audio)
+            ts_result = await scheduler.transcribe(audio, self.lang, previous_tokens, self.worker_id, final)
         except RuntimeError as e:
             log.error(f'Participant {self.participant_id}: failed to transcribe {e}')
             self.is_transcribing = False
@@ -243,6 +361,8 @@ class State:
         end = time.perf_counter_ns()
         processing_time = (end - start) / 1e6 / 1000
         TRANSCRIBE_DURATION_METRIC.observe(processing_time)
+        # the cadence follows the latency since the pass was queued, its wait for the other passes included
+        interim_cadence.observe(processing_time if queued_at is None else time.perf_counter() - queued_at)
         log.debug(ts_result)
         self.is_transcribing = False
         return ts_result
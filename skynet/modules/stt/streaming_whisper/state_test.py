@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import pytest
+
+from skynet.modules.stt.streaming_whisper import state as state_module
+from skynet.modules.stt.streaming_whisper.chunk import Chunk, HEADER_SIZE
+from skynet.modules.stt.streaming_whisper.cut_mark import WhisperWord
+from skynet.modules.stt.streaming_whisper.state import State
+from skynet.modules.stt.streaming_whisper.vad_test import FakeVadModel, pcm
+
+HEADER = 'participant|en'.encode().ljust(HEADER_SIZE, b'\x00')
+
+
+def chunk(speech_s: float = 0.0, silence_s: float = 0.0, timestamp: int = 0) -> Chunk:
+    return Chunk(HEADER + pcm(speech_s, silence_s), timestamp)
+
+
+def whisper_result(text: str) -> SimpleNamespace:
+    return SimpleNamespace(text=text, words=[WhisperWord(probability=0.9, word=text, start=0.0, end=1.0)])
+
+
+@pytest.fixture
+def state(mocker):
+    mocker.patch.object(state_module, 'whisper_early_final_silence_ms', 500)
+    mocker.patch.object(state_module, 'vad_model', FakeVadModel())
+
+    return State('participant')
+
+
+async def add_speech_and_pause(state: State):
+    # the VAD pads the end of the speech, so the first silent chunk is kept in the working audio
+    await state.add_to_store(chunk(speech_s=1.024, timestamp=1024))
+    for i in range(3):
+        await state.add_to_store(chunk(silence_s=0.256, timestamp=1280 + 256 * i))
+
+
+class TestEarlyFinal:
+    @pytest.mark.asyncio
+    async def test_trailing_silence(self, state):
+        '''Test that the silence after the speech is counted, including the silent chunks left out of the audio.'''
+
+        await state.add_to_store(chunk(speech_s=1.024, timestamp=1024))
+        assert state.trailing_silence_s == pytest.approx(0.024)
+
+        await state.add_to_store(chunk(silence_s=0.256, timestamp=1280))
+        await state.add_to_store(chunk(silence_s=0.256, timestamp=1536))
+        assert state.trailing_silence_s == pytest.approx(0.436)
+        assert not state.ends_utterance()
+
+        await state.add_to_store(chunk(silence_s=0.256, timestamp=1792))
+        assert state.trailing_silence_s == pytest.approx(0.692)
+        assert state.ends_utterance()
+        assert len(state.working_audio) == 1.28 * 16000 * 2
+
+    @pytest.mark.asyncio
+    async def test_speech_resets_trailing_silence(self, state):
+        '''Test that speech after a pause starts counting the silence again.'''
+
+        await add_speech_and_pause(state)
+        await state.add_to_store(chunk(speech_s=0.512, timestamp=2560))
+
+        assert state.trailing_silence_s == pytest.approx(0.0, abs=0.1)
+        assert not state.ends_utterance()
+
+    @pytest.mark.asyncio
+    async def test_keeps_speech_added_during_the_pass(self, state, mocker):
+        '''Test that an early final only drops the audio it transcribed.'''
+
+        await add_speech_and_pause(state)
+
+        async def do_transcription(audio, previous_tokens, final=False, queued_at=None):
+            assert final
+            assert len(audio) == 1.28 * 16000
+            # the participant starts talking again while the final is transcribed
+            await state.add_to_store(chunk(speech_s=0.512, timestamp=2560))
+            return whisper_result('hello')
+
+        mocker.patch.object(state, 'do_transcription', side_effect=do_transcription)
+
+        results = await state.process(())
+
+        assert [(result.text, result.type) for result in results] == [('hello', 'final')]
+        assert len(state.working_audio) == 0.512 * 16000 * 2
+        assert state.working_audio_starts_at == 1280
+        assert not state.ends_utterance()
+
+    @pytest.mark.asyncio
+    async def test_resets_when_all_audio_was_transcribed(self, state, mocker):
+        '''Test that an early final empties the working audio when nothing was added during the pass.'''
+
+        await add_speech_and_pause(state)
+        mocker.patch.object(state, 'do_transcription', return_value=whisper_result('hello'))
+
+        results = await state.process(())
+
+        assert results[0].type == 'final'
+        assert not state.working_audio
+        assert state.trailing_silence_s == 0.0
+
+    @pytest.mark.asyncio
+    async def test_not_while_transcribing(self, state, mocker):
+        '''Test that no early final is started while another pass is running.'''
+
+        await add_speech_and_pause(state)
+        state.is_transcribing = True
+        do_transcription = mocker.patch.object(state, 'do_transcription')
+
+        assert await state.process(()) is None
+        do_transcription.assert_not_called()
+
+
+class TestPassLatency:
+    @pytest.mark.asyncio
+    async def test_from_admission(self, state, mocker):
+        '''Test that the cadence gets the latency of a pass since it was admitted, its wait in the queue included.'''
+
+        mocker.patch.object(state_module.scheduler, 'transcribe', return_value=whisper_result('hello'))
+        interim_cadence = mocker.patch.object(state_module, 'interim_cadence')
+        mocker.patch.object(state_module.time, 'perf_counter', return_value=12.0)
+
+        await state.do_transcription(pcm(1.0), (), queued_at=10.0)
+
+        interim_cadence.observe.assert_called_once_with(2.0)
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from skynet.modules.stt.streaming_whisper.utils import utils
+
+N_MELS = 80
+
+
+class FakeTokenizer:
+    def decode(self, tokens: list[int]) -> str:
+        return ' '.join(f'word{token}' for token in tokens)
+
+
+def fake_model(generation_results: list) -> MagicMock:
+    '''A model which returns the given generation results, one segment of one word per item that isn't silent.'''
+
+    model = MagicMock()
+    model.model.is_multilingual = False
+    model.model.generate.return_value = generation_results
+    model.feature_extractor.nb_max_frames = 3000
+    model.feature_extractor.time_per_frame = 0.01
+    model.encode.side_effect = lambda features: features
+    model.get_prompt.return_value = []
+    model._split_segments_by_timestamps.side_effect = lambda tokenizer, tokens, **kwargs: (
+        [{'start': 0.0, 'end': 1.0, 'tokens': tokens}] if tokens else [],
+        None,
+        None,
+    )
+
+    def add_word_timestamps(batch_segments, *args, **kwargs):
+        for segments in batch_segments:
+            for segment in segments:
+                segment['words'] = [{'start': 0.0, 'end': 1.0, 'word': ' word', 'probability': 0.9}]
+
+    model.add_word_timestamps.side_effect = add_word_timestamps
+
+    return model
+
+
+def generation_result(score: float = -0.1, no_speech_prob: float = 0.0) -> SimpleNamespace:
+    return SimpleNamespace(sequences_ids=[[1, 2, 3]], scores=[score], no_speech_prob=no_speech_prob)
+
+
+def mel(num_frames: int) -> np.ndarray:
+    return np.zeros((N_MELS, num_frames + 1), dtype=np.float32)
+
+
+class TestTranscribeBatch:
+    def test_batched_results(self, mocker):
+        '''Test that every item of the batch gets its own result from a single pass.'''
+
+        model = fake_model([generation_result(), generation_result()])
+        mocker.patch.object(utils.cfg, 'model', model)
+        mocker.patch.object(utils, 'get_tokenizer', return_value=FakeTokenizer())
+        mocker.patch.object(utils, 'get_suppressed_tokens', return_value=[])
+        transcribe = mocker.patch.object(utils, 'transcribe')
+
+        results = utils.transcribe_batch([(mel(100), 'en', ()), (mel(200), 'en', ())])
+
+        assert [result.text for result in results] == ['word1 word2 word3'] * 2
+        assert [len(result.words) for result in results] == [1, 1]
+        model.model.generate.assert_called_once()
+        transcribe.assert_not_called()
+
+    def test_fallback(self, mocker):
+        '''Test that the items the batched pass can't handle are transcribed again on their own.'''
+
+        model = fake_model([generation_result(), generation_result(score=-2.0), generation_result()])
+        mocker.patch.object(utils.cfg, 'model', model)
+        mocker.patch.object(utils, 'get_tokenizer', return_value=FakeTokenizer())
+        mocker.patch.object(utils, 'get_suppressed_tokens', return_value=[])
+        transcribe = mocker.patch.object(utils, 'transcribe', return_value='fallback')
+        low_probability = mel(100)
+        too_long = mel(3000)
+
+        results = utils.transcribe_batch([(mel(100), 'en', ()), (low_probability, 'en', (1,)), (too_long, 'en', ())])
+
+        assert results[0].text == 'word1 word2 word3'
+        assert results[1:] == ['fallback', 'fallback']
+        assert transcribe.call_args_list[0].args[0] is low_probability
+        assert transcribe.call_args_list[0].args[1:] == ('en', (1,))
+        assert transcribe.call_args_list[1].args[0] is too_long
+
+    def test_silence(self, mocker):
+        '''Test that an item the model finds silent gets an empty result instead of a fallback.'''
+
+        model = fake_model([generation_result(score=-1.5, no_speech_prob=0.9)])
+        mocker.patch.object(utils.cfg, 'model', model)
+        mocker.patch.object(utils, 'get_tokenizer', return_value=FakeTokenizer())
+        mocker.patch.object(utils, 'get_suppressed_tokens', return_value=[])
+        transcribe = mocker.patch.object(utils, 'transcribe')
+
+        results = utils.transcribe_batch([(mel(100), 'en', ())])
+
+        assert results[0].text == ''
+        transcribe.assert_not_called()
@@ -1,29 +1,37 @@
+import dataclasses
 import secrets
 import time
 from datetime import datetime, timezone
-from typing import List, Tuple
+from functools import lru_cache
+from inspect import signature
+from typing import List, NamedTuple, Tuple
 
 import numpy as np
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import (
+    get_compression_ratio,
+    get_suppressed_tokens,
+    Segment,
+    TranscriptionOptions,
+    WhisperModel,
+    Word,
+)
 from numpy import ndarray
-from pydantic import BaseModel
-from silero_vad import get_speech_timestamps, read_audio
 from uuid6 import UUID
 
 import skynet.modules.stt.streaming_whisper.cfg as cfg
-from skynet.env import whisper_beam_size, whisper_min_probability
+from skynet.env import whisper_beam_size
 from skynet.logs import get_logger
+from skynet.modules.stt.streaming_whisper.cut_mark import CutMark, find_cut_mark, WhisperWord
 
 log = get_logger(__name__)
 
-
-class WhisperWord(BaseModel):
-    probability: float
-    word: str
-    start: float
-    end: float
+transcribe_defaults = {name: param.default for name, param in signature(WhisperModel.transcribe).parameters.items()}
 
 
-class WhisperSegment(BaseModel):
+# a plain tuple as well, see WhisperWord
+class WhisperSegment(NamedTuple):
     id: int
     seek: int
     start: float
@@ -34,23 +42,7 @@ class WhisperSegment(BaseModel):
     avg_logprob: float
     compression_ratio: float
     no_speech_prob: float
-    words: List
-
-
-class TranscriptionResponse(BaseModel):
-    id: str
-    participant_id: str
-    ts: int
-    text: str
-    audio: str
-    type: str
-    variance: float
-
-
-class CutMark(BaseModel):
-    start: float = 0.0
-    end: float = 0.0
-    probability: float = 0.0
+    words: List[WhisperWord]
 
 
 class WhisperResult:
@@ -59,12 +51,34 @@ class WhisperResult:
     words: list[WhisperWord]
     confidence: float
     language: str
+    conversion_time: float
 
     def __init__(self, ts_result):
+        start = time.perf_counter()
         self.text = ''.join([segment.text for segment in ts_result])
-        self.segments = [WhisperSegment.model_validate(segment._asdict()) for segment in ts_result]
-        self.words = [WhisperWord.model_validate(word._asdict()) for segment in ts_result for word in segment.words]
+        self.segments = []
+        self.words = []
+        for segment in ts_result:
+            words = [WhisperWord(word.probability, word.word, word.start, word.end) for word in segment.words or []]
+            self.words.extend(words)
+            self.segments.append(
+                WhisperSegment(
+                    segment.id,
+                    segment.seek,
+                    segment.start,
+                    segment.end,
+                    segment.text,
+                    segment.tokens,
+                    segment.temperature,
+                    segment.avg_logprob,
+                    segment.compression_ratio,
+                    segment.no_speech_prob,
+                    words,
+                )
+            )
         self.confidence = self.get_confidence()
+        # kept on the result since it's built wherever the model runs, possibly in a worker process
+        self.conversion_time = time.perf_counter() - start
 
     def __str__(self):
         return (
@@ -196,64 +210,8 @@ def convert_seconds_to_bytes(cut_mark: float) -> int:
     return int(cut_mark / cfg.one_byte_s)
 
 
-def is_silent(audio: bytes) -> Tuple[bool, iter]:
-    chunk_duration = convert_bytes_to_seconds(audio)
-    wav_header = get_wav_header([audio], chunk_duration_s=chunk_duration)
-    stream = wav_header + b'' + audio
-    audio = read_audio(stream)
-    st = get_speech_timestamps(audio, model=cfg.vad_model, return_seconds=True)
-    log.debug(f'Detected speech timestamps: {st}')
-    silent = True if len(st) == 0 else False
-    return silent, st
-
-
-def get_phrase_prob(last_word_idx: int, words: list[WhisperWord]) -> float:
-    word_number = last_word_idx + 1
-    return sum([word.probability for word in words[:word_number]]) / word_number
-
-
-def find_biggest_gap_between_words(word_list: list[WhisperWord]) -> CutMark:
-    prev_word = word_list[0]
-    biggest_gap_so_far = 0.0
-    result = CutMark()
-    for i, word in enumerate(word_list):
-        if i == 0:
-            continue
-        diff = word.start - prev_word.end
-        probability = get_phrase_prob(i - 1, word_list)
-        if diff > biggest_gap_so_far:
-            biggest_gap_so_far = diff
-            result = CutMark(start=prev_word.end, end=word.start, probability=probability)
-            log.debug(f'Biggest gap between words:\n{result}')
-        prev_word = word
-    return result
-
-
 def get_cut_mark_from_segment_probability(ts_result: WhisperResult) -> CutMark:
-    check_len = len(ts_result.words) - 1
-    phrase = ''
-    if len(ts_result.words) > 1:
-        # force a final at the biggest gap between words found if the audio is longer than 10 seconds
-        if ts_result.words[-1].end >= 10:
-            return find_biggest_gap_between_words(ts_result.words)
-        for i, word in enumerate(ts_result.words):
-            if i == check_len:
-                break
-            phrase += word.word
-            avg_probability = get_phrase_prob(i, ts_result.words)
-            if len(phrase) >= 48:
-                if (
-                    avg_probability >= whisper_min_probability
-                    and word.word[-1] in ['.', '!', '?']
-                    and word.end < ts_result.words[i + 1].start
-                ):
-                    log.debug(f'Found split at {word.word} ({word.end} - {ts_result.words[i+1].start})')
-                    log.debug(f'Avg probability: {avg_probability}')
-                    return CutMark(start=word.end, end=ts_result.words[i + 1].start, probability=avg_probability)
-                else:
-                    if ts_result.words[-1].end >= 15:
-                        return find_biggest_gap_between_words(ts_result.words)
-    return CutMark()
+    return find_cut_mark(ts_result.words)
 
 
 def get_wav_header(chunks: List[bytes], chunk_duration_s: float = 0.256, sample_rate: int = 16000) -> bytes:
@@ -278,7 +236,10 @@ def get_wav_header(chunks: List[bytes], chunk_duration_s: float = 0.256, sample_
     return o
 
 
-def load_audio(byte_array: bytes) -> ndarray:
+def load_audio(byte_array: bytes | ndarray) -> ndarray:
+    if isinstance(byte_array, ndarray) and byte_array.dtype == np.float32:
+        # already normalised samples, e.g. a view of the participant's working audio
+        return byte_array
     return np.frombuffer(byte_array, np.int16).flatten().astype(np.float32) / 32768.0
 
 
@@ -287,26 +248,162 @@ def now() -> int:
     return int(datetime.now(timezone.utc).timestamp() * 1000)
 
 
-def transcribe(buffer_list: List[bytes], lang: str = 'en', previous_tokens=None) -> WhisperResult:
+def transcribe(buffer_list: List[bytes] | ndarray, lang: str = 'en', previous_tokens=None) -> WhisperResult:
+    """
+    Transcribes the given audio, or its already computed log-Mel spectrogram.
+    """
     if previous_tokens is None:
         previous_tokens = []
-    audio_bytes = b''.join(buffer_list)
-    audio = load_audio(audio_bytes)
-    iterator, _ = cfg.model.transcribe(
-        audio,
-        language=lang,
-        task='transcribe',
-        word_timestamps=True,
-        beam_size=whisper_beam_size,
-        initial_prompt=previous_tokens,
-        condition_on_previous_text=False,
-    )
+    if isinstance(buffer_list, ndarray) and buffer_list.ndim == 2:
+        iterator = transcribe_features(buffer_list, lang, previous_tokens)
+    else:
+        audio = load_audio(buffer_list if isinstance(buffer_list, ndarray) else b''.join(buffer_list))
+        iterator, _ = cfg.model.transcribe(
+            audio,
+            language=lang,
+            task='transcribe',
+            word_timestamps=True,
+            beam_size=whisper_beam_size,
+            initial_prompt=previous_tokens,
+            condition_on_previous_text=False,
+        )
     res = list(iterator)
     ts_obj = WhisperResult(res)
     log.debug(f'Transcription results:\n{ts_obj}\n{res}')
     return ts_obj
 
 
+@lru_cache
+def get_tokenizer(lang: str) -> Tokenizer:
+    return Tokenizer(cfg.model.hf_tokenizer, cfg.model.model.is_multilingual, task='transcribe', language=lang)
+
+
+def transcribe_features(features: ndarray, lang: str, previous_tokens: list[int]):
+    """
+    Same as the model's `transcribe` with the options used in `transcribe`, but starting from the log-Mel spectrogram.
+    """
+    model = cfg.model
+    tokenizer = get_tokenizer(lang if model.model.is_multilingual else 'en')
+    params = transcribe_defaults | dict(
+        beam_size=whisper_beam_size,
+        word_timestamps=True,
+        initial_prompt=previous_tokens,
+        condition_on_previous_text=False,
+    )
+    params['temperatures'] = params['temperature']
+    params['suppress_tokens'] = get_suppressed_tokens(tokenizer, params['suppress_tokens'])
+    options = TranscriptionOptions(
+        **{field.name: params[field.name] for field in dataclasses.fields(TranscriptionOptions)}
+    )
+
+    return model.generate_segments(features, tokenizer, options, False)
+
+
+def transcribe_batch(batch: List[Tuple[bytes | ndarray, str, list[int]]]) -> List[WhisperResult]:
+    """
+    Transcribes the working audio of several participants with a single batched encoder and decoder pass.
+
+    All the items in the batch need to share the same language. Items longer than one Whisper window or whose
+    greedy output would need a temperature fallback are transcribed again on their own through `transcribe`.
+    """
+    model = cfg.model
+    lang = batch[0][1] if model.model.is_multilingual else 'en'
+    tokenizer = get_tokenizer(lang)
+    feature_extractor = model.feature_extractor
+
+    features = []
+    segment_sizes = []
+    for audio, _, _ in batch:
+        # either the audio or its log-Mel spectrogram
+        mel = audio if isinstance(audio, ndarray) and audio.ndim == 2 else feature_extractor(load_audio(audio))
+        content_frames = mel.shape[-1] - 1
+        segment_sizes.append(min(feature_extractor.nb_max_frames, content_frames))
+        features.append(pad_or_trim(mel[:, :content_frames]))
+
+    encoder_output = model.encode(np.stack(features))
+    prompts = [model.get_prompt(tokenizer, previous_tokens or ()) for _, _, previous_tokens in batch]
+    generation_results = model.model.generate(
+        encoder_output,
+        prompts,
+        beam_size=whisper_beam_size,
+        max_length=model.max_length,
+        return_scores=True,
+        return_no_speech_prob=True,
+        suppress_blank=True,
+        suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+        max_initial_timestamp_index=int(round(1.0 / model.time_precision)),
+    )
+
+    batch_segments = []
+    batch_scores = []
+    needs_fallback = []
+    for i, result in enumerate(generation_results):
+        tokens = result.sequences_ids[0]
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+        compression_ratio = get_compression_ratio(tokenizer.decode(tokens).strip())
+        # same thresholds as the faster-whisper defaults
+        is_silence = result.no_speech_prob > 0.6 and avg_logprob <= -1.0
+        if is_silence:
+            tokens = []
+
+        segments, _, _ = model._split_segments_by_timestamps(
+            tokenizer=tokenizer,
+            tokens=tokens,
+            time_offset=0.0,
+            segment_size=segment_sizes[i],
+            segment_duration=segment_sizes[i] * feature_extractor.time_per_frame,
+            seek=0,
+        )
+        batch_segments.append(segments)
+        batch_scores.append((avg_logprob, compression_ratio, result.no_speech_prob))
+        needs_fallback.append(
+            not is_silence
+            and (segment_sizes[i] >= feature_extractor.nb_max_frames or compression_ratio > 2.4 or avg_logprob < -1.0)
+        )
+
+    model.add_word_timestamps(
+        batch_segments,
+        tokenizer,
+        encoder_output,
+        segment_sizes,
+        "\"'“¿([{-",
+        "\"'.。,，!！?？:：”)]}、",
+        last_speech_timestamp=0.0,
+    )
+
+    ts_results = []
+    for i, (audio, item_lang, previous_tokens) in enumerate(batch):
+        if needs_fallback[i]:
+            ts_results.append(transcribe(load_audio(audio), item_lang, previous_tokens))
+            continue
+
+        avg_logprob, compression_ratio, no_speech_prob = batch_scores[i]
+        res = []
+        for segment in batch_segments[i]:
+            text = tokenizer.decode(segment['tokens'])
+            if segment['start'] == segment['end'] or not text.strip():
+                continue
+            res.append(
+                Segment(
+                    id=len(res) + 1,
+                    seek=0,
+                    start=segment['start'],
+                    end=segment['end'],
+                    text=text,
+                    tokens=segment['tokens'],
+                    avg_logprob=avg_logprob,
+                    compression_ratio=compression_ratio,
+                    no_speech_prob=no_speech_prob,
+                    words=[Word(**word) for word in segment['words']],
+                    temperature=0.0,
+                )
+            )
+        ts_results.append(WhisperResult(res))
+
+    log.debug(f'Batched transcription of {len(batch)} items')
+    return ts_results
+
+
 def get_lang(lang: str, short=True) -> str:
     if len(lang) == 2 and short:
         return lang.lower().strip()
@@ -0,0 +1,167 @@
+import numpy as np
+import torch
+
+from skynet.logs import get_logger
+
+log = get_logger(__name__)
+
+SAMPLE_RATE = 16000
+WINDOW_SIZE_SAMPLES = 512  # the only window size supported by Silero VAD for 16kHz audio
+
+
+class StreamingVad:
+    """
+    Incremental Silero VAD for a single participant.
+
+    Replicates the segmentation done by Silero's `get_speech_timestamps`, but the model only scores the samples
+    appended since the previous call and the speech segments are tracked as the windows come in, so the cost per
+    chunk stays the same no matter how long the working audio gets. All positions are relative to the start of the
+    participant's working audio and need to be kept in sync with it through `rollback`, `trim` and `reset`.
+
+    The model is stateful, so every participant needs its own copy.
+    """
+
+    def __init__(
+        self,
+        model,
+        threshold: float = 0.5,
+        min_speech_duration_ms: int = 250,
+        min_silence_duration_ms: int = 100,
+        speech_pad_ms: int = 30,
+    ):
+        self.model = model
+        self.threshold = threshold
+        self.neg_threshold = max(threshold - 0.15, 0.01)
+        self.min_speech_samples = SAMPLE_RATE * min_speech_duration_ms / 1000
+        self.min_silence_samples = SAMPLE_RATE * min_silence_duration_ms / 1000
+        self.speech_pad_samples = int(SAMPLE_RATE * speech_pad_ms / 1000)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets everything about the working audio and resets the model state.
+        """
+
+        self.model.reset_states()
+        self.pending = np.empty(0, dtype=np.float32)  # trailing samples which don't fill up a window yet
+        self.scored_samples = 0
+        self.triggered = False
+        self.speech_start = 0
+        self.temp_end = 0
+        self.last_speech_end: int | None = None
+        self.snapshot = None
+
+    @property
+    def num_samples(self) -> int:
+        return self.scored_samples + len(self.pending)
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / SAMPLE_RATE
+
+    def feed(self, audio: bytes | np.ndarray) -> float | None:
+        """
+        Scores the given 16-bit PCM audio, or float32 samples, as if it was appended to the working audio and returns
+        the end of the last speech segment in seconds, or None if no speech was detected at all. Call `rollback` if the
+        audio ends up not being appended to the working audio.
+        """
+
+        self.snapshot = (
+            self.pending,
+            self.scored_samples,
+            self.triggered,
+            self.speech_start,
+            self.temp_end,
+            self.last_speech_end,
+        )
+
+        if isinstance(audio, np.ndarray) and audio.dtype == np.float32:
+            samples = np.concatenate((self.pending, audio))
+        else:
+            pcm = np.frombuffer(audio, dtype=np.int16) if not isinstance(audio, np.ndarray) else audio
+            samples = np.concatenate((self.pending, pcm.astype(np.float32) / 32768.0))
+        num_windows = len(samples) // WINDOW_SIZE_SAMPLES
+
+        with torch.no_grad():
+            for i in range(num_windows):
+                window = torch.from_numpy(samples[i * WINDOW_SIZE_SAMPLES : (i + 1) * WINDOW_SIZE_SAMPLES])
+                self._update(self.model(window, SAMPLE_RATE).item())
+                self.scored_samples += WINDOW_SIZE_SAMPLES
+
+        self.pending = samples[num_windows * WINDOW_SIZE_SAMPLES :]
+
+        return self.get_speech_end()
+
+    def rollback(self):
+        """
+        Drops the audio passed to the last `feed` call from the working audio.
+
+        The model state is kept as is since the model did hear that audio.
+        """
+
+        if self.snapshot is None:
+            return
+
+        (
+            self.pending,
+            self.scored_samples,
+            self.triggered,
+            self.speech_start,
+            self.temp_end,
+            self.last_speech_end,
+        ) = self.snapshot
+        self.snapshot = None
+
+    def trim(self, num_samples: int):
+        """
+        Drops the first `num_samples` samples of the working audio.
+        """
+
+        excess = num_samples - self.scored_samples
+        if excess > 0:
+            self.pending = self.pending[excess:]
+
+        self.scored_samples = max(0, self.scored_samples - num_samples)
+        self.speech_start = max(0, self.speech_start - num_samples)
+        if self.temp_end:
+            self.temp_end = max(1, self.temp_end - num_samples)
+        if self.last_speech_end is not None:
+            self.last_speech_end -= num_samples
+            if self.last_speech_end <= 0:
+                self.last_speech_end = None
+        self.snapshot = None
+
+    def get_speech_end(self) -> float | None:
+        total = self.num_samples
+        end = None
+
+        if self.triggered and total - self.speech_start > self.min_speech_samples:
+            end = total
+        elif self.last_speech_end is not None:
+            end = min(total, self.last_speech_end + self.speech_pad_samples)
+
+        if end is None:
+            return None
+
+        return min(round(end / SAMPLE_RATE, 1), total / SAMPLE_RATE)
+
+    def _update(self, speech_prob: float):
+        position = self.scored_samples
+
+        if speech_prob >= self.threshold and self.temp_end:
+            self.temp_end = 0
+
+        if speech_prob >= self.threshold and not self.triggered:
+            self.triggered = True
+            self.speech_start = position
+            return
+
+        if speech_prob < self.neg_threshold and self.triggered:
+            if not self.temp_end:
+                self.temp_end = position
+            if position - self.temp_end < self.min_silence_samples:
+                return
+            if self.temp_end - self.speech_start > self.min_speech_samples:
+                self.last_speech_end = self.temp_end
+            self.triggered = False
+            self.temp_end = 0
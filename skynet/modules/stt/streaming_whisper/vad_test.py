@@ -0,0 +1,80 @@
+import numpy as np
+import torch
+
+from skynet.modules.stt.streaming_whisper.vad import SAMPLE_RATE, StreamingVad, WINDOW_SIZE_SAMPLES
+
+
+class FakeVadModel:
+    '''Scores a window as speech if its first sample is not zero.'''
+
+    def __init__(self):
+        self.calls = 0
+
+    def reset_states(self):
+        pass
+
+    def __call__(self, window, sr):
+        self.calls += 1
+        return torch.tensor([[0.9 if window[0] != 0 else 0.0]])
+
+
+def pcm(speech_s: float = 0.0, silence_s: float = 0.0) -> bytes:
+    speech = np.full(int(speech_s * SAMPLE_RATE), 1000, dtype=np.int16)
+    silence = np.zeros(int(silence_s * SAMPLE_RATE), dtype=np.int16)
+    return np.concatenate((speech, silence)).tobytes()
+
+
+class TestStreamingVad:
+    def test_only_scores_new_audio(self):
+        '''Test that the model only runs on the samples appended since the previous call.'''
+
+        model = FakeVadModel()
+        vad = StreamingVad(model)
+
+        for _ in range(20):
+            vad.feed(pcm(speech_s=0.256))
+
+        assert model.calls == 20 * 0.256 * SAMPLE_RATE // WINDOW_SIZE_SAMPLES
+
+    def test_ongoing_speech_ends_at_the_end_of_the_audio(self):
+        '''Test that ongoing speech is reported as ending at the end of the working audio.'''
+
+        vad = StreamingVad(FakeVadModel())
+
+        assert vad.feed(pcm(speech_s=0.512)) == 0.5
+        assert vad.feed(pcm(speech_s=0.512)) == 1.0
+
+    def test_speech_end_after_silence(self):
+        '''Test that speech followed by silence ends where the silence starts, plus padding.'''
+
+        vad = StreamingVad(FakeVadModel())
+
+        assert vad.feed(pcm(speech_s=1.024, silence_s=0.512)) == 1.1
+
+    def test_no_speech(self):
+        '''Test that silence alone is not reported as speech.'''
+
+        vad = StreamingVad(FakeVadModel())
+
+        assert vad.feed(pcm(silence_s=1.024)) is None
+
+    def test_rollback(self):
+        '''Test that rolled back audio doesn't count towards the working audio.'''
+
+        vad = StreamingVad(FakeVadModel())
+        vad.feed(pcm(speech_s=1.024, silence_s=0.512))
+        vad.feed(pcm(silence_s=0.256))
+        vad.rollback()
+
+        assert vad.num_samples == int(1.536 * SAMPLE_RATE)
+        assert vad.get_speech_end() == 1.1
+
+    def test_trim(self):
+        '''Test that trimming the working audio shifts the speech timestamps.'''
+
+        vad = StreamingVad(FakeVadModel())
+        vad.feed(pcm(speech_s=1.024, silence_s=0.512))
+        vad.trim(int(0.512 * SAMPLE_RATE))
+
+        assert vad.num_samples == int(1.024 * SAMPLE_RATE)
+        assert vad.get_speech_end() == 0.5
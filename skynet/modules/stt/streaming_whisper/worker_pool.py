@@ -0,0 +1,262 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import traceback
+from asyncio import Future
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from skynet.env import whisper_worker_processes
+from skynet.logs import get_logger
+
+log = get_logger(__name__)
+
+# a worker that exited is started again after this many seconds, so that one that can't start doesn't spin
+RESPAWN_DELAY_S = 1
+
+
+def worker_main(worker_id: int, cpu_threads: int, requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+    """
+    Entry point of a worker process. Loads its own copy of the model and transcribes the audio it finds in the shared
+    memory segments it's handed, until it receives None.
+    """
+
+    # imported here, as the model is only loaded when running as a worker
+    from skynet.modules.stt.streaming_whisper import cfg
+    from skynet.modules.stt.streaming_whisper.utils import utils
+
+    cfg.model = cfg.load_model(cpu_threads, [cfg.gpu_indices[worker_id % len(cfg.gpu_indices)]])
+    responses.put((None, worker_id, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, items = message
+        segments = []
+        batch = []
+        try:
+            for name, shape, lang, previous_tokens in items:
+                # the segment is unlinked by the main process once the results are back
+                shm = SharedMemory(name=name)
+                segments.append(shm)
+                batch.append((np.ndarray(shape, dtype=np.float32, buffer=shm.buf), lang, previous_tokens))
+
+            if len(batch) == 1:
+                results = [utils.transcribe(*batch[0])]
+            else:
+                results = utils.transcribe_batch(batch)
+
+            responses.put((request_id, results, None))
+        except Exception as e:
+            log.error(f'Whisper worker {worker_id}: failed to transcribe {e}')
+            responses.put((request_id, None, traceback.format_exc()))
+        finally:
+            # the views need to go before the segments can be closed
+            batch.clear()
+            for shm in segments:
+                shm.close()
+
+
+class WorkerPool:
+    """
+    Runs the model in separate processes so a node can use all its cores from a single Skynet instance.
+
+    Every meeting is placed on the least loaded worker when it starts and stays there, the audio is copied into
+    shared memory segments instead of being pickled and only the results are sent back through a queue. If a worker
+    exits, the transcriptions it was running fail instead of waiting forever, and it is started again for its
+    meetings.
+    """
+
+    futures: dict[int, tuple[int, Future]]
+    meetings: dict[str, int]
+    connections: dict[str, int]
+
+    def __init__(self, num_processes: int = whisper_worker_processes):
+        self.num_processes = num_processes
+        self.processes = []
+        self.requests = []
+        self.responses = None
+        self.futures = {}
+        self.meetings = {}
+        # the connections of each meeting, a meeting can be joined more than once with the same id
+        self.connections = {}
+        self.num_meetings = [0] * num_processes
+        self.inflight = [0] * num_processes
+        self.request_ids = itertools.count()
+        self.context = None
+        self.cpu_threads = 1
+        self.loop = None
+        self.reader = None
+        self.stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.num_processes > 0
+
+    def start(self):
+        if not self.enabled or self.processes:
+            return
+
+        self.context = multiprocessing.get_context('spawn')
+        self.cpu_threads = max(1, (os.cpu_count() or 1) // self.num_processes)
+        self.loop = asyncio.get_running_loop()
+        self.responses = self.context.Queue()
+        self.processes = [None] * self.num_processes
+        self.requests = [None] * self.num_processes
+
+        for worker_id in range(self.num_processes):
+            self.spawn(worker_id)
+
+        self.reader = threading.Thread(target=self.read_responses, name='whisper-worker-responses', daemon=True)
+        self.reader.start()
+        log.info(f'Started {self.num_processes} whisper worker processes with {self.cpu_threads} threads each')
+
+    def spawn(self, worker_id: int):
+        requests = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main,
+            args=(worker_id, self.cpu_threads, requests, self.responses),
+            name=f'whisper-worker-{worker_id}',
+            daemon=True,
+        )
+        process.start()
+        self.requests[worker_id] = requests
+        self.processes[worker_id] = process
+        self.watch(worker_id, process)
+
+    def stop(self):
+        self.stopping = True
+        for requests in self.requests:
+            requests.put(None)
+        if self.responses is not None:
+            self.responses.put((None, None, None))
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes = []
+        self.requests = []
+
+    def read_responses(self):
+        while True:
+            request_id, result, error = self.responses.get()
+            if request_id is None and result is None:
+                break
+            self.loop.call_soon_threadsafe(self.resolve, request_id, result, error)
+
+    def watch(self, worker_id: int, process):
+        threading.Thread(
+            target=self.wait_for_exit,
+            args=(worker_id, process),
+            name=f'whisper-worker-{worker_id}-watcher',
+            daemon=True,
+        ).start()
+
+    def wait_for_exit(self, worker_id: int, process):
+        process.join()
+        self.loop.call_soon_threadsafe(self.fail_worker, worker_id, process.exitcode)
+
+    def fail_worker(self, worker_id: int, exitcode: int | None):
+        """
+        Fails the transcriptions a worker was running when it exited, their results will never come, and starts it
+        again for its meetings.
+        """
+
+        if not self.stopping:
+            meetings = [
+                meeting_id for meeting_id, meeting_worker_id in self.meetings.items() if meeting_worker_id == worker_id
+            ]
+            log.error(
+                f'Whisper worker {worker_id} exited with code {exitcode}, restarting it for the meetings {meetings}'
+            )
+            self.loop.call_later(RESPAWN_DELAY_S, self.respawn, worker_id)
+
+        for request_id, (request_worker_id, future) in list(self.futures.items()):
+            if request_worker_id != worker_id:
+                continue
+            del self.futures[request_id]
+            if not future.done():
+                future.set_exception(RuntimeError(f'Whisper worker {worker_id} is not running'))
+
+    def respawn(self, worker_id: int):
+        if not self.stopping:
+            self.spawn(worker_id)
+
+    def resolve(self, request_id: int | None, result, error: str | None):
+        if request_id is None:
+            log.info(f'Whisper worker {result} is ready')
+            return
+
+        _, future = self.futures.pop(request_id, (None, None))
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(result)
+
+    def assign(self, meeting_id: str) -> int:
+        """
+        Places the meeting on the worker with the fewest meetings, then the fewest transcriptions in flight.
+        """
+
+        if meeting_id not in self.meetings:
+            worker_id = min(range(self.num_processes), key=lambda i: (self.num_meetings[i], self.inflight[i]))
+            self.meetings[meeting_id] = worker_id
+            self.num_meetings[worker_id] += 1
+            log.info(f'Meeting {meeting_id} placed on whisper worker {worker_id}')
+
+        self.connections[meeting_id] = self.connections.get(meeting_id, 0) + 1
+
+        return self.meetings[meeting_id]
+
+    def release(self, meeting_id: str):
+        """
+        Releases a connection of the meeting, the meeting leaves its worker with the last one.
+        """
+
+        if meeting_id not in self.connections:
+            return
+
+        self.connections[meeting_id] -= 1
+        if self.connections[meeting_id] == 0:
+            del self.connections[meeting_id]
+            self.num_meetings[self.meetings.pop(meeting_id)] -= 1
+
+    async def transcribe(self, worker_id: int, items: list[tuple[np.ndarray, str, list[int]]]) -> list:
+        """
+        Transcribes the audio, or the log-Mel spectrograms, of a batch on the given worker.
+        """
+
+        if worker_id >= len(self.processes) or not self.processes[worker_id].is_alive():
+            raise RuntimeError(f'Whisper worker {worker_id} is not running')
+
+        segments = []
+        self.inflight[worker_id] += 1
+        try:
+            payload = []
+            for audio, lang, previous_tokens in items:
+                shm = SharedMemory(create=True, size=max(audio.nbytes, 1))
+                segments.append(shm)
+                view = np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)
+                view[:] = audio
+                del view
+                payload.append((shm.name, audio.shape, lang, previous_tokens or ()))
+
+            request_id = next(self.request_ids)
+            future = self.loop.create_future()
+            self.futures[request_id] = (worker_id, future)
+            self.requests[worker_id].put((request_id, payload))
+
+            return await future
+        finally:
+            self.inflight[worker_id] -= 1
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+
+worker_pool = WorkerPool()
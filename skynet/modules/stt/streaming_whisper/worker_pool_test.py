@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+
+from skynet.modules.stt.streaming_whisper import worker_pool
+from skynet.modules.stt.streaming_whisper.worker_pool import WorkerPool
+
+
+class TestAssign:
+    def test_least_loaded_worker(self):
+        '''Test that meetings are spread over the workers.'''
+
+        pool = WorkerPool(num_processes=2)
+
+        assert pool.assign('a') == 0
+        assert pool.assign('b') == 1
+        assert pool.assign('c') == 0
+        assert pool.num_meetings == [2, 1]
+
+    def test_same_meeting_id(self):
+        '''Test that the connections of a meeting share its worker, which it only leaves with the last one.'''
+
+        pool = WorkerPool(num_processes=2)
+
+        assert pool.assign('a') == 0
+        assert pool.assign('a') == 0
+        assert pool.num_meetings == [1, 0]
+
+        pool.release('a')
+        assert pool.num_meetings == [1, 0]
+        assert pool.assign('b') == 1
+
+        pool.release('a')
+        pool.release('a')
+        assert pool.num_meetings == [0, 1]
+        assert pool.assign('c') == 0
+
+
+class TestTranscribe:
+    @pytest.mark.asyncio
+    async def test_not_started(self):
+        '''Test that a transcription fails if the workers weren't started.'''
+
+        pool = WorkerPool(num_processes=1)
+
+        with pytest.raises(RuntimeError, match='not running'):
+            await pool.transcribe(0, [(np.zeros(16000, dtype=np.float32), 'en', [])])
+
+    @pytest.mark.asyncio
+    async def test_worker_exits(self, mocker):
+        '''
+        Test that a transcription fails when its worker exits before answering, the worker is released, and started
+        again for its meetings.
+        '''
+
+        context = multiprocessing.get_context('spawn')
+        # stands in for a worker which dies while transcribing, it never reads its requests
+        process = context.Process(target=time.sleep, args=(1,), daemon=True)
+        process.start()
+
+        mocker.patch.object(worker_pool, 'RESPAWN_DELAY_S', 0)
+        pool = WorkerPool(num_processes=1)
+        spawn = mocker.patch.object(pool, 'spawn')
+        pool.loop = asyncio.get_running_loop()
+        pool.processes = [process]
+        pool.requests = [context.Queue()]
+        pool.assign('meeting')
+        pool.watch(0, process)
+
+        with pytest.raises(RuntimeError, match='not running'):
+            await asyncio.wait_for(pool.transcribe(0, [(np.zeros(16000, dtype=np.float32), 'en', [])]), 30)
+
+        assert pool.inflight == [0]
+        assert not pool.futures
+
+        with pytest.raises(RuntimeError, match='not running'):
+            await pool.transcribe(0, [(np.zeros(16000, dtype=np.float32), 'en', [])])
+
+        # the meeting stays on the worker, which is started again
+        await asyncio.sleep(0.01)
+        spawn.assert_called_once_with(0)
+        assert pool.meetings == {'meeting': 0}
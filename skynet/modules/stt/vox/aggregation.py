@@ -0,0 +1,29 @@
+from enum import Enum
+
+from skynet.env import vox_max_window_ms, vox_window_ms
+from skynet.modules.stt.streaming_whisper.cadence import interim_cadence
+
+# the streaming whisper clients send 256 ms chunks
+LOW_LATENCY_WINDOW_MS = 256
+
+
+class AggregationMode(Enum):
+    FIXED = 'fixed'
+    LOW_LATENCY = 'low_latency'
+    HIGH_THROUGHPUT = 'high_throughput'
+    ADAPTIVE = 'adaptive'
+
+
+def get_window_ms(mode: AggregationMode) -> int:
+    """
+    How much telephony audio in milliseconds a participant's window gathers before it's forwarded.
+    """
+
+    if mode == AggregationMode.LOW_LATENCY:
+        return LOW_LATENCY_WINDOW_MS
+    if mode == AggregationMode.HIGH_THROUGHPUT:
+        return vox_max_window_ms
+    if mode == AggregationMode.ADAPTIVE:
+        # there's no point forwarding the audio faster than the node can take passes over it
+        return int(min(max(interim_cadence.interval_s * 1000, LOW_LATENCY_WINDOW_MS), vox_max_window_ms))
+    return vox_window_ms
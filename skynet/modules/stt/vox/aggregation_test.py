@@ -0,0 +1,23 @@
+from skynet.modules.stt.streaming_whisper.cadence import interim_cadence
+from skynet.modules.stt.vox.aggregation import AggregationMode, get_window_ms, LOW_LATENCY_WINDOW_MS
+
+
+class TestAggregation:
+    def test_windows(self):
+        '''Test the window of the fixed modes.'''
+
+        assert get_window_ms(AggregationMode.FIXED) == 1000
+        assert get_window_ms(AggregationMode.LOW_LATENCY) == LOW_LATENCY_WINDOW_MS
+        assert get_window_ms(AggregationMode.HIGH_THROUGHPUT) == 3000
+
+    def test_adaptive(self, monkeypatch):
+        '''Test that the adaptive window follows the interim interval of the node, within bounds.'''
+
+        monkeypatch.setattr(interim_cadence, 'latency_s', 0.0)
+        assert get_window_ms(AggregationMode.ADAPTIVE) == LOW_LATENCY_WINDOW_MS
+
+        monkeypatch.setattr(interim_cadence, 'latency_s', 1.5)
+        assert get_window_ms(AggregationMode.ADAPTIVE) == 1500
+
+        monkeypatch.setattr(interim_cadence, 'latency_s', 60.0)
+        assert get_window_ms(AggregationMode.ADAPTIVE) == 3000
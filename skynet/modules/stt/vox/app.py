@@ -1,32 +1,33 @@
-import asyncio
+from functools import partial
 
 import pybase64
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 
+from skynet.env import vox_aggregation_mode
 from skynet.logs import get_logger
 from skynet.modules.stt.streaming_whisper.utils import utils
+from skynet.modules.stt.vox.aggregation import AggregationMode
 from skynet.modules.stt.vox.connection_manager import ConnectionManager
-from skynet.modules.stt.vox.decoder import PcmaDecoder
-from skynet.modules.stt.vox.resampler import PcmResampler
+from skynet.modules.stt.vox.stream import ParticipantStream
 
 log = get_logger(__name__)
 
 ws_connection_manager = ConnectionManager()
 app = FastAPI()
-running_tasks = set()
-whisper_sampling_rate = 16000
 
 
 @app.websocket('/ws')
-async def websocket_endpoint(websocket: WebSocket, auth_token: str | None = None):
-    decoder = PcmaDecoder()
-    resampler = PcmResampler()
+async def websocket_endpoint(websocket: WebSocket, auth_token: str | None = None, mode: str | None = None):
     session_id = utils.Uuid7().get()
+    try:
+        aggregation_mode = AggregationMode(mode or vox_aggregation_mode)
+    except ValueError:
+        log.warning(f'Session {session_id}: unknown aggregation mode {mode}, using {vox_aggregation_mode}')
+        aggregation_mode = AggregationMode(vox_aggregation_mode)
     connection = await ws_connection_manager.connect(websocket, session_id, auth_token)
 
-    data_map = dict()
-    resampler = None
+    data_map: dict[str, ParticipantStream] = dict()
 
     while True:
         try:
@@ -39,44 +40,18 @@ async def websocket_endpoint(websocket: WebSocket, auth_token: str | None = None
                 participant_id: str = media['tag']
 
                 if participant_id not in data_map:
-                    header = (participant_id.encode() + '|en'.encode()).ljust(60, b'\0')
-                    data_map[participant_id] = dict(raw=b'', chunks=0, header=header)
+                    forward = partial(ws_connection_manager.forward, connection, participant_id, aggregation_mode)
+                    data_map[participant_id] = ParticipantStream(participant_id, forward, aggregation_mode)
 
                 payload = pybase64.b64decode(media['payload'])
-                participant = data_map[participant_id]
-
-                participant['raw'] += payload
-                participant['chunks'] += 1
-
-                if participant['chunks'] == 50:  # 50 chunks = 1 second
-                    frames = decoder.decode(participant['raw'], media['timestamp'])
-
-                    decoded_raw = b''
-
-                    resampler = resampler or PcmResampler(
-                        format='s16',
-                        layout='mono',
-                        rate=whisper_sampling_rate,
-                    )
-
-                    for frame in frames:
-                        decoded_raw += resampler.resample(frame)
-
-                    task = asyncio.create_task(
-                        ws_connection_manager.process(
-                            connection, participant['header'] + decoded_raw, media['timestamp']
-                        )
-                    )
-
-                    running_tasks.add(task)
-                    task.add_done_callback(running_tasks.remove)
-
-                    participant['chunks'] = 0
-                    participant['raw'] = b''
+                await data_map[participant_id].feed(payload, media['timestamp'])
 
         except WebSocketDisconnect:
-            await ws_connection_manager.disconnect(connection, True)
+            # the streams are closed first, so they can't hand windows over to a connection that is gone
+            for stream in data_map.values():
+                stream.close()
             data_map.clear()
+            await ws_connection_manager.disconnect(connection, True)
             log.info(f'Session {session_id} has ended')
             break
 
@@ -1,20 +1,87 @@
+import time
+from collections import defaultdict
+
 from fastapi import WebSocketDisconnect
 
 from skynet.logs import get_logger
+from skynet.modules.monitoring import VOX_WINDOW_LATENCY_METRIC
 from skynet.modules.stt.streaming_whisper.connection_manager import (
     ConnectionManager as BaseConnectionManager,
     MeetingConnection,
 )
-from skynet.modules.stt.streaming_whisper.utils.utils import TranscriptionResponse
+from skynet.modules.stt.streaming_whisper.protocol import TranscriptionResponse
+from skynet.modules.stt.vox.aggregation import AggregationMode
 
 log = get_logger(__name__)
 
 
 class ConnectionManager(BaseConnectionManager):
+    windows: dict[tuple[MeetingConnection, str], list[tuple[float, AggregationMode]]]
+    covered_windows: dict[tuple[MeetingConnection, str], int]
+
+    def __init__(self):
+        super().__init__()
+        # when the windows of each participant without a result yet were handed over, and how many of them the
+        # participant's running pass transcribes
+        self.windows = defaultdict(list)
+        self.covered_windows = {}
+
+    async def forward(
+        self,
+        connection: MeetingConnection,
+        participant_id: str,
+        mode: AggregationMode,
+        chunk: memoryview,
+        timestamp: int,
+    ):
+        """Hands a window of the participant over to the transcription."""
+        self.windows[(connection, participant_id)].append((time.perf_counter(), mode))
+        await self.process(connection, chunk, timestamp)
+
+    def cover_windows(self, connection: MeetingConnection, participant_id: str):
+        # a pass transcribes the audio of all the windows handed over before it started
+        key = (connection, participant_id)
+        self.covered_windows[key] = len(self.windows[key])
+
+    def drop_covered_windows(self, connection: MeetingConnection, participant_id: str):
+        # a pass without a result, e.g. over silence, still transcribed the windows it covered, so they don't wait for
+        # the next result, which would observe them as stale
+        key = (connection, participant_id)
+        covered = self.covered_windows.pop(key, None)
+        if covered is not None and key in self.windows:
+            del self.windows[key][:covered]
+
+    async def run_pass(self, connection: MeetingConnection, participant_id: str, queued_at: float):
+        self.cover_windows(connection, participant_id)
+        await super().run_pass(connection, participant_id, queued_at)
+        self.drop_covered_windows(connection, participant_id)
+
+    async def flush(self, connection: MeetingConnection, participant_id: str):
+        state = connection.participants.get(participant_id)
+        # a flush is skipped while a pass is running, which covers the windows instead
+        covers = state is not None and not state.is_transcribing
+        if covers:
+            self.cover_windows(connection, participant_id)
+        await super().flush(connection, participant_id)
+        if covers:
+            self.drop_covered_windows(connection, participant_id)
+
+    def observe_window_latency(self, connection: MeetingConnection, results: list[TranscriptionResponse]):
+        now = time.perf_counter()
+        for participant_id in dict.fromkeys(result.participant_id for result in results):
+            key = (connection, participant_id)
+            covered = self.covered_windows.pop(key, 0)
+            for handed_over_at, mode in self.windows[key][:covered]:
+                VOX_WINDOW_LATENCY_METRIC.labels(mode=mode.value).observe(now - handed_over_at)
+            del self.windows[key][:covered]
+
     async def send(self, connection: MeetingConnection, results: list[TranscriptionResponse] | None):
         if results is None:
             return
 
+        # the interims aren't sent, but they cover the windows as well
+        self.observe_window_latency(connection, results)
+
         final_results = [r for r in results if r.type == 'final']
         for result in final_results:
             try:
@@ -35,3 +102,9 @@ class ConnectionManager(BaseConnectionManager):
                 break  # stop trying to send results if the websocket is disconnected
             except Exception as ex:
                 log.error(f'Session {connection.meeting_id}: exception while sending transcription results {ex}')
+
+    async def disconnect(self, connection: MeetingConnection, already_closed=False):
+        for key in [key for key in self.windows if key[0] is connection]:
+            del self.windows[key]
+            self.covered_windows.pop(key, None)
+        await super().disconnect(connection, already_closed)
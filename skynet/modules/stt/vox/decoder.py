@@ -1,33 +1,34 @@
-import fractions
-import time
-from typing import List, Optional
-
-from av import CodecContext
-from av.audio.codeccontext import AudioCodecContext
-from av.audio.frame import AudioFrame
-from av.packet import Packet
+import numpy as np
 
 SAMPLE_RATE = 8000
-TIME_BASE = fractions.Fraction(1, 8000)
 
 
-class PcmDecoder:
-    def __init__(self, codec_name: str) -> None:
-        self.codec: AudioCodecContext = CodecContext.create(codec_name, "r")
-        self.codec.format = "s16"
-        self.codec.layout = "mono"
-        self.codec.sample_rate = SAMPLE_RATE
+def alaw_table() -> np.ndarray:
+    """
+    The 16-bit PCM sample of each of the 256 A-law codes, as in G.711.
+    """
+
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    mantissa = (codes & 0x0F) << 4
+    segment = (codes & 0x70) >> 4
+    magnitude = np.where(
+        segment == 0,
+        mantissa + 8,
+        (mantissa + 0x108) << np.maximum(segment - 1, 0),
+    )
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+ALAW_TABLE = alaw_table()
 
-    def decode(self, data: bytes, timestamp: Optional[int] = None) -> List[AudioFrame]:
-        packet = Packet(data)
-        packet.pts = timestamp or int(time.time())
-        packet.time_base = TIME_BASE
-        return self.codec.decode(packet)
 
+class PcmaDecoder:
+    """
+    Decodes G.711 A-law with a lookup table, a codec per connection isn't needed for a stateless 8-bit mapping.
+    """
 
-class PcmaDecoder(PcmDecoder):
-    def __init__(self) -> None:
-        super().__init__("pcm_alaw")
+    def decode(self, data: bytes) -> np.ndarray:
+        return ALAW_TABLE[np.frombuffer(data, dtype=np.uint8)]
 
 
 __all__ = ["PcmaDecoder"]
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from skynet.modules.stt.vox.decoder import PcmaDecoder, SAMPLE_RATE
+
+
+def decode_with_codec(data: bytes) -> np.ndarray:
+    '''Decodes A-law with the ffmpeg codec, as the decoder used to.'''
+
+    av = pytest.importorskip('av')
+
+    codec = av.CodecContext.create('pcm_alaw', 'r')
+    codec.format = 's16'
+    codec.layout = 'mono'
+    codec.sample_rate = SAMPLE_RATE
+    frames = codec.decode(av.packet.Packet(data))
+
+    return np.concatenate([frame.to_ndarray().flatten() for frame in frames])
+
+
+class TestPcmaDecoder:
+    def test_same_as_codec(self):
+        '''Test that the lookup table decodes every A-law code like the ffmpeg codec.'''
+
+        data = bytes(range(256)) * 2
+        expected = decode_with_codec(data)
+
+        decoded = PcmaDecoder().decode(data)
+
+        assert decoded.dtype == np.int16
+        assert np.array_equal(decoded, expected)
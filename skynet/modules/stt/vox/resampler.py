@@ -1,21 +1,32 @@
-from av.audio.frame import AudioFrame
-from av.audio.resampler import AudioResampler
+import numpy as np
 
 
 class PcmResampler:
-    def __init__(self, **kwargs) -> None:
-        self.resampler = AudioResampler(**kwargs)
-        self.layout = kwargs.get("layout")
-        self.format = kwargs.get("format")
+    """
+    Linear interpolation resampler for 16-bit mono PCM streams.
 
-    def resample(self, frame: AudioFrame) -> bytes:
-        resampled_raw = b''
-        resampled_frames = self.resampler.resample(frame)
+    It keeps the last input sample and the position of the next output sample between calls, so consecutive chunks of
+    a stream resample as if they were one, without a discontinuity at the chunk boundaries. A stream needs its own
+    resampler.
+    """
 
-        for resampled_frame in resampled_frames:
-            resampled_raw += bytes(resampled_frame.planes[0])
+    def __init__(self, in_rate: int = 8000, out_rate: int = 16000) -> None:
+        self.step = in_rate / out_rate
+        # in input samples, relative to the first sample of the next chunk, -1 being the last sample of the previous
+        self.position = 0.0
+        self.last_sample = 0
 
-        return resampled_raw
+    def resample(self, samples: np.ndarray) -> np.ndarray:
+        if len(samples) == 0:
+            return np.empty(0, dtype=np.int16)
+
+        count = int(np.floor((len(samples) - 1 - self.position) / self.step)) + 1
+        positions = self.position + np.arange(count) * self.step
+        resampled = np.interp(positions, np.arange(-1, len(samples)), np.concatenate(([self.last_sample], samples)))
+
+        self.position = positions[-1] + self.step - len(samples)
+        self.last_sample = samples[-1]
+        return np.rint(resampled).astype(np.int16)
 
 
 __all__ = ["PcmResampler"]
@@ -0,0 +1,37 @@
+import numpy as np
+
+from skynet.modules.stt.vox.resampler import PcmResampler
+
+
+def sine(num_samples: int, rate: int, frequency: float = 440.0) -> np.ndarray:
+    return (np.sin(2 * np.pi * frequency * np.arange(num_samples) / rate) * 10000).astype(np.int16)
+
+
+class TestPcmResampler:
+    def test_output_length(self):
+        '''Test that the stream keeps the ratio of the rates over consecutive chunks.'''
+
+        resampler = PcmResampler(8000, 16000)
+        lengths = [len(resampler.resample(np.zeros(160, dtype=np.int16))) for _ in range(50)]
+
+        assert abs(sum(lengths) - 16000) <= 1
+        assert set(lengths[1:]) == {320}
+
+    def test_chunks_resample_as_one(self):
+        '''Test that resampling a stream in chunks is the same as resampling it at once.'''
+
+        audio = sine(8000, 8000)
+        whole = PcmResampler(8000, 16000).resample(audio)
+
+        resampler = PcmResampler(8000, 16000)
+        chunked = np.concatenate([resampler.resample(audio[i : i + 160]) for i in range(0, len(audio), 160)])
+
+        assert np.array_equal(chunked, whole)
+
+    def test_preserves_the_signal(self):
+        '''Test that the resampled audio is close to the audio sampled at the target rate.'''
+
+        resampled = PcmResampler(8000, 16000).resample(sine(8000, 8000))
+        expected = sine(16000, 16000)[: len(resampled)]
+
+        assert np.abs(resampled.astype(np.int32) - expected).max() < 200
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from skynet.env import vox_max_window_ms
+from skynet.logs import get_logger
+from skynet.modules.monitoring import VOX_WINDOW_DURATION_METRIC
+from skynet.modules.stt.vox.aggregation import AggregationMode, get_window_ms
+from skynet.modules.stt.vox.decoder import PcmaDecoder, SAMPLE_RATE
+from skynet.modules.stt.vox.resampler import PcmResampler
+from skynet.modules.stt.vox.window import AudioWindow, HEADER_SIZE
+
+log = get_logger(__name__)
+
+decoder = PcmaDecoder()
+whisper_sampling_rate = 16000
+# Windows waiting to be forwarded, further media events for the participant wait for room in the queue. Forwarding a
+# window only adds its audio, which runs the VAD, the transcription passes are queued and coalesced by the
+# ConnectionManager without being waited for, so this bounds the backlog of the VAD and not of the transcription.
+max_queued_windows = 4
+
+
+class ParticipantStream:
+    """
+    The audio pipeline of a participant of a vox session: the chunks are decoded and resampled as they arrive, with
+    the participant's own resampler, and the full windows are forwarded one at a time, in order, by the stream's task.
+    Forwarding a window doesn't wait for its transcription.
+    """
+
+    def __init__(
+        self,
+        participant_id: str,
+        forward: Callable[[memoryview, int], Awaitable],
+        mode: AggregationMode = AggregationMode.FIXED,
+    ):
+        self.participant_id = participant_id
+        self.forward = forward
+        self.mode = mode
+        header = (participant_id.encode() + '|en'.encode()).ljust(HEADER_SIZE, b'\0')
+        self.resampler = PcmResampler(in_rate=SAMPLE_RATE, out_rate=whisper_sampling_rate)
+        self.window = AudioWindow(header, vox_max_window_ms * whisper_sampling_rate // 1000)
+        self.window_ms = 0.0
+        self.queue = asyncio.Queue(max_queued_windows)
+        self.task = None
+
+    async def feed(self, payload: bytes, timestamp: int):
+        self.window.append(self.resampler.resample(decoder.decode(payload)))
+        # A-law is a byte per sample
+        self.window_ms += len(payload) * 1000 / SAMPLE_RATE
+
+        if self.window_ms >= get_window_ms(self.mode):
+            if self.task is None:
+                self.task = asyncio.create_task(self.run())
+            if self.queue.full():
+                log.warning(f'Participant {self.participant_id}: the VAD is falling behind, waiting')
+            VOX_WINDOW_DURATION_METRIC.labels(mode=self.mode.value).observe(self.window_ms / 1000)
+            self.window_ms = 0.0
+            await self.queue.put((self.window.take(), timestamp))
+
+    async def run(self):
+        while True:
+            chunk, timestamp = await self.queue.get()
+            try:
+                await self.forward(chunk, timestamp)
+            except Exception as e:
+                log.error(f'Participant {self.participant_id}: failed to forward the audio {e}')
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,112 @@
+import asyncio
+from functools import partial
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+from skynet.modules.stt.vox import stream
+from skynet.modules.stt.vox.aggregation import AggregationMode
+from skynet.modules.stt.vox.connection_manager import ConnectionManager
+from skynet.modules.stt.vox.stream import ParticipantStream
+
+# A-law silence
+payload = b'\xd5' * 160
+chunks_per_window = 50  # 20 ms chunks, the fixed mode forwards a second of audio
+
+
+class TestParticipantStream:
+    def test_forwarded_in_order(self):
+        '''Test that the windows are forwarded one at a time, in the order they were filled.'''
+
+        forwarded = []
+        running = []
+
+        async def forward(chunk: memoryview, timestamp: int):
+            running.append(timestamp)
+            assert len(running) == 1
+            await asyncio.sleep(0.001 * (5 - timestamp))
+            forwarded.append((bytes(chunk[:13]), len(chunk), timestamp))
+            running.pop()
+
+        async def run():
+            participant = ParticipantStream('participant', forward)
+            for timestamp in range(5):
+                for _ in range(chunks_per_window):
+                    await participant.feed(payload, timestamp)
+            await participant.queue.join()
+            participant.close()
+
+        asyncio.run(run())
+
+        assert [timestamp for _, _, timestamp in forwarded] == list(range(5))
+        assert all(header == b'participant|e' for header, _, _ in forwarded)
+        assert abs(forwarded[1][1] - stream.HEADER_SIZE - 32000) <= 2
+
+    def test_own_resampler(self):
+        '''Test that the participants don't share the resampler state.'''
+
+        first = ParticipantStream('first', None)
+        second = ParticipantStream('second', None)
+
+        assert first.resampler is not second.resampler
+        first.resampler.resample(np.full(159, 1000, dtype=np.int16))
+        assert second.resampler.position == 0.0 and second.resampler.last_sample == 0
+
+    def test_bounded_queue(self):
+        '''Test that the media events wait once too many windows are queued behind a slow VAD.'''
+
+        async def run():
+            blocked = asyncio.Event()
+
+            # adding the audio of a window runs the VAD, which is stuck
+            async def forward(chunk: memoryview, timestamp: int):
+                await blocked.wait()
+
+            async def feed(num_windows: int):
+                for _ in range(num_windows * chunks_per_window):
+                    await participant.feed(payload, 0)
+
+            participant = ParticipantStream('participant', forward)
+            feeding = asyncio.create_task(feed(stream.max_queued_windows + 2))
+            await asyncio.sleep(0.01)
+            assert participant.queue.full() and not feeding.done()
+
+            blocked.set()
+            await feeding
+            await participant.queue.join()
+            participant.close()
+
+        asyncio.run(run())
+
+    def test_doesnt_wait_for_transcription(self):
+        '''Test that the media events don't wait for the transcription, whose passes are coalesced instead.'''
+
+        async def run():
+            blocked = asyncio.Event()
+            manager = ConnectionManager()
+            manager.connections = MagicMock()
+            manager.schedule_flush = MagicMock()
+            connection = MagicMock(connected=True)
+            connection.add_chunk = AsyncMock(return_value='participant')
+
+            # the transcription is stuck
+            async def process(participant_id: str, queued_at: float):
+                await blocked.wait()
+
+            connection.process = process
+
+            forward = partial(manager.forward, connection, 'participant', AggregationMode.FIXED)
+            participant = ParticipantStream('participant', forward)
+            for _ in range((stream.max_queued_windows + 2) * chunks_per_window):
+                await participant.feed(payload, 0)
+            await participant.queue.join()
+
+            # a single pass runs, the others were coalesced
+            assert connection.add_chunk.call_count == stream.max_queued_windows + 2
+            assert len(manager.running_passes) == 1
+
+            blocked.set()
+            await asyncio.gather(*manager.pass_tasks)
+            participant.close()
+
+        asyncio.run(run())
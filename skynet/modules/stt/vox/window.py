@@ -0,0 +1,45 @@
+import numpy as np
+
+HEADER_SIZE = 60
+
+
+class AudioWindow:
+    """
+    The resampled audio of a participant, gathered into a preallocated buffer right after its chunk header until it's
+    forwarded to the transcription. A full window is handed over as a view and a new buffer is started, so the audio
+    is neither concatenated nor copied on the way.
+    """
+
+    def __init__(self, header: bytes, capacity: int):
+        self.header = header
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.buffer = bytearray(HEADER_SIZE + self.capacity * 2)
+        self.buffer[:HEADER_SIZE] = self.header
+        self.samples = np.frombuffer(self.buffer, dtype=np.int16, offset=HEADER_SIZE)
+        self.num_samples = 0
+        self.chunks = 0
+
+    def append(self, pcm: np.ndarray):
+        end = self.num_samples + len(pcm)
+        if end > len(self.samples):
+            # the chunks were longer than expected, move to a bigger buffer
+            previous, chunks = self.samples[: self.num_samples], self.chunks
+            self.capacity = max(end, 2 * self.capacity)
+            self.reset()
+            self.samples[: len(previous)] = previous
+            self.num_samples, self.chunks = len(previous), chunks
+        self.samples[self.num_samples : end] = pcm
+        self.num_samples = end
+        self.chunks += 1
+
+    def take(self) -> memoryview:
+        """
+        Returns the header followed by the audio and starts a new window.
+        """
+
+        chunk = memoryview(self.buffer)[: HEADER_SIZE + self.num_samples * 2]
+        self.reset()
+        return chunk
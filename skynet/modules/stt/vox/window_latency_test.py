@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from skynet.modules.stt.streaming_whisper.protocol import TranscriptionResponse
+from skynet.modules.stt.vox.aggregation import AggregationMode
+from skynet.modules.stt.vox.connection_manager import ConnectionManager
+
+
+class FakeConnection:
+    '''A vox session whose passes return the given results.'''
+
+    def __init__(self, *results):
+        self.connected = True
+        self.meeting_id = 'session'
+        self.participants = {'participant': SimpleNamespace(is_transcribing=False)}
+        self.process = AsyncMock(side_effect=results)
+        self.ws = SimpleNamespace(send_json=AsyncMock())
+
+
+def make_result(result_type: str) -> TranscriptionResponse:
+    return TranscriptionResponse(id='id', participant_id='participant', ts=0, text='text', type=result_type, variance=1)
+
+
+@pytest.fixture()
+def manager(mocker):
+    manager = ConnectionManager()
+    mocker.patch.object(manager, 'process')
+    mocker.patch('skynet.modules.stt.vox.connection_manager.VOX_WINDOW_LATENCY_METRIC')
+
+    return manager
+
+
+class TestWindowLatency:
+    @pytest.mark.asyncio
+    async def test_observed_once_covered(self, manager):
+        '''
+        Test that the latency of the windows is observed once a result of a pass that started after them is sent, and
+        that the windows of a pass without a result are dropped without being observed.
+        '''
+
+        from skynet.modules.stt.vox.connection_manager import VOX_WINDOW_LATENCY_METRIC
+
+        connection = FakeConnection(None, [make_result('interim')])
+
+        await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 0)
+        await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 1)
+
+        # nothing was said, the windows don't wait for a later result
+        await manager.run_pass(connection, 'participant', 0.0)
+        VOX_WINDOW_LATENCY_METRIC.labels.assert_not_called()
+        assert not manager.windows[(connection, 'participant')]
+
+        await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 2)
+        await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 3)
+
+        await manager.run_pass(connection, 'participant', 0.0)
+        assert VOX_WINDOW_LATENCY_METRIC.labels.call_count == 2
+        VOX_WINDOW_LATENCY_METRIC.labels.assert_called_with(mode=AggregationMode.FIXED.value)
+        assert not manager.windows[(connection, 'participant')]
+
+    @pytest.mark.asyncio
+    async def test_later_windows_not_covered(self, manager):
+        '''Test that the windows handed over while a pass runs wait for the next result.'''
+
+        from skynet.modules.stt.vox.connection_manager import VOX_WINDOW_LATENCY_METRIC
+
+        connection = FakeConnection()
+
+        async def process(participant_id, queued_at):
+            await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 1)
+            return [make_result('final')]
+
+        connection.process = process
+
+        await manager.forward(connection, 'participant', AggregationMode.FIXED, memoryview(b''), 0)
+        await manager.run_pass(connection, 'participant', 0.0)
+
+        assert VOX_WINDOW_LATENCY_METRIC.labels.call_count == 1
+        assert len(manager.windows[(connection, 'participant')]) == 1
+        connection.ws.send_json.assert_called_once()
@@ -0,0 +1,42 @@
+import numpy as np
+
+from skynet.modules.stt.vox.window import AudioWindow, HEADER_SIZE
+
+header = b'participant|en'.ljust(HEADER_SIZE, b'\0')
+
+
+class TestAudioWindow:
+    def test_take(self):
+        '''Test that the window is handed over as the header followed by the audio, and starts over.'''
+
+        window = AudioWindow(header, 1000)
+        window.append(np.arange(300, dtype=np.int16))
+        window.append(np.arange(300, 600, dtype=np.int16))
+
+        chunk = window.take()
+
+        assert window.chunks == 0 and window.num_samples == 0
+        assert bytes(chunk[:HEADER_SIZE]) == header
+        assert np.array_equal(np.frombuffer(chunk[HEADER_SIZE:], dtype=np.int16), np.arange(600))
+
+    def test_grows(self):
+        '''Test that the window moves to a bigger buffer when the audio doesn't fit.'''
+
+        window = AudioWindow(header, 100)
+        for i in range(3):
+            window.append(np.full(80, i, dtype=np.int16))
+
+        assert window.chunks == 3
+        assert np.array_equal(
+            np.frombuffer(window.take()[HEADER_SIZE:], dtype=np.int16), np.repeat(np.arange(3, dtype=np.int16), 80)
+        )
+
+    def test_handed_over_audio_is_kept(self):
+        '''Test that the audio handed over is not overwritten by the next window.'''
+
+        window = AudioWindow(header, 100)
+        window.append(np.ones(100, dtype=np.int16))
+        chunk = window.take()
+        window.append(np.full(100, 2, dtype=np.int16))
+
+        assert np.array_equal(np.frombuffer(chunk[HEADER_SIZE:], dtype=np.int16), np.ones(100))
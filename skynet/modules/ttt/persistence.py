@@ -1,3 +1,6 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
 import redis.asyncio as redis
 
 from skynet.env import (
@@ -17,6 +20,48 @@ from skynet.modules.monitoring import REDIS_CONNECTION_STATUS
 
 log = get_logger(__name__)
 
+# Replaces the list in KEYS[1] with a set of its values, returns how many values it held or -1 if it's not a list
+CONVERT_LIST_TO_SET_SCRIPT = '''
+if redis.call('TYPE', KEYS[1]).ok ~= 'list' then
+    return -1
+end
+local values = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+for i = 1, #values, 1000 do
+    redis.call('SADD', KEYS[1], unpack(values, i, math.min(i + 999, #values)))
+end
+return #values
+'''
+
+
+class Pipeline:
+    """
+    Namespaced commands queued to be sent to Redis in a single round trip, and run atomically with MULTI/EXEC if it
+    is a transaction.
+    """
+
+    def __init__(self, pipeline, get_namespaced_key):
+        self.pipeline = pipeline
+        self.get_namespaced_key = get_namespaced_key
+
+    def set(self, key, *args, **kwargs):
+        self.pipeline.set(self.get_namespaced_key(key), *args, **kwargs)
+
+    def zcard(self, key):
+        self.pipeline.zcard(self.get_namespaced_key(key))
+
+    def sadd(self, key, *values):
+        self.pipeline.sadd(self.get_namespaced_key(key), *values)
+
+    def srem(self, key, *values):
+        self.pipeline.srem(self.get_namespaced_key(key), *values)
+
+    def hdel(self, key, *fields):
+        self.pipeline.hdel(self.get_namespaced_key(key), *fields)
+
+    async def execute(self):
+        return await self.pipeline.execute()
+
 
 class Redis:
     def __init__(self):
@@ -44,6 +89,10 @@ class Redis:
 
         self.db = redis.Redis(**connection_options)
         self.initialized = False
+        # the fetches being sent, and the ones waiting for them to be done, by name
+        self.in_flight: dict[Hashable, asyncio.Future] = {}
+        self.queued: dict[Hashable, asyncio.Future] = {}
+        self.convert_list_to_set_script = self.register_script(CONVERT_LIST_TO_SET_SCRIPT)
 
     @staticmethod
     def __get_namespaced_key(key):
@@ -63,6 +112,65 @@ class Redis:
     async def close(self):
         await self.db.close()
 
+    def pipeline(self, transaction=True) -> Pipeline:
+        return Pipeline(self.db.pipeline(transaction=transaction), self.__get_namespaced_key)
+
+    async def coalesce(self, name: Hashable, fetch: Callable[[], Awaitable]):
+        """
+        Runs fetch, unless a fetch with the same name is waiting to be sent, in which case its result is shared instead
+        of sending the same commands again. A fetch that was already sent may not see what the caller wrote just
+        before, so it is never shared, the caller gets the next fetch, which is sent once the running one is done.
+        """
+
+        future = self.queued.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self.run_fetch(name, fetch))
+            self.queued[name] = future
+
+        # a cancelled caller must not cancel the fetch for the others
+        return await asyncio.shield(future)
+
+    async def run_fetch(self, name: Hashable, fetch: Callable[[], Awaitable]):
+        running = self.in_flight.get(name)
+        if running is not None:
+            await asyncio.wait([running])
+
+        # from now on the callers need the next fetch
+        future = self.queued.pop(name)
+        self.in_flight[name] = future
+        try:
+            return await fetch()
+        finally:
+            if self.in_flight.get(name) is future:
+                del self.in_flight[name]
+
+    async def zcard_many(self, keys) -> list[int]:
+        """
+        The sizes of the sorted sets, read in a single round trip.
+        """
+
+        keys = tuple(keys)
+
+        async def fetch():
+            pipeline = self.pipeline(transaction=False)
+            for key in keys:
+                pipeline.zcard(key)
+            return await pipeline.execute()
+
+        return await self.coalesce(('zcard', keys), fetch)
+
+    def register_script(self, script: str) -> Callable[..., Awaitable]:
+        """
+        Registers a Lua script, to be called with the keys it uses, which get namespaced, and its arguments.
+        """
+
+        registered_script = self.db.register_script(script)
+
+        async def run(keys, args=()):
+            return await registered_script(keys=[self.__get_namespaced_key(key) for key in keys], args=args)
+
+        return run
+
     async def client_list(self):
         return await self.db.client_list()
 
@@ -90,11 +198,35 @@ class Redis:
     async def lpop(self, key):
         return await self.db.lpop(self.__get_namespaced_key(key))
 
+    async def blpop(self, key, timeout):
+        return await self.db.blpop(self.__get_namespaced_key(key), timeout)
+
     async def lrange(self, key, start, end):
         return await self.db.lrange(self.__get_namespaced_key(key), start, end)
 
     async def lrem(self, key, count, value):
         return await self.db.lrem(self.__get_namespaced_key(key), count, value)
 
+    async def convert_list_to_set(self, key):
+        return await self.convert_list_to_set_script([key])
+
+    async def sadd(self, key, *values):
+        return await self.db.sadd(self.__get_namespaced_key(key), *values)
+
+    async def srem(self, key, *values):
+        return await self.db.srem(self.__get_namespaced_key(key), *values)
+
+    async def sismember(self, key, value):
+        return await self.db.sismember(self.__get_namespaced_key(key), value)
+
+    async def smembers(self, key):
+        return await self.db.smembers(self.__get_namespaced_key(key))
+
+    async def hmget(self, key, fields):
+        return await self.db.hmget(self.__get_namespaced_key(key), fields)
+
+    async def hdel(self, key, *fields):
+        return await self.db.hdel(self.__get_namespaced_key(key), *fields)
+
 
 db = Redis()
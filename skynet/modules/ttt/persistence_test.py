@@ -0,0 +1,186 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+from skynet.env import redis_namespace
+from skynet.modules.ttt.persistence import Redis
+
+
+@pytest_asyncio.fixture
+async def redis_db():
+    '''A connection to a Redis server, which CI provides. The tests are skipped without one.'''
+
+    db = Redis()
+    try:
+        await db.initialize()
+    except RuntimeError:
+        pytest.skip('Redis is not available')
+
+    db.key = f'test:{uuid.uuid4()}'
+
+    yield db
+
+    await db.delete(db.key)
+    await db.close()
+
+
+class TestZcardMany:
+    @pytest.mark.asyncio
+    async def test_single_round_trip(self, mocker):
+        '''Test that the sizes of the sorted sets are read with a single pipeline.'''
+
+        db = Redis()
+        pipeline = mocker.patch.object(db.db, 'pipeline').return_value
+        pipeline.execute = AsyncMock(return_value=[1, 2])
+
+        assert await db.zcard_many(['a', 'b']) == [1, 2]
+
+        db.db.pipeline.assert_called_once_with(transaction=False)
+        pipeline.zcard.assert_any_call(f'{redis_namespace}:a')
+        pipeline.zcard.assert_any_call(f'{redis_namespace}:b')
+        pipeline.execute.assert_called_once()
+
+
+class TestCoalesce:
+    @pytest.mark.asyncio
+    async def test_shares_running_fetch(self):
+        '''Test that concurrent fetches with the same name are sent once.'''
+
+        db = Redis()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return 42
+
+        first = asyncio.create_task(db.coalesce('name', fetch))
+        second = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await first == 42
+        assert await second == 42
+        assert len(calls) == 1
+        assert not db.in_flight and not db.queued
+
+        # once it's done, the next fetch is sent again
+        assert await db.coalesce('name', fetch) == 42
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_running_fetch_not_shared(self):
+        '''Test that the callers that come once a fetch was sent share the next one, sent after it's done.'''
+
+        db = Redis()
+        releases = [asyncio.Event(), asyncio.Event()]
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await releases[len(calls) - 1].wait()
+            return len(calls)
+
+        first = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(db.coalesce('name', fetch))
+        third = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0.01)
+
+        # the next fetch waits for the running one
+        assert len(calls) == 1
+        releases[0].set()
+        assert await first == 1
+
+        releases[1].set()
+        assert await second == 2
+        assert await third == 2
+        assert len(calls) == 2
+        assert not db.in_flight and not db.queued
+
+    @pytest.mark.asyncio
+    async def test_failed_fetch(self):
+        '''Test that the next fetch is sent even if the running one failed.'''
+
+        db = Redis()
+        release = asyncio.Event()
+        results = []
+
+        async def fetch():
+            await release.wait()
+            if not results:
+                results.append(1)
+                raise RuntimeError('failed')
+            return 42
+
+        first = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0)
+        release.set()
+
+        with pytest.raises(RuntimeError):
+            await first
+        assert await second == 42
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller(self):
+        '''Test that a cancelled caller doesn't cancel the fetch for the others.'''
+
+        db = Redis()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return 42
+
+        first = asyncio.create_task(db.coalesce('name', fetch))
+        second = asyncio.create_task(db.coalesce('name', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        assert await second == 42
+
+
+class TestRegisterScript:
+    @pytest.mark.asyncio
+    async def test_namespaced_keys(self, mocker):
+        '''Test that a registered script gets the namespaced keys and the arguments as they are.'''
+
+        db = Redis()
+        registered_script = AsyncMock(return_value='job')
+        mocker.patch.object(db.db, 'register_script', return_value=registered_script)
+
+        script = db.register_script('return 1')
+
+        assert await script(['pending', 'running'], ['1']) == 'job'
+        registered_script.assert_called_once_with(
+            keys=[f'{redis_namespace}:pending', f'{redis_namespace}:running'], args=['1']
+        )
+
+
+class TestConvertListToSet:
+    @pytest.mark.asyncio
+    async def test_converts_list(self, redis_db):
+        '''Test that a list becomes a set of its values, in batches, and is left alone once converted.'''
+
+        values = [str(i) for i in range(2500)]
+        await redis_db.rpush(redis_db.key, *values, *values[:10])
+
+        assert await redis_db.convert_list_to_set(redis_db.key) == 2510
+        assert await redis_db.smembers(redis_db.key) == set(values)
+
+        # already converted
+        assert await redis_db.convert_list_to_set(redis_db.key) == -1
+        assert await redis_db.smembers(redis_db.key) == set(values)
+
+    @pytest.mark.asyncio
+    async def test_missing_key(self, redis_db):
+        '''Test that a key that doesn't exist isn't converted.'''
+
+        assert await redis_db.convert_list_to_set(redis_db.key) == -1
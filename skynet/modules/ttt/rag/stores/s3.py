@@ -35,7 +35,7 @@ class RagS3:
         self.listen_task = asyncio.create_task(pubsub.run())
 
     async def replicate(self, prefix_function: callable):
-        stored_keys = await db.lrange(STORED_RAG_KEY, 0, -1)
+        stored_keys = await db.smembers(STORED_RAG_KEY)
 
         for key in stored_keys:
             folder = prefix_function(key)
@@ -49,6 +49,12 @@ class SkynetVectorStore(ABC):
         Initialize the vector store.
         """
 
+        # one-time migration of the bookkeeping from lists to sets
+        for key in (STORED_RAG_KEY, ERROR_RAG_KEY, RUNNING_RAG_KEY):
+            count = await db.convert_list_to_set(key)
+            if count >= 0:
+                log.info(f'Converted {key} to a set of {count} stores')
+
     @abstractmethod
     async def cleanup(self):
         """
@@ -80,9 +86,9 @@ class SkynetVectorStore(ABC):
         """
 
         await db.delete(store_id)
-        await db.lrem(STORED_RAG_KEY, 0, store_id)
-        await db.lrem(ERROR_RAG_KEY, 0, store_id)
-        await db.lrem(RUNNING_RAG_KEY, 0, store_id)
+        await db.srem(STORED_RAG_KEY, store_id)
+        await db.srem(ERROR_RAG_KEY, store_id)
+        await db.srem(RUNNING_RAG_KEY, store_id)
 
     def get_temp_folder(self, store_id: str) -> str:
         """
@@ -134,8 +140,7 @@ class SkynetVectorStore(ABC):
             documents.extend(await crawl(urls, max_depth))
 
             await self.create(store_id, documents)
-            await db.lrem(STORED_RAG_KEY, 0, store_id)  # ensure no duplicates
-            await db.rpush(STORED_RAG_KEY, store_id)
+            await db.sadd(STORED_RAG_KEY, store_id)
             await self.update_config(store_id, status=RagStatus.SUCCESS)
         except ExceptionGroup as eg:
             error = str([str(e) for e in eg.exceptions])
@@ -144,10 +149,10 @@ class SkynetVectorStore(ABC):
 
         if error:
             await self.update_config(store_id, status=RagStatus.ERROR, error=error)
-            await db.rpush(ERROR_RAG_KEY, store_id)
+            await db.sadd(ERROR_RAG_KEY, store_id)
             log.error(error)
 
-        await db.lrem(RUNNING_RAG_KEY, 0, store_id)
+        await db.srem(RUNNING_RAG_KEY, store_id)
         shutil.rmtree(self.get_temp_folder(store_id), ignore_errors=True)
 
     async def ingest(self, store_id: str, payload: RagPayload) -> Optional[RagConfig]:
@@ -157,7 +162,7 @@ class SkynetVectorStore(ABC):
 
         config = await self.get_config(store_id)
 
-        if store_id in await db.lrange(RUNNING_RAG_KEY, 0, -1):
+        if await db.sismember(RUNNING_RAG_KEY, store_id):
             return config
 
         updated_config = RagConfig(**payload.model_dump())
@@ -165,7 +170,7 @@ class SkynetVectorStore(ABC):
         if bypass_ingestion(config, updated_config):
             return await self.update_config(store_id, system_message=payload.system_message)
 
-        await db.rpush(RUNNING_RAG_KEY, store_id)
+        await db.sadd(RUNNING_RAG_KEY, store_id)
         await db.set(store_id, RagConfig.model_dump_json(updated_config))
 
         temp_file_paths = await save_files(self.get_temp_folder(store_id), payload.files)
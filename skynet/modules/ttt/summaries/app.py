@@ -12,7 +12,7 @@ from skynet.modules.ttt.openai_api.app import initialize as initialize_openai_ap
 from skynet.utils import create_app
 from ..persistence import db
 
-from .jobs import start_monitoring_jobs
+from .jobs import migrate_pending_lists, start_monitoring_jobs
 from .v1.router import router as v1_router
 
 
@@ -51,6 +51,9 @@ async def app_startup():
     await db.initialize()
     log.info('Persistence initialized')
 
+    # the dispatcher queues jobs before any executor might have converted the pending queues
+    await migrate_pending_lists()
+
 
 async def executor_startup():
     await setup_credentials()
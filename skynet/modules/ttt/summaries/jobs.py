@@ -27,6 +27,7 @@ from skynet.env import (
     max_concurrency_openai,
     modules,
     redis_exp_seconds,
+    redis_namespace,
 )
 from skynet.logs import get_logger
 from skynet.modules.monitoring import (
@@ -51,6 +52,104 @@ log = get_logger(__name__)
 
 TIME_BETWEEN_JOBS_CHECK = 1
 TIME_BETWEEN_JOBS_CHECK_ON_ERROR = 10
+# how long a blocking pop waits for a job before giving up and trying again
+TIME_TO_WAIT_FOR_JOB = 5
+
+# The pending jobs are ordered by the time they should start at, their creation time by default. A job of each
+# priority is queued as if it had been created that many seconds earlier, so a job waits at most the difference behind
+# the jobs of a higher priority created after it, and the lower priorities are never starved.
+PRIORITY_HEAD_START = {
+    Priority.LOW: -300,
+    Priority.NORMAL: 0,
+    Priority.HIGH: 300,
+}
+# someone is waiting for a live summary, and they are short, so they go ahead of the normal jobs
+LIVE_SUMMARY_HEAD_START = 120
+# the jobs of a customer with the same head start are queued at least this many seconds apart, so that a customer
+# queueing many jobs at once doesn't hold back the others, and their live or high priority jobs aren't queued behind
+# their batch jobs
+CUSTOMER_JOB_SPACING = 10
+# the time the last job of a customer is remembered for
+CUSTOMER_JOB_SPACING_TTL = 60 * 60 * 24
+# a deadline moves a job ahead by at most as much as a high priority does, so it can't be used to jump the queue
+DEADLINE_MAX_HEAD_START = PRIORITY_HEAD_START[Priority.HIGH]
+
+# Adds a job to a pending queue and a wake-up for a waiting worker, spacing it after the previous job of its customer
+# with the same head start if that one is still pending, so a customer is never held back by jobs that already ran.
+# KEYS: pending queue, last job of each customer and head start, wake-ups
+# ARGV: job id, start time, customer id and head start or an empty string, spacing, spacing ttl, latest start time or
+# an empty string
+ENQUEUE_JOB_SCRIPT = '''
+local score = tonumber(ARGV[2])
+if ARGV[3] ~= '' then
+    local last_job = redis.call('HGET', KEYS[2], ARGV[3])
+    local last = last_job and redis.call('ZSCORE', KEYS[1], last_job)
+    if last then
+        score = math.max(score, tonumber(last) + tonumber(ARGV[4]))
+    end
+    redis.call('HSET', KEYS[2], ARGV[3], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+end
+if ARGV[6] ~= '' then
+    score = math.min(score, tonumber(ARGV[6]))
+end
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+redis.call('RPUSH', KEYS[3], 1)
+return tostring(score)
+'''
+
+# Moves the job that should start first from a pending queue to a running set, and takes its wake-up unless the
+# caller already took one. The job is claimed for the worker in the same call, its worker is recorded next to the
+# running set and the job is saved as running, so it can't be restored as stale while it is being claimed. Returns
+# the job id and the claimed job, or only the job id if the job no longer exists, in which case it isn't kept running.
+# KEYS: pending queue, running set, wake-ups, worker of each running job
+# ARGV: '1' if the caller took a wake-up, worker id, start time, prefix of the job keys
+POP_JOB_SCRIPT = '''
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then
+    return false
+end
+local job_id = popped[1]
+if ARGV[1] ~= '1' then
+    redis.call('LPOP', KEYS[3])
+end
+local job_key = ARGV[4] .. job_id
+local job_json = redis.call('GET', job_key)
+if not job_json then
+    return {job_id}
+end
+local job = cjson.decode(job_json)
+job['status'] = 'running'
+job['start'] = tonumber(ARGV[3])
+job['worker_id'] = tonumber(ARGV[2])
+local claimed_job_json = cjson.encode(job)
+redis.call('SET', job_key, claimed_job_json, 'KEEPTTL')
+redis.call('SADD', KEYS[2], job_id)
+redis.call('HSET', KEYS[4], job_id, ARGV[2])
+return {job_id, claimed_job_json}
+'''
+
+# Replaces a pending list with a queue of its jobs in the same order, starting at the given time, and a wake-up for
+# each, returns how many jobs it held or -1 if it's not a list.
+# KEYS: pending queue, wake-ups
+# ARGV: start time of the first job
+CONVERT_PENDING_LIST_SCRIPT = '''
+if redis.call('TYPE', KEYS[1]).ok ~= 'list' then
+    return -1
+end
+local job_ids = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+local start = tonumber(ARGV[1])
+for i, job_id in ipairs(job_ids) do
+    redis.call('ZADD', KEYS[1], start + i / 1000, job_id)
+    redis.call('RPUSH', KEYS[2], 1)
+end
+return #job_ids
+'''
+
+enqueue_job_script = db.register_script(ENQUEUE_JOB_SCRIPT)
+pop_job_script = db.register_script(POP_JOB_SCRIPT)
+convert_pending_list_script = db.register_script(CONVERT_PENDING_LIST_SCRIPT)
 
 background_task = None
 
@@ -62,6 +161,14 @@ current_tasks = {
     Processors.LOCAL: set[asyncio.Task](),
 }
 
+# Set whenever a task of the processor is done, to wake up its waiter if it was at capacity
+capacity_events = {
+    Processors.OPENAI: asyncio.Event(),
+    Processors.AZURE: asyncio.Event(),
+    Processors.OCI: asyncio.Event(),
+    Processors.LOCAL: asyncio.Event(),
+}
+
 
 def restart():
     log.info('Restarting Skynet...')
@@ -74,7 +181,7 @@ def restart():
 
 
 def get_all_processor_queue_keys() -> dict[Processors, tuple[str, str, str]]:
-    """Get queue keys for all processors: (pending_key, running_key, error_key)."""
+    """Get queue keys for all processors: (pending_key, running_key, error_key). Running and error are sets."""
     return {
         Processors.OPENAI: (PENDING_JOBS_OPENAI_KEY, RUNNING_JOBS_OPENAI_KEY, ERROR_JOBS_OPENAI_KEY),
         Processors.AZURE: (PENDING_JOBS_AZURE_KEY, RUNNING_JOBS_AZURE_KEY, ERROR_JOBS_AZURE_KEY),
@@ -88,6 +195,20 @@ def get_processor_queue_keys(processor: Processors) -> tuple[str, str, str]:
     return get_all_processor_queue_keys()[processor]
 
 
+def get_processor_pending_keys(processor: Processors) -> tuple[str, str]:
+    """Get the keys of the last job of each customer and of the wake-ups of a processor's pending queue."""
+    pending_key = get_processor_queue_keys(processor)[0]
+
+    return f'{pending_key}:customers', f'{pending_key}:wakeups'
+
+
+def get_processor_running_workers_key(processor: Processors) -> str:
+    """Get the key of the worker each running job of a processor was claimed by."""
+    running_key = get_processor_queue_keys(processor)[1]
+
+    return f'{running_key}:workers'
+
+
 def get_processor_max_concurrency(processor: Processors) -> int:
     """Get the maximum concurrency limit for a specific processor."""
     concurrency_map = {
@@ -113,18 +234,16 @@ def can_run_next_job(processor: Processors) -> bool:
 async def update_summary_queue_metric() -> None:
     """Update the queue size metric with combined queue sizes from all processors."""
 
-    total_queue_size = 0
+    processors = get_all_processor_queue_keys()
 
-    # Sum up queue sizes from all processor-specific queues
-    for processor in get_all_processor_queue_keys():
-        pending_key = get_processor_queue_keys(processor)[0]
-        processor_queue_size = await db.llen(pending_key)
-        total_queue_size += processor_queue_size
+    # Read the sizes of all processor-specific queues in a single round trip
+    queue_sizes = await db.zcard_many(pending_key for pending_key, _, _ in processors.values())
 
+    for processor, processor_queue_size in zip(processors, queue_sizes):
         # Set individual processor queue size metric
         SUMMARY_QUEUE_SIZE_BY_PROCESSOR_METRIC.labels(processor=processor.value).set(processor_queue_size)
 
-    SUMMARY_QUEUE_SIZE_METRIC.set(total_queue_size)
+    SUMMARY_QUEUE_SIZE_METRIC.set(sum(queue_sizes))
 
 
 def update_current_tasks_metrics() -> None:
@@ -157,13 +276,8 @@ async def migrate_legacy_queues() -> None:
         try:
             job = Job.model_validate_json(job_json)
             processor = LLMSelector.get_job_processor(job.metadata.customer_id, job_id)
-            pending_key = get_processor_queue_keys(processor)[0]
-
-            # Maintain job priority - high priority jobs go to front
-            if job.payload.priority == Priority.HIGH:
-                await db.lpush(pending_key, job_id)
-            else:
-                await db.rpush(pending_key, job_id)
+            # Maintain job priority
+            await enqueue_job(job, processor)
 
             migrated_count += 1
             log.info(f"Migrated pending job {job_id} to {processor.value} queue")
@@ -183,7 +297,7 @@ async def migrate_legacy_queues() -> None:
             processor = LLMSelector.get_job_processor(job.metadata.customer_id, job_id)
             _, running_key, _ = get_processor_queue_keys(processor)
 
-            await db.rpush(running_key, job_id)
+            await db.sadd(running_key, job_id)
             await db.lrem(legacy_running_key, 0, job_id)
             migrated_count += 1
             log.info(f"Migrated running job {job_id} to {processor.value} running queue")
@@ -203,7 +317,7 @@ async def migrate_legacy_queues() -> None:
             processor = LLMSelector.get_job_processor(job.metadata.customer_id, job_id)
             _, _, error_key = get_processor_queue_keys(processor)
 
-            await db.rpush(error_key, job_id)
+            await db.sadd(error_key, job_id)
             await db.lrem(legacy_error_key, 0, job_id)
             migrated_count += 1
             log.info(f"Migrated error job {job_id} to {processor.value} error queue")
@@ -216,45 +330,143 @@ async def migrate_legacy_queues() -> None:
         await update_summary_queue_metric()
 
 
+async def migrate_pending_lists() -> None:
+    """Convert the processor-specific pending queues from lists to sorted sets."""
+
+    migrated_count = 0
+
+    for processor in get_all_processor_queue_keys():
+        pending_key = get_processor_queue_keys(processor)[0]
+        _, wakeups_key = get_processor_pending_keys(processor)
+
+        try:
+            count = await convert_pending_list_script([pending_key, wakeups_key], [time.time()])
+            if count >= 0:
+                migrated_count += count
+                log.info(f"Converted {pending_key} to a sorted set of {count} jobs")
+
+        except Exception as e:
+            log.error(f"Failed to convert {pending_key} to a sorted set: {e}")
+
+    if migrated_count > 0:
+        log.info(f"Migration completed: moved {migrated_count} jobs from pending lists to sorted sets")
+
+
+async def migrate_job_lists_to_sets() -> None:
+    """Convert the processor-specific running and error queues from lists to sets."""
+
+    migrated_count = 0
+
+    for processor in get_all_processor_queue_keys():
+        _, running_key, error_key = get_processor_queue_keys(processor)
+
+        for key in (running_key, error_key):
+            try:
+                count = await db.convert_list_to_set(key)
+                if count >= 0:
+                    migrated_count += count
+                    log.info(f"Converted {key} to a set of {count} jobs")
+
+            except Exception as e:
+                log.error(f"Failed to convert {key} to a set: {e}")
+
+    if migrated_count > 0:
+        log.info(f"Migration completed: moved {migrated_count} jobs from running and error lists to sets")
+
+
 async def restore_stale_jobs() -> list[Job]:
     """Check if any jobs were running on disconnected workers and requeue them to processor-specific queues."""
 
-    connected_clients = await db.client_list()
+    connected_clients = {client['id'] for client in await db.client_list()}
     all_stale_jobs = []
 
     # Check all processor-specific running job lists
     for processor in get_all_processor_queue_keys():
         _, running_key, _ = get_processor_queue_keys(processor)
 
-        running_jobs_keys = await db.lrange(running_key, 0, -1)
+        running_jobs_keys = list(await db.smembers(running_key))
         if not running_jobs_keys:
             continue
 
         running_jobs = await db.mget(running_jobs_keys)
+        workers = await db.hmget(get_processor_running_workers_key(processor), running_jobs_keys)
 
-        for job_json in running_jobs:
+        for job_json, worker in zip(running_jobs, workers):
             if not job_json:
                 continue
 
             job = Job.model_validate_json(job_json)
 
-            if str(job.worker_id) not in [client['id'] for client in connected_clients]:
+            # the jobs claimed by earlier versions only have their worker in the job
+            if (worker or str(job.worker_id)) not in connected_clients:
                 all_stale_jobs.append((job, processor))
 
     if all_stale_jobs:
         ids = [job.id for job, _ in all_stale_jobs]
         log.info(f"Restoring stale job(s): {ids}")
 
-        # Restore each job to its appropriate processor queue
+        # Restore each job to its appropriate processor queue, the pop will move it back to the running set. They
+        # aren't spaced after the other jobs of their customers since they already waited their turn.
         for job, processor in all_stale_jobs:
-            pending_key = get_processor_queue_keys(processor)[0]
-            await db.lpush(pending_key, job.id)
+            _, running_key, _ = get_processor_queue_keys(processor)
+            await db.srem(running_key, job.id)
+            await db.hdel(get_processor_running_workers_key(processor), job.id)
+            await enqueue_job(job, processor, fair=False)
 
         await update_summary_queue_metric()
 
     return [job for job, _ in all_stale_jobs]
 
 
+def get_job_head_start(job: Job) -> int:
+    """How many seconds ahead of its creation time a job is queued, by its priority."""
+
+    head_start = PRIORITY_HEAD_START[job.payload.priority]
+
+    if job.payload.is_live_summary:
+        head_start += LIVE_SUMMARY_HEAD_START
+
+    return head_start
+
+
+def get_job_start(job: Job) -> float:
+    """
+    The time a job should start at, which orders the pending queue: its creation time, moved ahead by its priority.
+    """
+
+    return job.created - get_job_head_start(job)
+
+
+async def enqueue_job(job: Job, processor: Processors, fair: bool = True) -> None:
+    """
+    Add a job to a processor-specific pending queue. It is spaced after the previous job of its customer with the same
+    head start if fair, and starts at the latest a job timeout before its deadline, but no more than
+    `DEADLINE_MAX_HEAD_START` seconds early.
+    """
+
+    pending_key = get_processor_queue_keys(processor)[0]
+    customers_key, wakeups_key = get_processor_pending_keys(processor)
+    customer_id = job.metadata.customer_id if fair else None
+    head_start = get_job_head_start(job)
+    start = job.created - head_start
+    latest_start = None
+
+    if job.payload.deadline:
+        latest_start = max(job.payload.deadline - job_timeout, start - DEADLINE_MAX_HEAD_START)
+
+    await enqueue_job_script(
+        [pending_key, customers_key, wakeups_key],
+        [
+            job.id,
+            start,
+            f'{customer_id}:{head_start}' if customer_id else '',
+            CUSTOMER_JOB_SPACING,
+            CUSTOMER_JOB_SPACING_TTL,
+            '' if latest_start is None else latest_start,
+        ],
+    )
+
+
 async def create_job(job_type: JobType, payload: DocumentPayload, metadata: DocumentMetadata) -> JobId:
     """Create a job and add it to the processor-specific queue."""
 
@@ -279,12 +491,7 @@ async def create_job(job_type: JobType, payload: DocumentPayload, metadata: Docu
     log.info(f"Created job {job.id} for processor {processor.value}.")
 
     # Route to processor-specific queue
-    pending_key = get_processor_queue_keys(processor)[0]
-
-    if payload.priority == Priority.HIGH:
-        await db.lpush(pending_key, job_id)
-    else:
-        await db.rpush(pending_key, job_id)
+    await enqueue_job(job, processor)
 
     await update_summary_queue_metric()
 
@@ -298,17 +505,29 @@ async def get_job(job_id: str) -> Job:
     return job
 
 
-async def update_job(job_id: str, expires: int = None, **kwargs) -> Job:
-    """Update a job in the db."""
-    job_json = await db.get(job_id)
+async def pop_job(processor: Processors, took_wakeup: bool) -> tuple[str, Job | None] | None:
+    """
+    Moves the job of the processor's pending queue that should start first to its running set and claims it for this
+    worker, returns its id and the claimed job, or None if the queue is empty.
+    """
+
+    pending_key, running_key, _ = get_processor_queue_keys(processor)
+    _, wakeups_key = get_processor_pending_keys(processor)
+    workers_key = get_processor_running_workers_key(processor)
+
+    # the id of the connection the worker is known by, read for every claim since it changes if it reconnects
+    worker_id = await db.db.client_id()
+    popped = await pop_job_script(
+        [pending_key, running_key, wakeups_key, workers_key],
+        ['1' if took_wakeup else '0', worker_id, time.time(), f'{redis_namespace}:'],
+    )
 
-    # deserialize and merge
-    job = Job(**(Job.model_validate_json(job_json).model_dump() | kwargs))
+    if not popped:
+        return None
 
-    # serialize changes and save to db
-    await db.set(job_id, Job.model_dump_json(job), expires)
+    job_id, *claimed_job_json = popped
 
-    return job
+    return job_id, Job.model_validate_json(claimed_job_json[0]) if claimed_job_json else None
 
 
 async def run_job(job: Job) -> None:
@@ -325,23 +544,24 @@ async def update_done_job(job: Job, result: str, processor: Processors, has_fail
     status = JobStatus.ERROR if has_failed else JobStatus.SUCCESS
     customer_id = job.metadata.customer_id
 
-    updated_job = await update_job(
-        expires=redis_exp_seconds if should_expire else None,
-        job_id=job.id,
-        end=time.time(),
-        status=status,
-        result=result,
-    )
+    updated_job = Job(**(job.model_dump() | {'end': time.time(), 'status': status, 'result': result}))
+    _, running_key, error_key = get_processor_queue_keys(processor)
+
+    # Save the result and move the job out of the processor-specific running queue in a single transaction, so that
+    # a crash can't leave it done but still running, or out of the running queue but not in the error queue
+    transaction = db.pipeline()
+    transaction.set(job.id, Job.model_dump_json(updated_job), redis_exp_seconds if should_expire else None)
+    transaction.srem(running_key, job.id)
+    transaction.hdel(get_processor_running_workers_key(processor), job.id)
 
     # Use processor-specific error queue
     if not should_expire:
-        _, _, error_key = get_processor_queue_keys(processor)
-        await db.rpush(error_key, job.id)
-        SUMMARY_ERROR_COUNTER.inc()
+        transaction.sadd(error_key, job.id)
 
-    # Remove from processor-specific running queue
-    _, running_key, _ = get_processor_queue_keys(processor)
-    await db.lrem(running_key, 0, job.id)
+    await transaction.execute()
+
+    if not should_expire:
+        SUMMARY_ERROR_COUNTER.inc()
 
     SUMMARY_DURATION_METRIC.labels(updated_job.metadata.app_id, processor.value, customer_id).observe(
         updated_job.computed_duration
@@ -357,23 +577,8 @@ async def update_done_job(job: Job, result: str, processor: Processors, has_fail
 async def _run_job(job: Job) -> None:
     has_failed = False
     result = None
-    worker_id = await db.db.client_id()
-    start = time.time()
     customer_id = job.metadata.customer_id
 
-    SUMMARY_TIME_IN_QUEUE_METRIC.observe(start - job.created)
-
-    log.info(f"Running job {job.id}. Queue time: {round(start - job.created, 3)} seconds")
-
-    job = await update_job(job_id=job.id, start=start, status=JobStatus.RUNNING, worker_id=worker_id)
-
-    # Add to processor-specific running jobs list if not already there
-    processor = LLMSelector.get_job_processor(customer_id, job.id)
-    _, running_key, _ = get_processor_queue_keys(processor)
-
-    if job.id not in await db.lrange(running_key, 0, -1):
-        await db.rpush(running_key, job.id)
-
     try:
         result = await process(job)
     except Exception as e:
@@ -400,6 +605,7 @@ def create_run_job_task(job: Job) -> asyncio.Task:
 
     def remove_task(t):
         current_tasks[processor].discard(t)
+        capacity_events[processor].set()
         # Update metrics when task is removed
         update_current_tasks_metrics()
 
@@ -412,28 +618,66 @@ def create_run_job_task(job: Job) -> asyncio.Task:
     return task
 
 
-async def maybe_run_next_job() -> None:
-    # Priority order for processor queues - prefer faster external APIs over local processing
-    processor_priority = [Processors.OCI, Processors.OPENAI, Processors.AZURE, Processors.LOCAL]
+async def run_next_job(processor: Processors) -> bool:
+    """
+    Starts the job of the processor's pending queue that should start first, waiting for one if there are none. The
+    job is moved to the running set and claimed for this worker by a single script, so it is never out of both, nor
+    running without a worker. Returns False if no job came in time, or another worker took it first.
+    """
+
+    _, wakeups_key = get_processor_pending_keys(processor)
+
+    popped = await pop_job(processor, took_wakeup=False)
+
+    if not popped:
+        # Every queued job comes with a wake-up, so this blocks until there is one
+        if not await db.blpop(wakeups_key, TIME_TO_WAIT_FOR_JOB):
+            return False
+
+        popped = await pop_job(processor, took_wakeup=True)
 
-    # Try to fill capacity for each processor
-    for processor in processor_priority:
-        while can_run_next_job(processor):
-            pending_key = get_processor_queue_keys(processor)[0]
-            next_job_id = await db.lpop(pending_key)
+        if not popped:
+            return False
 
-            if not next_job_id:
-                break  # No more jobs in this queue
+    next_job_id, next_job = popped
 
-            log.info(f"Found job {next_job_id} in {processor.value} queue")
-            next_job = await get_job(next_job_id)
-            create_run_job_task(next_job)
+    if next_job:
+        SUMMARY_TIME_IN_QUEUE_METRIC.observe(next_job.start - next_job.created)
+        log.info(
+            f"Running job {next_job_id} from {processor.value} queue. "
+            f"Queue time: {round(next_job.start - next_job.created, 3)} seconds"
+        )
+        create_run_job_task(next_job)
+    else:
+        log.warning(f"Job {next_job_id} no longer exists")
 
     await update_summary_queue_metric()
 
+    return True
+
+
+async def wait_for_jobs(processor: Processors) -> None:
+    """Runs the jobs of a processor as they come in, as long as it has capacity for them."""
+
+    capacity_event = capacity_events[processor]
+
+    while True:
+        try:
+            while not can_run_next_job(processor):
+                capacity_event.clear()
+                await capacity_event.wait()
+
+            await run_next_job(processor)
+        except Exception as e:
+            log.error(f"Error waiting for {processor.value} jobs: {e}")
+            await asyncio.sleep(TIME_BETWEEN_JOBS_CHECK_ON_ERROR)
+
 
 async def monitor_candidate_jobs() -> None:
-    # Run one-time migration from legacy queues to processor-specific queues
+    # Run one-time migrations from pending lists to sorted sets, from running and error lists to sets, and from legacy
+    # queues to processor-specific queues
+    await migrate_pending_lists()
+    await migrate_job_lists_to_sets()
     await migrate_legacy_queues()
 
     await restore_stale_jobs()
@@ -441,13 +685,10 @@ async def monitor_candidate_jobs() -> None:
     while not await is_openai_api_ready():
         await asyncio.sleep(TIME_BETWEEN_JOBS_CHECK)
 
-    while True:
-        try:
-            await maybe_run_next_job()
-            await asyncio.sleep(TIME_BETWEEN_JOBS_CHECK)
-        except Exception as e:
-            log.error(f"Error in job monitoring: {e}")
-            await asyncio.sleep(TIME_BETWEEN_JOBS_CHECK_ON_ERROR)
+    await update_summary_queue_metric()
+
+    # One blocking waiter per processor, so that a busy processor doesn't hold back the others
+    await asyncio.gather(*(wait_for_jobs(processor) for processor in get_all_processor_queue_keys()))
 
 
 async def restart_on_timeout(job: Job) -> None:
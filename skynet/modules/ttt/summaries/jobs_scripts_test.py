@@ -0,0 +1,248 @@
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from skynet.env import redis_namespace
+from skynet.modules.ttt.persistence import Redis
+from skynet.modules.ttt.summaries.jobs import CONVERT_PENDING_LIST_SCRIPT, ENQUEUE_JOB_SCRIPT, POP_JOB_SCRIPT
+from skynet.modules.ttt.summaries.v1.models import DocumentMetadata, DocumentPayload, Job, JobStatus, JobType
+
+SPACING = 10
+SPACING_TTL = 60
+
+
+@pytest_asyncio.fixture
+async def redis_db():
+    '''A connection to a Redis server, which CI provides. The tests are skipped without one.'''
+
+    db = Redis()
+    try:
+        await db.initialize()
+    except RuntimeError:
+        pytest.skip('Redis is not available')
+
+    prefix = f'test:{uuid.uuid4()}'
+    db.keys = (
+        f'{prefix}:pending',
+        f'{prefix}:customers',
+        f'{prefix}:wakeups',
+        f'{prefix}:running',
+        f'{prefix}:running:workers',
+    )
+    db.prefix = prefix
+    db.job_ids = []
+
+    yield db
+
+    for key in [*db.keys, *db.job_ids]:
+        await db.delete(key)
+    await db.close()
+
+
+async def enqueue(db, job_id: str, start: float, customer_id: str = '', latest_start: float | None = None) -> float:
+    pending_key, customers_key, wakeups_key, _, _ = db.keys
+    score = await db.register_script(ENQUEUE_JOB_SCRIPT)(
+        [pending_key, customers_key, wakeups_key],
+        [job_id, start, customer_id, SPACING, SPACING_TTL, '' if latest_start is None else latest_start],
+    )
+
+    return float(score)
+
+
+async def store_job(db, job_id: str) -> str:
+    '''Stores a pending job under an id unique to the test, which it returns.'''
+
+    job_id = f'{db.prefix}:{job_id}'
+    job = Job(
+        id=job_id,
+        created=1000.0,
+        payload=DocumentPayload(text='test'),
+        metadata=DocumentMetadata(customer_id='test'),
+        type=JobType.SUMMARY,
+    )
+    await db.set(job_id, Job.model_dump_json(job))
+    db.job_ids.append(job_id)
+
+    return job_id
+
+
+async def pop_and_claim(db, took_wakeup: bool = False, worker_id: int = 1, start: float = 2000.0) -> list | None:
+    pending_key, _, wakeups_key, running_key, workers_key = db.keys
+
+    return await db.register_script(POP_JOB_SCRIPT)(
+        [pending_key, running_key, wakeups_key, workers_key],
+        ['1' if took_wakeup else '0', worker_id, start, f'{redis_namespace}:'],
+    )
+
+
+async def pop(db, took_wakeup: bool = False, worker_id: int = 1) -> str | None:
+    popped = await pop_and_claim(db, took_wakeup, worker_id)
+
+    return popped[0] if popped else None
+
+
+class TestEnqueueJobScript:
+    @pytest.mark.asyncio
+    async def test_order(self, redis_db):
+        '''Test that the jobs are popped in the order of their start time.'''
+
+        await enqueue(redis_db, 'late', 2000)
+        await enqueue(redis_db, 'early', 1000)
+
+        assert await pop(redis_db) == 'early'
+        assert await pop(redis_db) == 'late'
+        assert await pop(redis_db) is None
+
+    @pytest.mark.asyncio
+    async def test_customer_spacing(self, redis_db):
+        '''Test that the pending jobs of a customer are spaced apart, without holding back the other customers.'''
+
+        assert await enqueue(redis_db, 'a1', 1000, 'a') == 1000
+        assert await enqueue(redis_db, 'a2', 1000, 'a') == 1000 + SPACING
+        assert await enqueue(redis_db, 'a3', 1000, 'a') == 1000 + 2 * SPACING
+        assert await enqueue(redis_db, 'b1', 1001, 'b') == 1001
+
+        assert [await pop(redis_db) for _ in range(4)] == ['a1', 'b1', 'a2', 'a3']
+
+    @pytest.mark.asyncio
+    async def test_no_spacing_after_popped_jobs(self, redis_db):
+        '''Test that a customer isn't held back by jobs of theirs that already left the queue.'''
+
+        for i in range(100):
+            await enqueue(redis_db, f'a{i}', 1000, 'a')
+        for _ in range(100):
+            await pop(redis_db)
+
+        assert await enqueue(redis_db, 'a100', 1100, 'a') == 1100
+
+    @pytest.mark.asyncio
+    async def test_head_start_not_spaced_behind_batch_jobs(self, redis_db):
+        '''
+        Test that the live and high priority jobs of a customer aren't spaced behind their jobs with a smaller head
+        start, which are spaced by the customer and head start they are queued with.
+        '''
+
+        await enqueue(redis_db, 'a-low', 1300, 'a:-300')
+        for i in range(3):
+            await enqueue(redis_db, f'a-normal{i}', 1000, 'a:0')
+        await enqueue(redis_db, 'b-normal', 1000, 'b:0')
+
+        assert await enqueue(redis_db, 'a-live', 880, 'a:120') == 880
+        assert await enqueue(redis_db, 'a-high', 700, 'a:300') == 700
+
+        assert [await pop(redis_db) for _ in range(7)] == [
+            'a-high',
+            'a-live',
+            'a-normal0',
+            'b-normal',
+            'a-normal1',
+            'a-normal2',
+            'a-low',
+        ]
+
+    @pytest.mark.asyncio
+    async def test_latest_start(self, redis_db):
+        '''Test that a job starts no later than its latest start, even if its customer has other pending jobs.'''
+
+        await enqueue(redis_db, 'a1', 1000, 'a')
+        await enqueue(redis_db, 'b1', 1005)
+
+        assert await enqueue(redis_db, 'a2', 1000, 'a', latest_start=1002) == 1002
+        assert [await pop(redis_db) for _ in range(3)] == ['a1', 'a2', 'b1']
+
+    @pytest.mark.asyncio
+    async def test_wakeups(self, redis_db):
+        '''Test that every queued job comes with a wake-up, which the pop takes unless the caller already did.'''
+
+        _, _, wakeups_key, running_key, _ = redis_db.keys
+
+        a1 = await store_job(redis_db, 'a1')
+        a2 = await store_job(redis_db, 'a2')
+        await enqueue(redis_db, a1, 1000)
+        await enqueue(redis_db, a2, 1000)
+        assert await redis_db.llen(wakeups_key) == 2
+
+        await pop(redis_db)
+        assert await redis_db.llen(wakeups_key) == 1
+
+        await redis_db.blpop(wakeups_key, 1)
+        await pop(redis_db, took_wakeup=True)
+        assert await redis_db.llen(wakeups_key) == 0
+        assert await redis_db.smembers(running_key) == {a1, a2}
+
+
+class TestPopJobScript:
+    @pytest.mark.asyncio
+    async def test_claims_job(self, redis_db):
+        '''Test that a popped job is claimed for the worker in the same call that moves it to the running set.'''
+
+        _, _, _, running_key, workers_key = redis_db.keys
+
+        a1 = await store_job(redis_db, 'a1')
+        a2 = await store_job(redis_db, 'a2')
+        await enqueue(redis_db, a1, 1000)
+        await enqueue(redis_db, a2, 1001)
+
+        assert await pop(redis_db, worker_id=7) == a1
+        assert await pop(redis_db, worker_id=8) == a2
+        assert await redis_db.smembers(running_key) == {a1, a2}
+        assert await redis_db.hmget(workers_key, [a1, a2]) == ['7', '8']
+
+    @pytest.mark.asyncio
+    async def test_returns_claimed_job(self, redis_db):
+        '''Test that the popped job is stored and returned as running, with its start and worker.'''
+
+        job_id = await store_job(redis_db, 'a1')
+        await enqueue(redis_db, job_id, 1000)
+
+        popped_id, claimed_job_json = await pop_and_claim(redis_db, worker_id=7, start=2000.5)
+
+        assert popped_id == job_id
+        claimed_job = Job.model_validate_json(claimed_job_json)
+        assert claimed_job == Job.model_validate_json(await redis_db.get(job_id))
+        assert claimed_job.status == JobStatus.RUNNING
+        assert claimed_job.start == 2000.5
+        assert claimed_job.worker_id == 7
+        assert claimed_job.created == 1000.0
+
+    @pytest.mark.asyncio
+    async def test_missing_job(self, redis_db):
+        '''Test that a popped job that no longer exists is dropped instead of claimed.'''
+
+        _, _, _, running_key, workers_key = redis_db.keys
+
+        await enqueue(redis_db, 'gone', 1000)
+
+        assert await pop_and_claim(redis_db) == ['gone']
+        assert await redis_db.smembers(running_key) == set()
+        assert await redis_db.hmget(workers_key, ['gone']) == [None]
+
+    @pytest.mark.asyncio
+    async def test_empty_queue(self, redis_db):
+        '''Test that nothing is claimed when the queue is empty.'''
+
+        _, _, _, running_key, workers_key = redis_db.keys
+
+        assert await pop(redis_db) is None
+        assert await redis_db.smembers(running_key) == set()
+        assert await redis_db.hmget(workers_key, ['a1']) == [None]
+
+
+class TestConvertPendingListScript:
+    @pytest.mark.asyncio
+    async def test_converts_list(self, redis_db):
+        '''Test that a pending list becomes a queue of its jobs in the same order, with a wake-up for each.'''
+
+        pending_key, _, wakeups_key, _, _ = redis_db.keys
+        script = redis_db.register_script(CONVERT_PENDING_LIST_SCRIPT)
+        await redis_db.rpush(pending_key, 'first', 'second', 'third')
+
+        assert await script([pending_key, wakeups_key], [1000]) == 3
+        assert await redis_db.llen(wakeups_key) == 3
+        assert [await pop(redis_db) for _ in range(3)] == ['first', 'second', 'third']
+
+        # already converted
+        await enqueue(redis_db, 'fourth', 1000)
+        assert await script([pending_key, wakeups_key], [1000]) == -1
+        assert await pop(redis_db) == 'fourth'
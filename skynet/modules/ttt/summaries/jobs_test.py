@@ -1,5 +1,5 @@
 from typing import Iterator
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
@@ -10,8 +10,8 @@ from skynet.modules.ttt.summaries.v1.models import DocumentMetadata, DocumentPay
 @pytest.fixture(scope='module', autouse=True)
 def default_session_fixture() -> Iterator[None]:
     with patch('skynet.modules.ttt.persistence.db.set'), patch('skynet.modules.ttt.persistence.db.rpush'), patch(
-        'skynet.modules.ttt.persistence.db.llen'
-    ):
+        'skynet.modules.ttt.persistence.db.zcard_many', return_value=[0, 0, 0, 0]
+    ), patch('skynet.modules.ttt.summaries.jobs.enqueue_job_script'):
         yield
 
 
@@ -24,12 +24,15 @@ class TestCreateJob:
         mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
 
         from skynet.constants import PENDING_JOBS_LOCAL_KEY
-        from skynet.modules.ttt.summaries.jobs import create_job, update_summary_queue_metric
+        from skynet.modules.ttt.summaries.jobs import create_job, enqueue_job_script, update_summary_queue_metric
 
         job_id = await create_job(JobType.SUMMARY, DocumentPayload(text='test'), DocumentMetadata(customer_id='test'))
 
         # Job should be queued in LOCAL processor queue since 'test' customer defaults to LOCAL
-        db.rpush.assert_called_once_with(PENDING_JOBS_LOCAL_KEY, job_id.id)
+        keys, args = enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_LOCAL_KEY
+        assert args[0] == job_id.id
+        assert args[2] == 'test:0'
         update_summary_queue_metric.assert_called_once()
 
 
@@ -37,9 +40,8 @@ class TestCreateJob:
 def run_job_fixture(mocker):
     mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_DURATION_METRIC.labels')
     mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_FULL_DURATION_METRIC.observe')
-    mocker.patch('skynet.modules.ttt.summaries.jobs.update_job')
-    mocker.patch('skynet.modules.ttt.summaries.jobs.process')
-    mocker.patch('skynet.modules.ttt.summaries.jobs.db.db')
+    mocker.patch('skynet.modules.ttt.summaries.jobs.process', return_value='summary')
+    mocker.patch('skynet.modules.ttt.summaries.jobs.db.pipeline').return_value.execute = AsyncMock()
 
     return mocker
 
@@ -93,8 +95,9 @@ class TestRestoreStaleJobs:
     async def test_restore_stales_jobs(self, mocker):
         '''Test that if there are stale jobs, they will be restored to processor-specific queues.'''
 
-        from skynet.constants import PENDING_JOBS_LOCAL_KEY
+        from skynet.constants import RUNNING_JOBS_LOCAL_KEY
         from skynet.modules.ttt.summaries.jobs import restore_stale_jobs
+        from skynet.modules.ttt.summaries.v1.models import Processors
 
         job_1 = Job(
             id='job_id_1',
@@ -125,288 +128,365 @@ class TestRestoreStaleJobs:
             {'id': '1'}
         ]  # only one worker connected, any jobs that were running on worker 2 should be restored (jobs 2 and 3 in this case)
 
-        def mock_lrange(key, start, end):
+        def mock_smembers(key):
             # Only return running jobs for LOCAL processor queue to avoid duplicates
             if 'local' in key:
-                return [job_1.id, job_2.id, job_3.id]
-            return []
+                return {job_1.id, job_2.id, job_3.id}
+            return set()
 
         def mock_mget(keys):
             if not keys:
                 return []
             return [job_1_json, job_2_json, job_3_json]
 
-        mocker.patch('skynet.modules.ttt.persistence.db.lrange', side_effect=mock_lrange)
+        mocker.patch('skynet.modules.ttt.persistence.db.smembers', side_effect=mock_smembers)
         mocker.patch('skynet.modules.ttt.persistence.db.mget', side_effect=mock_mget)
-        mocker.patch('skynet.modules.ttt.persistence.db.lpush')
+        mocker.patch('skynet.modules.ttt.persistence.db.hmget', side_effect=lambda key, fields: [None] * len(fields))
+        mocker.patch('skynet.modules.ttt.persistence.db.srem')
+        mocker.patch('skynet.modules.ttt.persistence.db.hdel')
         mocker.patch('skynet.modules.ttt.persistence.db.client_list', return_value=client_list)
+        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
+        mock_enqueue_job = mocker.patch('skynet.modules.ttt.summaries.jobs.enqueue_job')
 
         await restore_stale_jobs()
 
-        # Should restore stale jobs (job_2 and job_3) to LOCAL queue
-        assert db.lpush.call_count == 2
-        db.lpush.assert_any_call(PENDING_JOBS_LOCAL_KEY, job_2.id)
-        db.lpush.assert_any_call(PENDING_JOBS_LOCAL_KEY, job_3.id)
+        # Should restore stale jobs (job_2 and job_3) to LOCAL queue, without spacing them after their customer's jobs
+        assert mock_enqueue_job.call_count == 2
+        mock_enqueue_job.assert_any_call(job_2, Processors.LOCAL, fair=False)
+        mock_enqueue_job.assert_any_call(job_3, Processors.LOCAL, fair=False)
 
+        # and take them out of the running set, since they will be moved back there when they are picked up
+        db.srem.assert_any_call(RUNNING_JOBS_LOCAL_KEY, job_2.id)
+        db.srem.assert_any_call(RUNNING_JOBS_LOCAL_KEY, job_3.id)
+        db.hdel.assert_any_call(f'{RUNNING_JOBS_LOCAL_KEY}:workers', job_2.id)
+        db.hdel.assert_any_call(f'{RUNNING_JOBS_LOCAL_KEY}:workers', job_3.id)
 
-class TestMaybeRunNextJob:
     @pytest.mark.asyncio
-    async def test_pulls_multiple_jobs_when_capacity_available(self, mocker):
-        '''Test that multiple jobs are pulled when there's capacity for multiple.'''
-        from skynet.constants import PENDING_JOBS_OPENAI_KEY
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+    async def test_uses_claimed_worker(self, mocker):
+        '''Test that the worker a job was claimed by in the pop decides if it's stale, even before it is saved.'''
+
+        from skynet.constants import RUNNING_JOBS_LOCAL_KEY
+        from skynet.modules.ttt.summaries.jobs import restore_stale_jobs
         from skynet.modules.ttt.summaries.v1.models import Processors
 
-        # Mock dependencies
-        mocker.patch('skynet.modules.ttt.summaries.jobs.modules', {'summaries:executor'})
+        # popped by worker 1, but not saved as running yet
+        job_1 = Job(
+            id='job_id_1',
+            payload=DocumentPayload(text='some text'),
+            type='summary',
+            metadata=DocumentMetadata(customer_id='test'),
+        )
+        job_2 = Job(
+            id='job_id_2',
+            payload=DocumentPayload(text='some text'),
+            type='summary',
+            worker_id=1,
+            metadata=DocumentMetadata(customer_id='test'),
+        )
+        workers = {job_1.id: '1', job_2.id: '2'}
+
+        mocker.patch(
+            'skynet.modules.ttt.persistence.db.smembers',
+            side_effect=lambda key: [job_1.id, job_2.id] if key == RUNNING_JOBS_LOCAL_KEY else [],
+        )
+        mocker.patch(
+            'skynet.modules.ttt.persistence.db.mget',
+            side_effect=lambda keys: [Job.model_dump_json(job_1), Job.model_dump_json(job_2)],
+        )
+        mocker.patch(
+            'skynet.modules.ttt.persistence.db.hmget', side_effect=lambda key, fields: [workers[f] for f in fields]
+        )
+        mocker.patch('skynet.modules.ttt.persistence.db.srem')
+        mocker.patch('skynet.modules.ttt.persistence.db.hdel')
+        mocker.patch('skynet.modules.ttt.persistence.db.client_list', return_value=[{'id': '1'}])
         mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
+        mock_enqueue_job = mocker.patch('skynet.modules.ttt.summaries.jobs.enqueue_job')
+
+        assert await restore_stale_jobs() == [job_2]
+
+        mock_enqueue_job.assert_called_once_with(job_2, Processors.LOCAL, fair=False)
+
+
+@pytest.fixture()
+def worker_id_fixture(mocker):
+    mocker.patch('skynet.modules.ttt.summaries.jobs.db.db.client_id', new=AsyncMock(return_value=1))
+    mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
+
+    return mocker
+
+
+def make_claimed_job() -> Job:
+    from skynet.modules.ttt.summaries.v1.models import JobStatus
+
+    return Job(
+        id='job:1:openai',
+        created=1000.0,
+        start=1001.0,
+        status=JobStatus.RUNNING,
+        worker_id=1,
+        payload=DocumentPayload(text='test'),
+        metadata=DocumentMetadata(customer_id='test'),
+        type=JobType.SUMMARY,
+    )
+
+
+class TestRunNextJob:
+    @pytest.mark.asyncio
+    async def test_moves_job_to_running_set(self, worker_id_fixture):
+        '''
+        Test that the next job is moved from the pending queue to the running set of the processor and claimed for the
+        worker in a single call, then started.
+        '''
+
+        mocker = worker_id_fixture
+
+        from skynet.constants import PENDING_JOBS_OPENAI_KEY, RUNNING_JOBS_OPENAI_KEY
+        from skynet.env import redis_namespace
+        from skynet.modules.ttt.summaries.jobs import run_next_job
+        from skynet.modules.ttt.summaries.v1.models import Processors
+
+        job = make_claimed_job()
+
         mock_get_job = mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
         mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mock_pop_job = mocker.patch(
+            'skynet.modules.ttt.summaries.jobs.pop_job_script', return_value=[job.id, Job.model_dump_json(job)]
+        )
+        mocker.patch('skynet.modules.ttt.persistence.db.blpop')
 
-        # Create mock jobs
-        job_ids = ['job:1:openai', 'job:2:openai', 'job:3:openai']
-        mock_jobs = [
-            Job(
-                id=job_id,
-                payload=DocumentPayload(text='test'),
-                metadata=DocumentMetadata(customer_id='test'),
-                type=JobType.SUMMARY,
-            )
-            for job_id in job_ids
+        assert await run_next_job(Processors.OPENAI)
+
+        # the job is there, so there is no need to wait
+        keys, args = mock_pop_job.call_args.args
+        assert keys == [
+            PENDING_JOBS_OPENAI_KEY,
+            RUNNING_JOBS_OPENAI_KEY,
+            f'{PENDING_JOBS_OPENAI_KEY}:wakeups',
+            f'{RUNNING_JOBS_OPENAI_KEY}:workers',
         ]
+        assert args[:2] == ['0', 1]
+        assert args[3] == f'{redis_namespace}:'
+        db.blpop.assert_not_called()
+        # the claimed job comes with the pop
+        mock_get_job.assert_not_called()
+        mock_create_task.assert_called_once_with(job)
 
-        # Mock lpop to return None for OCI queue, then 3 jobs for OPENAI, then None
-        openai_job_index = [0]
+    @pytest.mark.asyncio
+    async def test_worker_id_per_claim(self, worker_id_fixture):
+        '''Test that the id of the worker's connection is read for every claim, since it changes on reconnects.'''
 
-        def lpop_side_effect(key):
-            if key == PENDING_JOBS_OPENAI_KEY:
-                if openai_job_index[0] < len(job_ids):
-                    job_id = job_ids[openai_job_index[0]]
-                    openai_job_index[0] += 1
-                    return job_id
-            return None
+        mocker = worker_id_fixture
 
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=lpop_side_effect)
+        from skynet.modules.ttt.summaries.jobs import run_next_job
+        from skynet.modules.ttt.summaries.v1.models import Processors
 
-        mock_get_job.side_effect = mock_jobs
+        job = make_claimed_job()
 
-        # Mock capacity: current_tasks starts empty, max_concurrency is 5
-        mocker.patch(
-            'skynet.modules.ttt.summaries.jobs.current_tasks',
-            {
-                Processors.OPENAI: set(),
-                Processors.AZURE: set(),
-                Processors.OCI: set(),
-                Processors.LOCAL: set(),
-            },
+        mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        client_id = mocker.patch('skynet.modules.ttt.summaries.jobs.db.db.client_id', new=AsyncMock(side_effect=[1, 2]))
+        mock_pop_job = mocker.patch(
+            'skynet.modules.ttt.summaries.jobs.pop_job_script', return_value=[job.id, Job.model_dump_json(job)]
         )
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 5)
 
-        await maybe_run_next_job()
+        await run_next_job(Processors.LOCAL)
+        await run_next_job(Processors.LOCAL)
 
-        # Should have pulled all 3 jobs from OPENAI queue
-        assert mock_get_job.call_count == 3
-        assert mock_create_task.call_count == 3
+        assert client_id.call_count == 2
+        assert mock_pop_job.call_args.args[1][1] == 2
 
     @pytest.mark.asyncio
-    async def test_stops_when_capacity_reached(self, mocker):
-        '''Test that job pulling stops when processor reaches max concurrency.'''
-        import asyncio
+    async def test_waits_for_job(self, worker_id_fixture):
+        '''Test that an empty queue is popped again once a job is queued.'''
 
-        from skynet.constants import PENDING_JOBS_OPENAI_KEY
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+        mocker = worker_id_fixture
+
+        from skynet.constants import PENDING_JOBS_LOCAL_KEY
+        from skynet.modules.ttt.summaries.jobs import run_next_job, TIME_TO_WAIT_FOR_JOB
         from skynet.modules.ttt.summaries.v1.models import Processors
 
-        # Mock dependencies
-        mocker.patch('skynet.modules.ttt.summaries.jobs.modules', {'summaries:executor'})
-        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
-        mock_get_job = mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
-        mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        job = make_claimed_job()
 
-        # Mock 2 running tasks, max is 3, so should only pull 1 more job
-        mock_tasks = {asyncio.create_task(asyncio.sleep(0)), asyncio.create_task(asyncio.sleep(0))}
-        mocker.patch(
-            'skynet.modules.ttt.summaries.jobs.current_tasks',
-            {
-                Processors.OPENAI: mock_tasks,
-                Processors.AZURE: set(),
-                Processors.OCI: set(),
-                Processors.LOCAL: set(),
-            },
+        mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mock_pop_job = mocker.patch(
+            'skynet.modules.ttt.summaries.jobs.pop_job_script', side_effect=[None, [job.id, Job.model_dump_json(job)]]
         )
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 3)
+        mocker.patch('skynet.modules.ttt.persistence.db.blpop', return_value=('key', '1'))
 
-        # Mock queue with jobs available - return one job for OPENAI, None for others
-        job = Job(
-            id='job:1:openai',
-            payload=DocumentPayload(text='test'),
-            metadata=DocumentMetadata(customer_id='test'),
-            type=JobType.SUMMARY,
-        )
+        assert await run_next_job(Processors.LOCAL)
+
+        db.blpop.assert_called_once_with(f'{PENDING_JOBS_LOCAL_KEY}:wakeups', TIME_TO_WAIT_FOR_JOB)
+        # the wake-up was taken already
+        assert mock_pop_job.call_args.args[1][:2] == ['1', 1]
+        mock_create_task.assert_called_once_with(job)
+
+    @pytest.mark.asyncio
+    async def test_returns_false_when_no_job_came(self, worker_id_fixture):
+        '''Test that nothing is started when the wait times out.'''
 
-        openai_call_count = [0]
+        mocker = worker_id_fixture
 
-        def lpop_side_effect(key):
-            if key == PENDING_JOBS_OPENAI_KEY and openai_call_count[0] == 0:
-                openai_call_count[0] += 1
-                return 'job:1:openai'
-            return None
+        from skynet.modules.ttt.summaries.jobs import run_next_job
+        from skynet.modules.ttt.summaries.v1.models import Processors
 
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=lpop_side_effect)
-        mock_get_job.return_value = job
+        mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mock_pop_job = mocker.patch('skynet.modules.ttt.summaries.jobs.pop_job_script', return_value=None)
+        mocker.patch('skynet.modules.ttt.persistence.db.blpop', return_value=None)
 
-        await maybe_run_next_job()
+        assert not await run_next_job(Processors.LOCAL)
 
-        # Should only pull 1 job (capacity is 3, currently 2 running)
-        assert openai_call_count[0] == 1
-        assert mock_create_task.call_count == 1
+        assert mock_pop_job.call_count == 1
+        assert mock_create_task.call_count == 0
 
     @pytest.mark.asyncio
-    async def test_processes_multiple_processors(self, mocker):
-        '''Test that jobs are pulled from multiple processor queues in priority order.'''
-        from skynet.constants import PENDING_JOBS_OCI_KEY, PENDING_JOBS_OPENAI_KEY
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+    async def test_returns_false_when_another_worker_took_the_job(self, worker_id_fixture):
+        '''Test that nothing is started when the job is gone by the time it's popped.'''
+
+        mocker = worker_id_fixture
+
+        from skynet.modules.ttt.summaries.jobs import run_next_job
         from skynet.modules.ttt.summaries.v1.models import Processors
 
-        # Mock dependencies
-        mocker.patch('skynet.modules.ttt.summaries.jobs.modules', {'summaries:executor'})
-        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
-        mock_get_job = mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
         mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.pop_job_script', return_value=None)
+        mocker.patch('skynet.modules.ttt.persistence.db.blpop', return_value=('key', '1'))
 
-        # Create mock jobs for different processors
-        oci_job = Job(
-            id='job:1:oci',
-            payload=DocumentPayload(text='test'),
-            metadata=DocumentMetadata(customer_id='test'),
-            type=JobType.SUMMARY,
-        )
-        openai_job = Job(
-            id='job:2:openai',
-            payload=DocumentPayload(text='test'),
-            metadata=DocumentMetadata(customer_id='test'),
-            type=JobType.SUMMARY,
-        )
+        assert not await run_next_job(Processors.LOCAL)
+
+        assert mock_create_task.call_count == 0
 
-        # Track which queues have been popped
-        oci_popped = [False]
-        openai_popped = [False]
+    @pytest.mark.asyncio
+    async def test_missing_job(self, worker_id_fixture):
+        '''Test that a job that no longer exists isn't started.'''
 
-        def lpop_side_effect(key):
-            if key == PENDING_JOBS_OCI_KEY and not oci_popped[0]:
-                oci_popped[0] = True
-                return 'job:1:oci'
-            elif key == PENDING_JOBS_OPENAI_KEY and not openai_popped[0]:
-                openai_popped[0] = True
-                return 'job:2:openai'
-            return None
+        mocker = worker_id_fixture
 
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=lpop_side_effect)
+        from skynet.modules.ttt.summaries.jobs import run_next_job
+        from skynet.modules.ttt.summaries.v1.models import Processors
 
-        def get_job_side_effect(job_id):
-            if job_id == 'job:1:oci':
-                return oci_job
-            return openai_job
+        mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.pop_job_script', return_value=['job:1:local'])
 
-        mock_get_job.side_effect = get_job_side_effect
+        assert await run_next_job(Processors.LOCAL)
 
-        # Mock capacity for all processors
-        mocker.patch(
-            'skynet.modules.ttt.summaries.jobs.current_tasks',
-            {
-                Processors.OPENAI: set(),
-                Processors.AZURE: set(),
-                Processors.OCI: set(),
-                Processors.LOCAL: set(),
-            },
+        assert mock_create_task.call_count == 0
+
+
+def make_job(created: float = 1000.0, customer_id: str = 'test', **kwargs) -> Job:
+    return Job(
+        id='job',
+        created=created,
+        payload=DocumentPayload(text='test', **kwargs),
+        metadata=DocumentMetadata(customer_id=customer_id),
+        type=JobType.SUMMARY,
+    )
+
+
+class TestGetJobStart:
+    def test_priority_tiers(self):
+        '''Test that the jobs of a higher priority start first.'''
+
+        from skynet.modules.ttt.summaries.jobs import get_job_start
+        from skynet.modules.ttt.summaries.v1.models import Priority
+
+        low = get_job_start(make_job(priority=Priority.LOW))
+        normal = get_job_start(make_job())
+        live = get_job_start(make_job(is_live_summary=True))
+        high = get_job_start(make_job(priority=Priority.HIGH))
+
+        assert high < live < normal < low
+
+    def test_aging(self):
+        '''Test that a job that waited long enough starts before the higher priority jobs created after it.'''
+
+        from skynet.modules.ttt.summaries.jobs import get_job_start, PRIORITY_HEAD_START
+        from skynet.modules.ttt.summaries.v1.models import Priority
+
+        normal = get_job_start(make_job(created=1000))
+        later_high = get_job_start(
+            make_job(created=1000 + PRIORITY_HEAD_START[Priority.HIGH] + 1, priority=Priority.HIGH)
         )
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 5)
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_oci', 5)
 
-        await maybe_run_next_job()
+        assert normal < later_high
 
-        # Should have pulled jobs from both OCI and OPENAI
-        assert mock_create_task.call_count == 2
 
+class TestEnqueueJob:
     @pytest.mark.asyncio
-    async def test_stops_when_queue_empty(self, mocker):
-        '''Test that job pulling stops when queue is empty.'''
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+    async def test_deadline(self, mocker):
+        '''Test that a job with a deadline is queued to start at the latest a job timeout before it.'''
+
+        from skynet.env import job_timeout
+        from skynet.modules.ttt.summaries.jobs import DEADLINE_MAX_HEAD_START, enqueue_job
         from skynet.modules.ttt.summaries.v1.models import Processors
 
-        # Mock dependencies
-        mocker.patch('skynet.modules.ttt.summaries.jobs.modules', {'summaries:executor'})
-        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
-        mock_get_job = mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
-        mock_create_task = mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
+        mock_script = mocker.patch('skynet.modules.ttt.summaries.jobs.enqueue_job_script')
 
-        # Mock empty queue (lpop returns None)
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', return_value=None)
+        await enqueue_job(make_job(created=1000.0, deadline=5000.0 + job_timeout), Processors.LOCAL)
+        assert mock_script.call_args.args[1][5] == 5000.0
 
-        # Mock capacity available
-        mocker.patch(
-            'skynet.modules.ttt.summaries.jobs.current_tasks',
-            {
-                Processors.OPENAI: set(),
-                Processors.AZURE: set(),
-                Processors.OCI: set(),
-                Processors.LOCAL: set(),
-            },
-        )
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 5)
+        # an early deadline moves the job ahead only so much
+        await enqueue_job(make_job(created=1000.0, deadline=500.0), Processors.LOCAL)
+        assert mock_script.call_args.args[1][5] == 1000.0 - DEADLINE_MAX_HEAD_START
 
-        await maybe_run_next_job()
+        await enqueue_job(make_job(), Processors.LOCAL)
+        assert mock_script.call_args.args[1][5] == ''
 
-        # Should not start any jobs
-        assert mock_get_job.call_count == 0
-        assert mock_create_task.call_count == 0
+    @pytest.mark.asyncio
+    async def test_fairness(self, mocker):
+        '''Test that the customer is passed for spacing their jobs, unless the job isn't to be spaced.'''
+
+        from skynet.constants import PENDING_JOBS_OCI_KEY
+        from skynet.modules.ttt.summaries.jobs import CUSTOMER_JOB_SPACING, enqueue_job, LIVE_SUMMARY_HEAD_START
+        from skynet.modules.ttt.summaries.v1.models import Processors
 
+        mock_script = mocker.patch('skynet.modules.ttt.summaries.jobs.enqueue_job_script')
+
+        await enqueue_job(make_job(customer_id='customer'), Processors.OCI)
+        keys, args = mock_script.call_args.args
+        assert keys == [PENDING_JOBS_OCI_KEY, f'{PENDING_JOBS_OCI_KEY}:customers', f'{PENDING_JOBS_OCI_KEY}:wakeups']
+        assert args[2:4] == ['customer:0', CUSTOMER_JOB_SPACING]
+
+        # the jobs with another head start are spaced apart on their own
+        await enqueue_job(make_job(customer_id='customer', is_live_summary=True), Processors.OCI)
+        assert mock_script.call_args.args[1][2] == f'customer:{LIVE_SUMMARY_HEAD_START}'
+
+        await enqueue_job(make_job(customer_id='customer'), Processors.OCI, fair=False)
+        assert mock_script.call_args.args[1][2] == ''
+
+
+class TestWaitForJobs:
     @pytest.mark.asyncio
-    async def test_skips_processor_without_capacity(self, mocker):
-        '''Test that processors without capacity are skipped.'''
+    async def test_waits_for_capacity(self, mocker):
+        '''Test that a processor at capacity doesn't pop jobs until one of its tasks is done.'''
+
         import asyncio
 
-        from skynet.constants import (
-            PENDING_JOBS_AZURE_KEY,
-            PENDING_JOBS_LOCAL_KEY,
-            PENDING_JOBS_OCI_KEY,
-            PENDING_JOBS_OPENAI_KEY,
-        )
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+        from skynet.modules.ttt.summaries.jobs import wait_for_jobs
         from skynet.modules.ttt.summaries.v1.models import Processors
 
-        # Mock dependencies
+        running = {Processors.OPENAI: {'task'}}
+        events = {Processors.OPENAI: asyncio.Event()}
+
         mocker.patch('skynet.modules.ttt.summaries.jobs.modules', {'summaries:executor'})
-        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.current_tasks', running)
+        mocker.patch('skynet.modules.ttt.summaries.jobs.capacity_events', events)
+        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 1)
 
-        keys_checked = []
+        async def run_next_job(processor):
+            running[processor].add('another task')
+            return True
 
-        def lpop_side_effect(key):
-            keys_checked.append(key)
-            return None  # All queues empty
+        mock_run_next_job = mocker.patch('skynet.modules.ttt.summaries.jobs.run_next_job', side_effect=run_next_job)
 
-        mock_lpop = mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=lpop_side_effect)
+        waiter = asyncio.create_task(wait_for_jobs(Processors.OPENAI))
+        await asyncio.sleep(0.01)
 
-        # OPENAI at capacity, others have capacity
-        mock_openai_tasks = {asyncio.create_task(asyncio.sleep(0)) for _ in range(3)}
-        mocker.patch(
-            'skynet.modules.ttt.summaries.jobs.current_tasks',
-            {
-                Processors.OPENAI: mock_openai_tasks,
-                Processors.AZURE: set(),
-                Processors.OCI: set(),
-                Processors.LOCAL: set(),
-            },
-        )
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_openai', 3)  # At capacity
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_oci', 5)
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_azure', 5)
-        mocker.patch('skynet.modules.ttt.summaries.jobs.max_concurrency_local', 5)
-
-        await maybe_run_next_job()
-
-        # Should check OCI, AZURE, and LOCAL queues but NOT OPENAI (since it's at capacity)
-        assert PENDING_JOBS_OCI_KEY in keys_checked
-        assert PENDING_JOBS_AZURE_KEY in keys_checked
-        assert PENDING_JOBS_LOCAL_KEY in keys_checked
-        assert PENDING_JOBS_OPENAI_KEY not in keys_checked
+        assert mock_run_next_job.call_count == 0
+
+        running[Processors.OPENAI].clear()
+        events[Processors.OPENAI].set()
+        await asyncio.sleep(0.01)
+
+        # a single job is started, which takes the processor back to capacity
+        mock_run_next_job.assert_called_once_with(Processors.OPENAI)
+
+        waiter.cancel()
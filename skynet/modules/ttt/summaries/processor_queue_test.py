@@ -1,9 +1,11 @@
+import time
 from typing import Iterator
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
 from skynet.modules.ttt.persistence import db
+from skynet.modules.ttt.summaries import jobs
 from skynet.modules.ttt.summaries.v1.models import DocumentMetadata, DocumentPayload, Job, JobType
 
 
@@ -16,14 +18,17 @@ def reset_db_mocks():
         db.lpush.reset_mock()
     if hasattr(db, 'lrem'):
         db.lrem.reset_mock()
+    jobs.enqueue_job_script.reset_mock()
     yield
 
 
 @pytest.fixture(scope='module', autouse=True)
 def default_session_fixture() -> Iterator[None]:
     with patch('skynet.modules.ttt.persistence.db.set'), patch('skynet.modules.ttt.persistence.db.rpush'), patch(
-        'skynet.modules.ttt.persistence.db.llen'
-    ), patch('skynet.modules.ttt.persistence.db.lpush'), patch('skynet.modules.ttt.persistence.db.lrem'):
+        'skynet.modules.ttt.persistence.db.zcard_many', return_value=[0, 0, 0, 0]
+    ), patch('skynet.modules.ttt.persistence.db.lpush'), patch('skynet.modules.ttt.persistence.db.lrem'), patch(
+        'skynet.modules.ttt.summaries.jobs.enqueue_job_script'
+    ):
         yield
 
 
@@ -43,7 +48,9 @@ class TestProcessorSpecificQueues:
             JobType.SUMMARY, DocumentPayload(text='test'), DocumentMetadata(customer_id='openai_customer')
         )
 
-        db.rpush.assert_called_once_with(PENDING_JOBS_OPENAI_KEY, job_id.id)
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_OPENAI_KEY
+        assert args[0] == job_id.id
 
     @pytest.mark.asyncio
     async def test_create_job_routes_to_azure_queue(self, mocker):
@@ -60,7 +67,9 @@ class TestProcessorSpecificQueues:
             JobType.SUMMARY, DocumentPayload(text='test'), DocumentMetadata(customer_id='azure_customer')
         )
 
-        db.rpush.assert_called_once_with(PENDING_JOBS_AZURE_KEY, job_id.id)
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_AZURE_KEY
+        assert args[0] == job_id.id
 
     @pytest.mark.asyncio
     async def test_create_job_routes_to_oci_queue(self, mocker):
@@ -77,11 +86,13 @@ class TestProcessorSpecificQueues:
             JobType.SUMMARY, DocumentPayload(text='test'), DocumentMetadata(customer_id='oci_customer')
         )
 
-        db.rpush.assert_called_once_with(PENDING_JOBS_OCI_KEY, job_id.id)
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_OCI_KEY
+        assert args[0] == job_id.id
 
     @pytest.mark.asyncio
-    async def test_high_priority_jobs_use_lpush(self, mocker):
-        '''Test that high priority jobs are added to front of processor queue.'''
+    async def test_high_priority_jobs_start_earlier(self, mocker):
+        '''Test that high priority jobs are queued ahead of the normal jobs created at the same time.'''
 
         from skynet.constants import PENDING_JOBS_LOCAL_KEY
         from skynet.modules.ttt.summaries.jobs import create_job
@@ -91,9 +102,13 @@ class TestProcessorSpecificQueues:
         mocker.patch('skynet.modules.ttt.summaries.jobs.LLMSelector.get_job_processor', return_value=Processors.LOCAL)
 
         high_priority_payload = DocumentPayload(text='urgent', priority=Priority.HIGH)
+        before = time.time()
         job_id = await create_job(JobType.SUMMARY, high_priority_payload, DocumentMetadata(customer_id='test'))
 
-        db.lpush.assert_called_once_with(PENDING_JOBS_LOCAL_KEY, job_id.id)
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_LOCAL_KEY
+        assert args[0] == job_id.id
+        assert args[1] < before
 
 
 class TestProcessorConcurrencyLimits:
@@ -148,64 +163,25 @@ class TestProcessorConcurrencyLimits:
 
 class TestProcessorQueueSelection:
     @pytest.mark.asyncio
-    async def test_maybe_run_next_job_follows_priority_order(self, mocker):
-        '''Test that processors are checked in the defined priority order.'''
+    async def test_monitor_waits_for_jobs_of_every_processor(self, mocker):
+        '''Test that every processor gets its own waiter.'''
 
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
-
-        mocker.patch('skynet.modules.ttt.summaries.jobs.can_run_next_job', return_value=True)
-        mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
-
-        # Mock lpop to return job only once for OCI queue (first in priority), then None
-        oci_called = [False]
-
-        def mock_lpop(key):
-            if 'oci' in key and not oci_called[0]:
-                oci_called[0] = True
-                return 'test_job_id:OCI'
-            return None
-
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=mock_lpop)
-
-        await maybe_run_next_job()
-
-        # Should check OCI first (highest priority) and find job there
-        db.lpop.assert_any_call('jobs:pending:oci')
-
-    @pytest.mark.asyncio
-    async def test_maybe_run_next_job_skips_processors_at_capacity(self, mocker):
-        '''Test that processors at capacity are skipped.'''
-
-        from skynet.modules.ttt.summaries.jobs import maybe_run_next_job
+        from skynet.modules.ttt.summaries.jobs import monitor_candidate_jobs
         from skynet.modules.ttt.summaries.v1.models import Processors
 
+        mocker.patch('skynet.modules.ttt.summaries.jobs.migrate_pending_lists')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.migrate_job_lists_to_sets')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.migrate_legacy_queues')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.restore_stale_jobs')
+        mocker.patch('skynet.modules.ttt.summaries.jobs.is_openai_api_ready', return_value=True)
         mocker.patch('skynet.modules.ttt.summaries.jobs.update_summary_queue_metric')
+        mock_wait_for_jobs = mocker.patch('skynet.modules.ttt.summaries.jobs.wait_for_jobs')
 
-        def mock_can_run(processor):
-            # OCI and OPENAI are at capacity, AZURE has capacity
-            return processor == Processors.AZURE
+        await monitor_candidate_jobs()
 
-        mocker.patch('skynet.modules.ttt.summaries.jobs.can_run_next_job', side_effect=mock_can_run)
-        mocker.patch('skynet.modules.ttt.summaries.jobs.get_job')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.create_run_job_task')
-
-        # Mock lpop to return job only once for AZURE queue, then None
-        azure_called = [False]
-
-        def mock_lpop(key):
-            if 'azure' in key and not azure_called[0]:
-                azure_called[0] = True
-                return 'test_job_id:AZURE'
-            return None
-
-        mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=mock_lpop)
-
-        await maybe_run_next_job()
-
-        # Should skip OCI and OPENAI, go to AZURE
-        db.lpop.assert_any_call('jobs:pending:azure')
+        assert mock_wait_for_jobs.call_count == 4
+        for processor in Processors:
+            mock_wait_for_jobs.assert_any_call(processor)
 
 
 class TestProcessorHelperFunctions:
@@ -314,68 +290,110 @@ class TestTaskTrackingPerProcessor:
         assert len(mock_tasks[Processors.OPENAI]) == 0
 
 
+@pytest.fixture()
+def done_job_fixture(mocker):
+    mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_DURATION_METRIC')
+    mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_FULL_DURATION_METRIC')
+    mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_INPUT_LENGTH_METRIC')
+    mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_ERROR_COUNTER')
+
+    transaction = mocker.patch('skynet.modules.ttt.persistence.db.pipeline').return_value
+    transaction.execute = AsyncMock()
+
+    return transaction
+
+
 class TestProcessorSpecificRunningQueues:
     @pytest.mark.asyncio
-    async def test_update_done_job_uses_processor_specific_error_queue(self, mocker):
+    async def test_update_done_job_uses_processor_specific_error_queue(self, done_job_fixture):
         '''Test that failed LOCAL jobs are added to processor-specific error queues (since non-LOCAL jobs expire).'''
 
-        from skynet.constants import ERROR_JOBS_LOCAL_KEY
+        from skynet.constants import ERROR_JOBS_LOCAL_KEY, RUNNING_JOBS_LOCAL_KEY
         from skynet.modules.ttt.summaries.jobs import update_done_job
-        from skynet.modules.ttt.summaries.v1.models import Processors
+        from skynet.modules.ttt.summaries.v1.models import JobStatus, Processors
 
-        # Mock all the dependencies
-        mock_update_job = mocker.patch('skynet.modules.ttt.summaries.jobs.update_job')
-        mock_update_job.return_value = Mock(
-            metadata=Mock(customer_id='test'),
-            computed_duration=5.0,
-            computed_full_duration=10.0,
-            payload=Mock(text='test text'),
+        transaction = done_job_fixture
+        job = Job(
             id='test_job_id',
+            payload=DocumentPayload(text='test text'),
+            type=JobType.SUMMARY,
+            metadata=DocumentMetadata(customer_id='test'),
         )
 
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_DURATION_METRIC')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_FULL_DURATION_METRIC')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_INPUT_LENGTH_METRIC')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_ERROR_COUNTER')
-
-        job = Mock()
-        job.id = 'test_job_id'
-
         # Use LOCAL processor since failed LOCAL jobs don't expire and go to error queue
         await update_done_job(job, "Error occurred", Processors.LOCAL, has_failed=True)
 
-        # Should add to LOCAL-specific error queue
-        db.rpush.assert_called_with(ERROR_JOBS_LOCAL_KEY, job.id)
+        # Should save the failed job without expiry and move it to the LOCAL-specific error queue in one transaction
+        key, job_json, expires = transaction.set.call_args.args
+        assert key == job.id
+        assert Job.model_validate_json(job_json).status == JobStatus.ERROR
+        assert expires is None
+        transaction.srem.assert_called_once_with(RUNNING_JOBS_LOCAL_KEY, job.id)
+        transaction.sadd.assert_called_once_with(ERROR_JOBS_LOCAL_KEY, job.id)
+        transaction.execute.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_update_done_job_removes_from_processor_specific_running_queue(self, mocker):
+    async def test_update_done_job_removes_from_processor_specific_running_queue(self, done_job_fixture):
         '''Test that completed jobs are removed from processor-specific running queues.'''
 
         from skynet.constants import RUNNING_JOBS_AZURE_KEY
+        from skynet.env import redis_exp_seconds
         from skynet.modules.ttt.summaries.jobs import update_done_job
-        from skynet.modules.ttt.summaries.v1.models import Processors
+        from skynet.modules.ttt.summaries.v1.models import JobStatus, Processors
 
-        # Mock all the dependencies
-        mock_update_job = mocker.patch('skynet.modules.ttt.summaries.jobs.update_job')
-        mock_update_job.return_value = Mock(
-            metadata=Mock(customer_id='test'),
-            computed_duration=5.0,
-            computed_full_duration=10.0,
-            payload=Mock(text='test text'),
+        transaction = done_job_fixture
+        job = Job(
             id='test_job_id',
+            payload=DocumentPayload(text='test text'),
+            type=JobType.SUMMARY,
+            metadata=DocumentMetadata(customer_id='test'),
         )
 
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_DURATION_METRIC')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_FULL_DURATION_METRIC')
-        mocker.patch('skynet.modules.ttt.summaries.jobs.SUMMARY_INPUT_LENGTH_METRIC')
+        await update_done_job(job, "Success", Processors.AZURE, has_failed=False)
 
-        job = Mock()
-        job.id = 'test_job_id'
+        # Should save the result with an expiry and remove the job from the AZURE-specific running queue
+        key, job_json, expires = transaction.set.call_args.args
+        assert Job.model_validate_json(job_json).status == JobStatus.SUCCESS
+        assert Job.model_validate_json(job_json).result == 'Success'
+        assert expires == redis_exp_seconds
+        transaction.srem.assert_called_once_with(RUNNING_JOBS_AZURE_KEY, job.id)
+        transaction.sadd.assert_not_called()
+        transaction.execute.assert_called_once()
 
-        await update_done_job(job, "Success", Processors.AZURE, has_failed=False)
 
-        # Should remove from AZURE-specific running queue
-        db.lrem.assert_called_with(RUNNING_JOBS_AZURE_KEY, 0, job.id)
+class TestJobListsMigration:
+    @pytest.mark.asyncio
+    async def test_converts_running_and_error_lists(self, mocker):
+        '''Test that the running and error queues of every processor are converted to sets.'''
+
+        from skynet.constants import ERROR_JOBS_OCI_KEY, RUNNING_JOBS_LOCAL_KEY
+        from skynet.modules.ttt.summaries.jobs import migrate_job_lists_to_sets
+
+        mocker.patch('skynet.modules.ttt.persistence.db.convert_list_to_set', return_value=-1)
+
+        await migrate_job_lists_to_sets()
+
+        assert db.convert_list_to_set.call_count == 8
+        db.convert_list_to_set.assert_any_call(RUNNING_JOBS_LOCAL_KEY)
+        db.convert_list_to_set.assert_any_call(ERROR_JOBS_OCI_KEY)
+
+
+class TestPendingListsMigration:
+    @pytest.mark.asyncio
+    async def test_converts_pending_lists(self, mocker):
+        '''Test that the pending queue of every processor is converted to a sorted set, with a wake-up per job.'''
+
+        from skynet.constants import PENDING_JOBS_AZURE_KEY
+        from skynet.modules.ttt.summaries.jobs import migrate_pending_lists
+
+        mock_script = mocker.patch('skynet.modules.ttt.summaries.jobs.convert_pending_list_script', return_value=2)
+
+        await migrate_pending_lists()
+
+        assert mock_script.call_count == 4
+        assert [PENDING_JOBS_AZURE_KEY, f'{PENDING_JOBS_AZURE_KEY}:wakeups'] in [
+            c.args[0] for c in mock_script.call_args_list
+        ]
 
 
 class TestLegacyQueueMigration:
@@ -409,13 +427,14 @@ class TestLegacyQueueMigration:
 
         mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=mock_lpop)
         mocker.patch('skynet.modules.ttt.persistence.db.get', return_value=job_json)
-        mocker.patch('skynet.modules.ttt.persistence.db.rpush')
         mocker.patch('skynet.modules.ttt.persistence.db.lrange', return_value=[])
 
         await migrate_legacy_queues()
 
         # Should move job from legacy pending to LOCAL processor pending queue
-        db.rpush.assert_called_with(PENDING_JOBS_LOCAL_KEY, 'test_job_id')
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_LOCAL_KEY
+        assert args[0] == 'test_job_id'
 
     @pytest.mark.asyncio
     async def test_migrate_legacy_queues_preserves_high_priority(self, mocker):
@@ -447,13 +466,15 @@ class TestLegacyQueueMigration:
 
         mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=mock_lpop)
         mocker.patch('skynet.modules.ttt.persistence.db.get', return_value=job_json)
-        mocker.patch('skynet.modules.ttt.persistence.db.lpush')
         mocker.patch('skynet.modules.ttt.persistence.db.lrange', return_value=[])
 
         await migrate_legacy_queues()
 
-        # High priority job should use lpush (add to front)
-        db.lpush.assert_called_with(PENDING_JOBS_LOCAL_KEY, 'high_priority_job')
+        # High priority job should start ahead of the jobs created at the same time
+        keys, args = jobs.enqueue_job_script.call_args.args
+        assert keys[0] == PENDING_JOBS_LOCAL_KEY
+        assert args[0] == 'high_priority_job'
+        assert args[1] == job.created - jobs.PRIORITY_HEAD_START[Priority.HIGH]
 
     @pytest.mark.asyncio
     async def test_migrate_legacy_queues_handles_different_processors(self, mocker):
@@ -506,11 +527,10 @@ class TestLegacyQueueMigration:
 
         mocker.patch('skynet.modules.ttt.persistence.db.lpop', side_effect=mock_lpop)
         mocker.patch('skynet.modules.ttt.persistence.db.get', side_effect=mock_get)
-        mocker.patch('skynet.modules.ttt.persistence.db.rpush')
         mocker.patch('skynet.modules.ttt.persistence.db.lrange', return_value=[])
 
         await migrate_legacy_queues()
 
         # Should route jobs to correct processor queues
-        db.rpush.assert_any_call(PENDING_JOBS_OPENAI_KEY, 'openai_job')
-        db.rpush.assert_any_call(PENDING_JOBS_AZURE_KEY, 'azure_job')
+        queued = [(keys[0], args[0]) for keys, args in (c.args for c in jobs.enqueue_job_script.call_args_list)]
+        assert queued == [(PENDING_JOBS_OPENAI_KEY, 'openai_job'), (PENDING_JOBS_AZURE_KEY, 'azure_job')]
@@ -19,6 +19,7 @@ class HintType(Enum):
 
 
 class Priority(Enum):
+    LOW = 'low'
     NORMAL = 'normal'
     HIGH = 'high'
 
@@ -35,6 +36,10 @@ class DocumentPayload(BaseModel):
     priority: Priority = Priority.NORMAL
     prompt: Optional[str] = None
     is_live_summary: Optional[bool] = False
+    deadline: Optional[float] = Field(
+        default=None,
+        description="Optional unix timestamp by which the result is needed, must be in the future. The job is run ahead of the jobs that can wait longer.",
+    )
 
 
 class ActionItemsDocumentPayload(DocumentPayload):
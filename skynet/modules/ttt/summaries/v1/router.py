@@ -1,3 +1,5 @@
+import time
+
 from fastapi import Depends, HTTPException, Request
 from fastapi_versionizer.versionizer import api_version
 
@@ -36,8 +38,13 @@ def validate_process_text_payload(payload: DocumentPayload) -> None:
         raise HTTPException(status_code=422, detail="Prompt is required")
 
 
+def validate_deadline(payload: DocumentPayload) -> None:
+    if payload.deadline is not None and payload.deadline <= time.time():
+        raise HTTPException(status_code=422, detail="Deadline is in the past")
+
+
 @api_version(1)
-@router.post("/action-items", dependencies=[Depends(validate_summaries_payload)])
+@router.post("/action-items", dependencies=[Depends(validate_summaries_payload), Depends(validate_deadline)])
 async def action_items(payload: ActionItemsDocumentPayload, request: Request) -> JobId:
     """
     Starts a job to extract action items from the given payload.
@@ -47,7 +54,7 @@ async def action_items(payload: ActionItemsDocumentPayload, request: Request) ->
 
 
 @api_version(1)
-@router.post("/table-of-contents", dependencies=[Depends(validate_summaries_payload)])
+@router.post("/table-of-contents", dependencies=[Depends(validate_summaries_payload), Depends(validate_deadline)])
 async def table_of_contents(payload: TableOfContentsDocumentPayload, request: Request) -> JobId:
     """
     Starts a job to extract action items from the given payload.
@@ -57,7 +64,7 @@ async def table_of_contents(payload: TableOfContentsDocumentPayload, request: Re
 
 
 @api_version(1)
-@router.post("/summary", dependencies=[Depends(validate_summaries_payload)])
+@router.post("/summary", dependencies=[Depends(validate_summaries_payload), Depends(validate_deadline)])
 async def summary(payload: SummaryDocumentPayload, request: Request) -> JobId:
     """
     Starts a job to summarize the given payload.
@@ -67,7 +74,7 @@ async def summary(payload: SummaryDocumentPayload, request: Request) -> JobId:
 
 
 @api_version(1)
-@router.post("/process-text", dependencies=[Depends(validate_process_text_payload)])
+@router.post("/process-text", dependencies=[Depends(validate_process_text_payload), Depends(validate_deadline)])
 async def process_text(payload: ProcessTextDocumentPayload, request: Request) -> JobId:
     """
     Starts a job to process the given text.
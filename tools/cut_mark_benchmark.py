@@ -0,0 +1,97 @@
+"""
+Times the cut mark search over interim results of growing length, against the previous implementation which
+averaged the probabilities of every phrase from scratch, e.g.
+
+    poetry run python tools/cut_mark_benchmark.py --words 50 100 200 400
+"""
+
+import argparse
+import os
+import random
+import timeit
+
+os.environ.setdefault('BYPASS_AUTHORIZATION', '1')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from skynet.modules.stt.streaming_whisper.cut_mark import (  # noqa: E402
+    CutMark,
+    find_cut_mark,
+    get_phrase_prob,
+    WhisperWord,
+)
+
+MIN_PROBABILITY = 0.7
+
+
+def previous_biggest_gap(word_list: list[WhisperWord]) -> CutMark:
+    prev_word = word_list[0]
+    biggest_gap_so_far = 0.0
+    result = CutMark()
+    for i, word in enumerate(word_list):
+        if i == 0:
+            continue
+        diff = word.start - prev_word.end
+        probability = get_phrase_prob(i - 1, word_list)
+        if diff > biggest_gap_so_far:
+            biggest_gap_so_far = diff
+            result = CutMark(start=prev_word.end, end=word.start, probability=probability)
+        prev_word = word
+    return result
+
+
+def previous_cut_mark(words: list[WhisperWord]) -> CutMark:
+    phrase = ''
+    if len(words) > 1:
+        if words[-1].end >= 10:
+            return previous_biggest_gap(words)
+        for i, word in enumerate(words):
+            if i == len(words) - 1:
+                break
+            phrase += word.word
+            avg_probability = get_phrase_prob(i, words)
+            if len(phrase) >= 48:
+                if (
+                    avg_probability >= MIN_PROBABILITY
+                    and word.word[-1] in ['.', '!', '?']
+                    and word.end < words[i + 1].start
+                ):
+                    return CutMark(start=word.end, end=words[i + 1].start, probability=avg_probability)
+    return CutMark()
+
+
+def make_words(num_words: int, duration: float) -> list[WhisperWord]:
+    """
+    Words without a sentence end spread over the given duration, the worst case for the search.
+    """
+
+    rng = random.Random(num_words)
+    step = duration / num_words
+    return [
+        WhisperWord(rng.uniform(0.5, 1.0), ' word', i * step, i * step + step * rng.uniform(0.5, 0.9))
+        for i in range(num_words)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cut mark search microbenchmark')
+    parser.add_argument('--words', type=int, nargs='+', default=[25, 50, 100, 200, 400])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"words":>6} {"audio":>6} {"previous":>12} {"current":>12} {"speedup":>8}')
+    for num_words in args.words:
+        # under 10 seconds the whole phrase is scanned, over it the biggest gap is searched
+        for duration in (9.5, 15.0):
+            words = make_words(num_words, duration)
+            assert previous_cut_mark(words) == find_cut_mark(words, MIN_PROBABILITY)
+
+            previous = min(timeit.repeat(lambda: previous_cut_mark(words), number=args.repeat, repeat=3))
+            current = min(timeit.repeat(lambda: find_cut_mark(words, MIN_PROBABILITY), number=args.repeat, repeat=3))
+            print(
+                f'{num_words:>6} {duration:>5.1f}s {previous / args.repeat * 1e6:>10.1f}us '
+                f'{current / args.repeat * 1e6:>10.1f}us {previous / current:>7.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Replays recorded audio through the streaming whisper ConnectionManager in-process, as if it came from N meetings with
+M participants each, and reports the real-time factor, the interim and final latencies, how the time splits between
+the VAD and the decoding and the peak RSS.
+
+The real-time factor is the time spent in the VAD and the decoding over the duration of the audio, so it doesn't
+depend on the pace the audio is sent at. The wall time only tells how fast the audio can be processed with
+`--no-realtime`, since it's sent at the pace it was recorded otherwise.
+
+The audio needs to be 16kHz mono 16-bit PCM, either raw or in a WAV file. It runs on CPU with the tiny model unless
+configured otherwise through the usual environment variables, e.g.
+
+    poetry run python tools/stt_benchmark.py --audio speech.wav --meetings 4 --participants 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import threading
+import time
+import wave
+from collections import defaultdict
+
+os.environ.setdefault('BYPASS_AUTHORIZATION', '1')
+os.environ.setdefault('WHISPER_MODEL_NAME', 'tiny.en')
+os.environ.setdefault('WHISPER_DEVICE', 'cpu')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np  # noqa: E402
+
+from skynet.modules.stt.streaming_whisper.app import app_shutdown, app_startup  # noqa: E402
+from skynet.modules.stt.streaming_whisper.connection_manager import ConnectionManager  # noqa: E402
+from skynet.modules.stt.streaming_whisper.protocol import BINARY_SUBPROTOCOL, decode_results  # noqa: E402
+from skynet.modules.stt.streaming_whisper.utils import utils  # noqa: E402
+from skynet.modules.stt.streaming_whisper.vad import StreamingVad  # noqa: E402
+from skynet.modules.stt.streaming_whisper.worker_pool import worker_pool  # noqa: E402
+
+HEADER_SIZE = 60
+SAMPLE_RATE = 16000
+
+timings = defaultdict(float)
+timings_lock = threading.Lock()
+timing = threading.local()
+last_fed_at = {}
+latencies = defaultdict(list)
+
+
+def timed(name: str, fn):
+    def wrapper(*args, **kwargs):
+        # the calls made from a timed call, like the fallback of a batch to single transcriptions, are part of it
+        if getattr(timing, 'running', False):
+            return fn(*args, **kwargs)
+
+        timing.running = True
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timing.running = False
+            with timings_lock:
+                timings[name] += elapsed
+
+    return wrapper
+
+
+# measure where the time goes, the VAD and the model run on their own threads, so only the time spent in them counts
+# and not the time waiting for a free thread. The workers decode in their own processes, where it isn't measured.
+StreamingVad.feed = timed('vad', StreamingVad.feed)
+utils.transcribe = timed('decode', utils.transcribe)
+utils.transcribe_batch = timed('decode', utils.transcribe_batch)
+
+
+class ReplayWebSocket:
+    def __init__(self, meeting_id: str, binary: bool):
+        self.meeting_id = meeting_id
+        self.headers = {}
+        self.scope = {'subprotocols': [BINARY_SUBPROTOCOL] if binary else []}
+        self.sent_bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, *args, **kwargs):
+        pass
+
+    async def send_json(self, result: dict):
+        self.sent_bytes += len(json.dumps(result))
+        self.record(result['participant_id'], result['type'])
+
+    async def send_bytes(self, frame: bytes):
+        self.sent_bytes += len(frame)
+        for result in decode_results(frame):
+            self.record(result.participant_id, result.type)
+
+    def record(self, participant_id: str, result_type: str):
+        fed_at = last_fed_at.get((self.meeting_id, participant_id))
+        if fed_at is not None:
+            latencies[result_type].append(time.perf_counter() - fed_at)
+
+
+def load_pcm(path: str) -> bytes:
+    if path.endswith('.wav'):
+        with wave.open(path, 'rb') as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError('The audio needs to be 16kHz mono 16-bit PCM')
+            return wav.readframes(wav.getnframes())
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def make_chunk(participant_id: str, lang: str, pcm: bytes) -> bytes:
+    header = f'{participant_id}|{lang}'.encode('utf-8').ljust(HEADER_SIZE, b'\x00')
+    return header + pcm
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return 'n/a'
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return f'p50 {p50 * 1000:.0f}ms, p90 {p90 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms ({len(values)} results)'
+
+
+async def replay(args):
+    pcm = load_pcm(args.audio)
+    chunk_size = int(SAMPLE_RATE * args.chunk_ms / 1000) * 2
+    num_chunks = len(pcm) // chunk_size
+    audio_duration = num_chunks * args.chunk_ms / 1000
+
+    await app_startup()
+    manager = ConnectionManager()
+    websockets = [ReplayWebSocket(f'benchmark-{m}', args.binary) for m in range(args.meetings)]
+    connections = [await manager.connect(websocket, websocket.meeting_id, None) for websocket in websockets]
+
+    participants = [f'participant-{p}' for p in range(args.participants)]
+    start = time.perf_counter()
+    for i in range(num_chunks):
+        for connection in connections:
+            for p, participant_id in enumerate(participants):
+                # every participant starts at a different point of the recording so they don't speak in unison
+                offset = (i + p * num_chunks // len(participants)) % num_chunks
+                chunk = make_chunk(participant_id, args.lang, pcm[offset * chunk_size : (offset + 1) * chunk_size])
+                last_fed_at[(connection.meeting_id, participant_id)] = time.perf_counter()
+                await manager.process(connection, chunk, utils.now())
+
+        if args.realtime:
+            await asyncio.sleep(max(0.0, start + (i + 1) * args.chunk_ms / 1000 - time.perf_counter()))
+        else:
+            await asyncio.sleep(0)
+
+    # let the queued passes finish, then flush what's left as finals
+    while manager.queued_passes or manager.running_passes:
+        await asyncio.sleep(0.05)
+    for connection in connections:
+        for participant_id in participants:
+            await manager.send(connection, await connection.force_transcription(participant_id))
+    wall_time = time.perf_counter() - start
+
+    for connection in connections:
+        await manager.disconnect(connection)
+    manager.flush_audio_task.cancel()
+    await app_shutdown()
+
+    streams = args.meetings * args.participants
+    busy = timings['vad'] + timings['decode']
+    sent_bytes = sum(websocket.sent_bytes for websocket in websockets)
+    print(f'Streams:          {args.meetings} meetings x {args.participants} participants')
+    print(f'Audio:            {audio_duration:.1f}s per stream, {audio_duration * streams:.1f}s in total')
+    print(f'Wall time:        {wall_time:.1f}s ({"real-time" if args.realtime else "as fast as possible"})')
+    if not args.realtime:
+        print(f'Throughput:       {audio_duration * streams / wall_time:.1f}s of audio per second')
+    print(f'Processing time:  {busy:.1f}s')
+    print(f'Real-time factor: {busy / (audio_duration * streams):.3f}')
+    if worker_pool.enabled:
+        print('                  the decoding in the worker processes is not counted')
+    print(f'Interim latency:  {percentiles(latencies["interim"])}')
+    print(f'Final latency:    {percentiles(latencies["final"])}')
+    print(f'Results sent:     {sent_bytes / 1024:.1f}KB ({"binary" if args.binary else "JSON"})')
+    if busy:
+        print(
+            f'Time split:       VAD {timings["vad"]:.1f}s ({timings["vad"] / busy:.0%}), '
+            f'decode {timings["decode"]:.1f}s ({timings["decode"] / busy:.0%})'
+        )
+    # ru_maxrss is in KB on Linux, the workers' only counts once they've been joined
+    print(f'Peak RSS:         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB')
+    if resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss:
+        print(f'Peak worker RSS:  {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f}MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming whisper replay benchmark')
+    parser.add_argument('--audio', required=True, help='16kHz mono 16-bit PCM, raw or WAV')
+    parser.add_argument('--meetings', type=int, default=1)
+    parser.add_argument('--participants', type=int, default=1)
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--chunk-ms', type=int, default=256, help='the duration of the chunks sent by the clients')
+    parser.add_argument(
+        '--no-realtime',
+        dest='realtime',
+        action='store_false',
+        help='send the chunks as fast as possible instead of at the pace they were recorded',
+    )
+    parser.add_argument('--binary', action='store_true', help='get the results through the binary protocol')
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()